@@ -0,0 +1,224 @@
+import json
+from datetime import datetime
+from sqlalchemy import select, func, delete
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+import crud, models, schemas, search_index
+
+# Async counterparts of the crud functions used by the API routes. Reads reuse the
+# statements built in crud.py; the crew worker keeps using the sync versions.
+
+async def get_project(db: AsyncSession, project_id: int):
+    return await db.get(models.Project, project_id)
+
+async def get_project_version(db: AsyncSession, project_id: int):
+    row = (await db.execute(crud.project_version_query(project_id))).first()
+    return None if row is None else row.version or 0
+
+async def get_project_detail(db: AsyncSession, project_id: int, include_outputs: bool = True):
+    return (await db.scalars(crud.project_detail_query(project_id, include_outputs))).first()
+
+async def get_projects(db: AsyncSession, limit: int = 100, cursor: str = None, status: str = None, title: str = None):
+    return (await db.scalars(crud.projects_query(limit=limit, cursor=cursor, status=status, title=title))).all()
+
+async def create_project(db: AsyncSession, project: schemas.ProjectCreate):
+    db_project = models.Project(title=project.title, description=project.description, github_url=project.github_url)
+    db.add(db_project)
+    await db.flush()
+
+    # Initialize an empty knowledge base
+    db.add(models.KnowledgeBase(
+        project_id=db_project.id,
+        pm_guidelines="",
+        architect_guidelines="",
+        systems_guidelines="",
+        ai_guidelines="",
+        ux_guidelines="",
+        security_standards=""
+    ))
+    db.add_all(crud.default_guideline_refs(db_project.id, (await db.scalars(crud.default_guideline_documents_query())).all()))
+    await db.commit()
+    # Relationships cannot be lazy-loaded under asyncio, so return a fully loaded project
+    return await get_project_detail(db, db_project.id)
+
+async def update_project_status(db: AsyncSession, project_id: int, status: str):
+    db_project = await get_project(db, project_id)
+    if db_project:
+        db_project.status = status
+        db.add(models.RunEvent(project_id=project_id, event_type="status", data=json.dumps({"status": status})))
+        await db.execute(crud.touch_project_statement(project_id))
+        await db.commit()
+    return db_project
+
+async def get_knowledge_base(db: AsyncSession, project_id: int):
+    return (await db.scalars(select(models.KnowledgeBase).where(models.KnowledgeBase.project_id == project_id))).first()
+
+async def update_knowledge_base(db: AsyncSession, project_id: int, kb: schemas.KnowledgeBaseBase):
+    db_kb = await get_knowledge_base(db, project_id)
+    if db_kb:
+        for field, value in kb.model_dump().items():
+            setattr(db_kb, field, value)
+    else:
+        db_kb = models.KnowledgeBase(project_id=project_id, **kb.model_dump())
+        db.add(db_kb)
+    await db.execute(crud.touch_project_statement(project_id))
+    await db.commit()
+    return db_kb
+
+async def get_guideline_documents(db: AsyncSession):
+    return (await db.scalars(crud.guideline_documents_query())).all()
+
+async def get_guideline_document(db: AsyncSession, document_id: int):
+    return await db.get(models.GuidelineDocument, document_id)
+
+async def get_guideline_document_by_name(db: AsyncSession, name: str):
+    return (await db.scalars(crud.guideline_document_by_name_query(name))).first()
+
+async def create_guideline_document(db: AsyncSession, document: schemas.GuidelineDocumentCreate):
+    db_document = models.GuidelineDocument(name=document.name, kb_field=document.kb_field, is_default=document.is_default, latest_version=0)
+    db.add(db_document)
+    await db.flush()
+    db.add(crud.new_guideline_version(db_document, document.content))
+    await db.commit()
+    return db_document
+
+async def add_guideline_version(db: AsyncSession, db_document, content: str):
+    db_version = crud.new_guideline_version(db_document, content, await db.scalar(crud.latest_guideline_hash_query(db_document)))
+    if db_version is None:
+        return await get_guideline_version(db, db_document.id, db_document.latest_version)
+    db.add(db_version)
+    await db.execute(crud.touch_guideline_followers_statement(db_document.id))
+    await db.commit()
+    return db_version
+
+async def get_guideline_versions(db: AsyncSession, document_id: int):
+    return (await db.scalars(crud.guideline_versions_query(document_id))).all()
+
+async def get_guideline_version(db: AsyncSession, document_id: int, version: int):
+    return (await db.scalars(crud.guideline_version_query(document_id, version))).first()
+
+async def set_guideline_references(db: AsyncSession, project_id: int, refs):
+    await db.execute(delete(models.GuidelineReference).where(models.GuidelineReference.project_id == project_id))
+    db_refs = crud.guideline_references(project_id, refs)
+    db.add_all(db_refs)
+    await db.execute(crud.touch_project_statement(project_id))
+    await db.commit()
+    return db_refs
+
+async def create_requirement(db: AsyncSession, project_id: int, requirement: schemas.RequirementCreate):
+    db_req = models.Requirement(project_id=project_id, content=requirement.content)
+    db.add(db_req)
+    await db.flush()
+    if search_index.SEARCH_ENABLED:
+        await db.execute(search_index.INSERT_DOCUMENT, [search_index.requirement_document(db_req)])
+    await db.execute(crud.touch_project_statement(project_id))
+    await db.commit()
+    return db_req
+
+async def get_agent_outputs(db: AsyncSession, project_id: int, since: int = None, limit: int = None):
+    return (await db.scalars(crud.agent_outputs_query(project_id, since=since, limit=limit))).all()
+
+async def get_agent_output(db: AsyncSession, output_id: int):
+    return await db.get(models.AgentOutput, output_id)
+
+async def search(db: AsyncSession, query: str, project_id: int = None, agent_name: str = None, kind: str = None, limit: int = 20, offset: int = 0):
+    match = search_index.match_expression(query)
+    if not match:
+        return []
+    return (await db.execute(search_index.search_statement(match, project_id, agent_name, kind, limit, offset))).mappings().all()
+
+async def get_runs(db: AsyncSession, project_id: int):
+    return (await db.scalars(crud.runs_query(project_id))).all()
+
+async def get_run(db: AsyncSession, run_id: int):
+    return await db.get(models.Run, run_id)
+
+async def get_previous_run(db: AsyncSession, db_run):
+    return (await db.scalars(crud.previous_run_query(db_run))).first()
+
+async def get_run_outputs(db: AsyncSession, run_id: int, include_content: bool = False):
+    return crud.latest_by_task((await db.scalars(crud.run_outputs_query(run_id, include_content))).all())
+
+async def get_job(db: AsyncSession, job_id: int):
+    return await db.get(models.Job, job_id)
+
+async def get_active_job(db: AsyncSession, project_id: int):
+    return (await db.scalars(select(models.Job).where(
+        models.Job.project_id == project_id,
+        models.Job.status.in_(crud.ACTIVE_JOB_STATUSES)
+    ).order_by(models.Job.id.desc()))).first()
+
+async def enqueue_job(db: AsyncSession, project_id: int, max_attempts: int = 3, resume: bool = False, priority: int = 1, batch_id: str = None):
+    # A project only ever has one queued or running job; re-submitting returns the existing one
+    existing = await get_active_job(db, project_id)
+    if existing:
+        return existing, False
+    resume_from = None
+    if resume:
+        resume_from = (await db.scalars(select(models.Job).where(
+            models.Job.project_id == project_id,
+            models.Job.status.in_(("failed", "cancelled"))
+        ).order_by(models.Job.id.desc()))).first()
+    db_job = models.Job(
+        project_id=project_id, max_attempts=max_attempts, priority=priority, batch_id=batch_id,
+        resume_from_job_id=resume_from.id if resume_from else None
+    )
+    db.add(db_job)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # A concurrent request queued one first (ix_jobs_active_project_id)
+        await db.rollback()
+        return await get_active_job(db, project_id), False
+    await db.refresh(db_job)
+    return db_job, True
+
+async def get_batch_jobs(db: AsyncSession, batch_id: str):
+    return (await db.scalars(select(models.Job).where(models.Job.batch_id == batch_id).order_by(models.Job.id.asc()))).all()
+
+async def cancel_job(db: AsyncSession, job_id: int):
+    db_job = await get_job(db, job_id)
+    if not db_job or db_job.status not in crud.ACTIVE_JOB_STATUSES:
+        return db_job
+    db_job.cancel_requested = True
+    if db_job.status == "queued":
+        db_job.status = "cancelled"
+        db_job.finished_at = datetime.utcnow()
+        await update_project_status(db, db_job.project_id, "cancelled")
+    # Running jobs are stopped by the worker that owns them
+    await db.commit()
+    return db_job
+
+async def get_run_events(db: AsyncSession, project_id: int, after_id: int = 0, limit: int = 100):
+    return (await db.scalars(crud.run_events_query(project_id, after_id=after_id, limit=limit))).all()
+
+async def get_last_run_event_id(db: AsyncSession, project_id: int):
+    last = await db.scalar(select(func.max(models.RunEvent.id)).where(models.RunEvent.project_id == project_id))
+    return last or 0
+
+async def get_cache_stats(db: AsyncSession):
+    entries, size_bytes = (await db.execute(select(
+        func.count(models.LLMCacheEntry.key), func.coalesce(func.sum(models.LLMCacheEntry.size_bytes), 0)
+    ))).one()
+    sizes = {"llm": (entries, size_bytes)}
+    sizes["embedding"] = tuple((await db.execute(select(
+        func.count(models.EmbeddingCacheEntry.key), func.coalesce(func.sum(func.length(models.EmbeddingCacheEntry.vector)), 0)
+    ))).one())
+    stats = []
+    for row in (await db.scalars(select(models.CacheStats).order_by(models.CacheStats.name))).all():
+        entries, size_bytes = sizes.get(row.name, (0, 0))
+        lookups = row.hits + row.misses
+        stats.append(schemas.CacheStats(
+            name=row.name, hits=row.hits, misses=row.misses, evictions=row.evictions,
+            entries=entries, size_bytes=size_bytes, hit_rate=row.hits / lookups if lookups else 0.0
+        ))
+    return stats
+
+async def get_run_metrics(db: AsyncSession, project_id: int, job_id: int = None):
+    if job_id is None:
+        job_id = await db.scalar(crud.latest_metrics_job_query(project_id))
+    spans = (await db.scalars(crud.run_metrics_query(project_id, job_id))).all()
+    return crud.summarize_run_metrics(project_id, job_id, spans)
+
+async def get_metric_totals(db: AsyncSession):
+    return (await db.execute(crud.metric_totals_query())).all(), (await db.execute(crud.job_status_counts_query())).all()
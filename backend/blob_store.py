@@ -0,0 +1,167 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; gzip from the standard library is the fallback
+    zstandard = None
+
+BLOB_STORE_DIR = os.environ.get("BLOB_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".blob_store"))
+BLOB_CACHE_ENTRIES = int(os.environ.get("BLOB_CACHE_ENTRIES", "64"))
+# With zstd, a new version of a text (put's base_hash) can be stored as a delta: compressed
+# with the previous version as the dictionary, so passages the two share cost almost
+# nothing. Every BLOB_SNAPSHOT_INTERVAL-th version of a chain is stored in full, which
+# bounds how many bases a read decompresses; 0 or 1 disables deltas. A delta is only kept
+# when it is at most BLOB_DELTA_MAX_RATIO of the compressed full body.
+BLOB_SNAPSHOT_INTERVAL = int(os.environ.get("BLOB_SNAPSHOT_INTERVAL", "8"))
+BLOB_DELTA_MAX_RATIO = float(os.environ.get("BLOB_DELTA_MAX_RATIO", "0.9"))
+BLOB_ZSTD_LEVEL = 10
+# Blobs are written before the transaction that references them commits, so a rolled-back
+# write leaves an unreferenced blob behind. Garbage collection deletes those, sparing
+# anything younger than this, which may belong to a transaction still in flight.
+BLOB_GC_MIN_AGE_SECONDS = int(os.environ.get("BLOB_GC_MIN_AGE_SECONDS", "3600"))
+
+class BlobStore:
+    # Content-addressed, compressed storage for large text bodies. A blob's name is the
+    # sha256 of its uncompressed bytes, so identical outputs are stored exactly once.
+    # Only collect_garbage() deletes blobs, and never the base of a delta still in use.
+    def __init__(self, root: str, cache_entries: int = BLOB_CACHE_ENTRIES):
+        self.root = root
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # Recently read blobs, decompressed
+        self._lock = threading.Lock()
+
+    def _path(self, content_hash: str, codec: str):
+        return os.path.join(self.root, content_hash[:2], f"{content_hash}.{codec}")
+
+    def _existing_path(self, content_hash: str):
+        for codec in ("zst", "gz", "zdelta"):
+            path = self._path(content_hash, codec)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def exists(self, content_hash: str):
+        return self._existing_path(content_hash) is not None
+
+    def _write(self, path: str, data: bytes):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so readers never see a partial blob
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_delta(self, content_hash: str):
+        # A delta file is a JSON header line ({"base": hash, "depth": n}) and the zstd frame
+        path = self._path(content_hash, "zdelta")
+        if not os.path.exists(path):
+            return None, None
+        with open(path, "rb") as f:
+            header, _, frame = f.read().partition(b"\n")
+        return json.loads(header), frame
+
+    def chain_depth(self, content_hash: str):
+        # How many deltas separate this blob from a full snapshot
+        header, _ = self._read_delta(content_hash)
+        return header["depth"] if header else 0
+
+    def put(self, data: bytes, base_hash: str = None):
+        content_hash = hashlib.sha256(data).hexdigest()
+        existing = self._existing_path(content_hash)
+        if existing:
+            # Stored again: a fresh mtime keeps garbage collection from taking it meanwhile
+            try:
+                os.utime(existing)
+            except OSError:
+                existing = None
+        if not existing:
+            if zstandard is not None:
+                codec, compressed = "zst", zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL).compress(data)
+                if base_hash and base_hash != content_hash:
+                    delta = self._make_delta(data, base_hash, len(compressed))
+                    if delta is not None:
+                        codec, compressed = "zdelta", delta
+            else:
+                codec, compressed = "gz", gzip.compress(data, compresslevel=6)
+            self._write(self._path(content_hash, codec), compressed)
+        return content_hash, len(data)
+
+    def _make_delta(self, data: bytes, base_hash: str, full_size: int):
+        if BLOB_SNAPSHOT_INTERVAL <= 1 or not self.exists(base_hash):
+            return None
+        depth = self.chain_depth(base_hash) + 1
+        if depth >= BLOB_SNAPSHOT_INTERVAL:
+            return None
+        base = zstandard.ZstdCompressionDict(self.get(base_hash), dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        frame = zstandard.ZstdCompressor(level=BLOB_ZSTD_LEVEL, dict_data=base).compress(data)
+        if len(frame) > full_size * BLOB_DELTA_MAX_RATIO:
+            return None
+        return json.dumps({"base": base_hash, "depth": depth}).encode("utf-8") + b"\n" + frame
+
+    def put_text(self, text: str, base_hash: str = None):
+        # base_hash: the previous version of this text, if any, to store a delta against
+        return self.put(text.encode("utf-8"), base_hash)
+
+    def get(self, content_hash: str):
+        with self._lock:
+            if content_hash in self._cache:
+                self._cache.move_to_end(content_hash)
+                return self._cache[content_hash]
+        zst_path = self._path(content_hash, "zst")
+        header, frame = self._read_delta(content_hash)
+        if zstandard is None and (header or os.path.exists(zst_path)):
+            raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed")
+        if header:
+            # Bases land in the cache too, so reading successive versions decompresses each once
+            base = zstandard.ZstdCompressionDict(self.get(header["base"]), dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+            data = zstandard.ZstdDecompressor(dict_data=base).decompress(frame)
+        elif os.path.exists(zst_path):
+            with open(zst_path, "rb") as f:
+                data = zstandard.ZstdDecompressor().decompress(f.read())
+        else:
+            with open(self._path(content_hash, "gz"), "rb") as f:
+                data = gzip.decompress(f.read())
+        with self._lock:
+            self._cache[content_hash] = data
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return data
+
+    def get_text(self, content_hash: str):
+        return self.get(content_hash).decode("utf-8")
+
+    def collect_garbage(self, referenced, min_age_seconds: int = BLOB_GC_MIN_AGE_SECONDS):
+        # Deletes blobs that are not in referenced (content hashes still in use) and not the
+        # base of a delta that is, plus abandoned temporary files. Returns (files, bytes) freed.
+        live = set()
+        for content_hash in referenced:
+            while content_hash and content_hash not in live:
+                live.add(content_hash)
+                header, _ = self._read_delta(content_hash)
+                content_hash = header["base"] if header else None
+        cutoff = time.time() - min_age_seconds
+        deleted, freed = 0, 0
+        for dir_path, _, file_names in os.walk(self.root):
+            for name in file_names:
+                path = os.path.join(dir_path, name)
+                if not name.endswith(".tmp") and name.split(".")[0] in live:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue  # Removed by another collector
+                deleted, freed = deleted + 1, freed + stat.st_size
+                with self._lock:
+                    self._cache.pop(name.split(".")[0], None)
+        return deleted, freed
+
+blob_store = BlobStore(BLOB_STORE_DIR)
@@ -0,0 +1,107 @@
+import os
+import re
+from typing import Any, Optional
+from crewai import Task
+from crewai.utilities.formatter import DIVIDERS
+from llm_client import estimate_tokens
+
+# Upper bound on the upstream outputs handed to a task, in (estimated) tokens. 0 disables it.
+CONTEXT_BUDGET_TOKENS = int(os.environ.get("CONTEXT_BUDGET_TOKENS", "6000"))
+# "extractive" keeps headings and the start of every section; "llm" asks the agent's LLM
+# for a summary and falls back to extractive if that fails
+CONTEXT_SUMMARY_MODE = os.environ.get("CONTEXT_SUMMARY_MODE", "extractive")
+
+HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+TRIMMED_MARKER = "\n\n[... trimmed to fit the context budget]"
+SUMMARY_PROMPT = (
+    "Summarize the following document for a colleague who will build on it. Keep every "
+    "decision, component name, constraint and open question; drop explanations and examples. "
+    "Use markdown and stay under {words} words.\n\n{text}"
+)
+
+def _cut(text: str, max_chars: int):
+    # Cut at the last line or sentence break before the limit
+    if len(text) <= max_chars:
+        return text
+    head = text[:max_chars]
+    for separator in ("\n", ". "):
+        index = head.rfind(separator)
+        if index > max_chars // 2:
+            return head[:index + 1].rstrip()
+    return head.rstrip()
+
+def trim_extractive(text: str, max_tokens: int):
+    # Markdown-aware: every section keeps its heading and an equal share of the budget,
+    # and sections shorter than their share hand the rest to the others
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    max_chars = max(max_tokens * 4 - len(TRIMMED_MARKER), 0)
+    starts = [m.start() for m in HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = [text[start:end].strip() for start, end in zip(starts, starts[1:] + [len(text)])]
+    sections = [s for s in sections if s]
+
+    remaining, pending, kept = max_chars, sorted(range(len(sections)), key=lambda i: len(sections[i])), {}
+    while pending:
+        share = remaining // len(pending)
+        index = pending.pop(0)
+        kept[index] = _cut(sections[index], max(share, 0))
+        remaining -= len(kept[index])
+    return "\n\n".join(kept[i] for i in range(len(sections)) if kept[i]) + TRIMMED_MARKER
+
+def summarize_with_llm(llm, text: str, max_tokens: int):
+    summary = llm.call([{"role": "user", "content": SUMMARY_PROMPT.format(words=int(max_tokens * 0.75), text=text)}])
+    if not isinstance(summary, str) or not summary.strip():
+        raise ValueError("Empty summary")
+    # The model may overshoot the requested length; the budget is enforced regardless
+    return trim_extractive(summary.strip(), max_tokens)
+
+def fit_context(context: Optional[str], max_tokens: int, mode: str = CONTEXT_SUMMARY_MODE, llm=None):
+    # The crew joins upstream outputs with DIVIDERS; each output gets a fair share of the
+    # budget so one long document cannot crowd out the others
+    if not context or not max_tokens or estimate_tokens(context) <= max_tokens:
+        return context
+    sources = context.split(DIVIDERS)
+    remaining, pending, fitted = max_tokens, sorted(range(len(sources)), key=lambda i: len(sources[i])), {}
+    while pending:
+        share = max(remaining // len(pending), 1)
+        index = pending.pop(0)
+        source = sources[index]
+        if estimate_tokens(source) <= share:
+            fitted[index] = source
+        elif mode == "llm" and llm is not None:
+            try:
+                fitted[index] = summarize_with_llm(llm, source, share)
+            except Exception:
+                fitted[index] = trim_extractive(source, share)
+        else:
+            fitted[index] = trim_extractive(source, share)
+        remaining -= estimate_tokens(fitted[index])
+    return DIVIDERS.join(fitted[i] for i in range(len(sources)))
+
+class BudgetedTask(Task):
+    # A Task whose upstream context is fitted to a token budget before the agent sees it.
+    # Token counts of the last execution are kept for the task callback to persist.
+    context_budget: Optional[int] = CONTEXT_BUDGET_TOKENS
+    summary_mode: str = CONTEXT_SUMMARY_MODE
+    token_usage: Any = None
+
+    def _fit(self, agent, context):
+        agent = agent or self.agent
+        fitted = fit_context(context, self.context_budget, self.summary_mode, llm=getattr(agent, "llm", None))
+        prompt_parts = [self.description, self.expected_output, fitted or ""]
+        if agent is not None:
+            prompt_parts += [agent.role, agent.goal, agent.backstory]
+        self.token_usage = {
+            "context_tokens_before": estimate_tokens(context) if context else 0,
+            "context_tokens": estimate_tokens(fitted) if fitted else 0,
+            "prompt_tokens": estimate_tokens("\n".join(prompt_parts)),
+        }
+        return fitted
+
+    def _execute_core(self, agent, context, tools):
+        return super()._execute_core(agent, self._fit(agent, context), tools)
+
+    async def _aexecute_core(self, agent, context, tools):
+        return await super()._aexecute_core(agent, self._fit(agent, context), tools)
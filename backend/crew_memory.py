@@ -0,0 +1,252 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
+import numpy as np
+from crewai.memory.unified_memory import Memory
+from crewai.memory.types import MemoryRecord, ScopeInfo
+from crewai.memory.storage.backend import EmbeddingDimensionMismatchError
+from crewai.rag.embeddings.factory import build_embedder
+import crud
+from database import SessionLocal
+
+# Crew memory that does as little embedding I/O as possible: every text is embedded once
+# per model (embedding_cache table, shared by all projects and runs) and memories live in
+# a flat NumPy index on local disk, one directory per project.
+
+EMBEDDER_PROVIDER = os.environ.get("EMBEDDER_PROVIDER", "google-generativeai")
+EMBEDDER_MODEL = os.environ.get("EMBEDDER_MODEL", "models/embedding-001")
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "100"))
+MEMORY_STORE_DIR = os.environ.get("MEMORY_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".memory_store"))
+
+def embedder_config(api_key: str):
+    return {"provider": EMBEDDER_PROVIDER, "config": {"model": EMBEDDER_MODEL, "api_key": api_key}}
+
+def synthetic_embedder(dimensions: int = 256):
+    # Offline stand-in for EMBEDDER_PROVIDER=synthetic (tests, benchmarks): a hashed bag of
+    # words, so texts that share words still land close together
+    def embed(texts):
+        vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                vectors[row, int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % dimensions] += 1
+        return list(vectors)
+    return embed
+
+class CachedEmbeddingFunction:
+    # Wraps an embedding function (texts -> vectors). Known texts come from the cache in one
+    # query; the rest are embedded in batches of batch_size and written back.
+    def __init__(self, inner, model: str, batch_size: int = EMBEDDING_BATCH_SIZE, session_factory=SessionLocal):
+        self.inner = inner
+        self.model = model
+        self.batch_size = batch_size
+        self.session_factory = session_factory
+
+    def key(self, text: str):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, input):
+        texts = list(input)
+        keys = [self.key(text) for text in texts]
+        db = self.session_factory()
+        try:
+            cached = crud.get_embedding_cache_entries(db, set(keys))
+            missing = list(dict.fromkeys(k for k in keys if k not in cached))
+            texts_by_key = dict(zip(keys, texts))
+            for start in range(0, len(missing), self.batch_size):
+                batch = missing[start:start + self.batch_size]
+                vectors = self.inner([texts_by_key[k] for k in batch])
+                fresh = {k: np.asarray(v, dtype=np.float32).tobytes() for k, v in zip(batch, vectors)}
+                crud.put_embedding_cache_entries(db, self.model, fresh)
+                cached.update(fresh)
+        finally:
+            db.close()
+        return [np.frombuffer(cached[k], dtype=np.float32) for k in keys]
+
+def _in_scope(scope: str, prefix):
+    if prefix is None or not prefix.strip("/"):
+        return True
+    prefix = "/" + prefix.strip("/")
+    return scope == prefix or scope.startswith(prefix + "/")
+
+class FlatVectorStorage:
+    # Exact (brute-force) cosine search over an in-memory float32 matrix, persisted as
+    # vectors.npy + records.json. A crew run writes a few hundred memories at most, where a
+    # flat scan is sub-millisecond and needs no index maintenance.
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._records = []  # Record dicts without embeddings, aligned with the matrix rows
+        self._vectors = np.zeros((0, 0), dtype=np.float32)  # Unit-normalised rows
+        self._load()
+
+    def _load(self):
+        records_path = os.path.join(self.path, "records.json")
+        if os.path.exists(records_path):
+            with open(records_path, "r", encoding="utf-8") as f:
+                self._records = json.load(f)
+            self._vectors = np.load(os.path.join(self.path, "vectors.npy"))
+
+    def _persist(self):
+        # Write then rename so a crash never leaves records and vectors out of step
+        os.makedirs(self.path, exist_ok=True)
+        tmp_vectors = os.path.join(self.path, "vectors.tmp.npy")
+        tmp_records = os.path.join(self.path, "records.tmp.json")
+        np.save(tmp_vectors, self._vectors)
+        with open(tmp_records, "w", encoding="utf-8") as f:
+            json.dump(self._records, f)
+        os.replace(tmp_vectors, os.path.join(self.path, "vectors.npy"))
+        os.replace(tmp_records, os.path.join(self.path, "records.json"))
+
+    @staticmethod
+    def _to_record(row):
+        return MemoryRecord.model_validate(row)
+
+    def _normalise(self, embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        if self._vectors.shape[0] and vector.shape[0] != self._vectors.shape[1]:
+            raise EmbeddingDimensionMismatchError(self._vectors.shape[1], vector.shape[0])
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _matches(self, row, scope_prefix=None, categories=None, metadata_filter=None, older_than=None):
+        if not _in_scope(row["scope"], scope_prefix):
+            return False
+        if categories and not any(c in row["categories"] for c in categories):
+            return False
+        if metadata_filter and not all(row["metadata"].get(k) == v for k, v in metadata_filter.items()):
+            return False
+        if older_than and datetime.fromisoformat(row["created_at"]) >= older_than:
+            return False
+        return True
+
+    def save(self, records):
+        with self._lock:
+            rows, vectors = [], []
+            for record in records:
+                if not record.embedding:
+                    continue
+                vectors.append(self._normalise(record.embedding))
+                rows.append(record.model_dump(mode="json"))
+            if not rows:
+                return
+            replaced = {row["id"] for row in rows}
+            keep = [i for i, row in enumerate(self._records) if row["id"] not in replaced]
+            existing = self._vectors[keep] if self._vectors.shape[0] else np.zeros((0, len(vectors[0])), dtype=np.float32)
+            self._records = [self._records[i] for i in keep] + rows
+            self._vectors = np.vstack([existing, np.stack(vectors)])
+            self._persist()
+
+    def search(self, query_embedding, scope_prefix=None, categories=None, metadata_filter=None, limit=10, min_score=0.0):
+        with self._lock:
+            if not self._records:
+                return []
+            scores = self._vectors @ self._normalise(query_embedding)
+            results = []
+            for index in np.argsort(-scores):
+                row = self._records[index]
+                score = float(max(scores[index], 0.0))
+                if score < min_score:
+                    break
+                if self._matches(row, scope_prefix, categories, metadata_filter):
+                    results.append((self._to_record(row), score))
+                    if len(results) >= limit:
+                        break
+            return results
+
+    def delete(self, scope_prefix=None, categories=None, record_ids=None, older_than=None, metadata_filter=None):
+        with self._lock:
+            ids = set(record_ids or [])
+            keep = [
+                i for i, row in enumerate(self._records)
+                if not ((not ids or row["id"] in ids) and self._matches(row, scope_prefix, categories, metadata_filter, older_than))
+            ]
+            deleted = len(self._records) - len(keep)
+            if deleted:
+                self._records = [self._records[i] for i in keep]
+                self._vectors = self._vectors[keep]
+                self._persist()
+            return deleted
+
+    def update(self, record):
+        self.save([record])
+
+    def touch_records(self, record_ids):
+        with self._lock:
+            ids, now = set(record_ids), datetime.utcnow().isoformat()
+            for row in self._records:
+                if row["id"] in ids:
+                    row["last_accessed"] = now
+            self._persist()
+
+    def get_record(self, record_id):
+        with self._lock:
+            for row in self._records:
+                if row["id"] == record_id:
+                    return self._to_record(row)
+            return None
+
+    def list_records(self, scope_prefix=None, limit=200, offset=0):
+        with self._lock:
+            rows = [row for row in self._records if _in_scope(row["scope"], scope_prefix)]
+        rows.sort(key=lambda row: row["created_at"], reverse=True)
+        return [self._to_record(row) for row in rows[offset:offset + limit]]
+
+    def get_scope_info(self, scope):
+        scope = "/" + scope.strip("/") if scope.strip("/") else "/"
+        with self._lock:
+            rows = [row for row in self._records if _in_scope(row["scope"], scope)]
+        child_prefix = scope.rstrip("/") + "/"
+        children = {
+            child_prefix + row["scope"][len(child_prefix):].split("/", 1)[0]
+            for row in rows if row["scope"].startswith(child_prefix) and row["scope"] != child_prefix
+        }
+        created = [datetime.fromisoformat(row["created_at"]) for row in rows]
+        return ScopeInfo(
+            path=scope, record_count=len(rows),
+            categories=sorted({c for row in rows for c in row["categories"]}),
+            oldest_record=min(created) if created else None, newest_record=max(created) if created else None,
+            child_scopes=sorted(children),
+        )
+
+    def list_scopes(self, parent="/"):
+        return self.get_scope_info(parent).child_scopes
+
+    def list_categories(self, scope_prefix=None):
+        counts = {}
+        with self._lock:
+            for row in self._records:
+                if _in_scope(row["scope"], scope_prefix):
+                    for c in row["categories"]:
+                        counts[c] = counts.get(c, 0) + 1
+        return counts
+
+    def count(self, scope_prefix=None):
+        with self._lock:
+            return sum(1 for row in self._records if _in_scope(row["scope"], scope_prefix))
+
+    def reset(self, scope_prefix=None):
+        self.delete(scope_prefix=scope_prefix)
+
+    async def asave(self, records):
+        await asyncio.to_thread(self.save, records)
+
+    async def asearch(self, query_embedding, scope_prefix=None, categories=None, metadata_filter=None, limit=10, min_score=0.0):
+        return await asyncio.to_thread(self.search, query_embedding, scope_prefix, categories, metadata_filter, limit, min_score)
+
+    async def adelete(self, scope_prefix=None, categories=None, record_ids=None, older_than=None, metadata_filter=None):
+        return await asyncio.to_thread(self.delete, scope_prefix, categories, record_ids, older_than, metadata_filter)
+
+def build_crew_memory(project_id: int, api_key: str, llm):
+    # Passed to Crew(memory=...) in place of memory=True, which would re-embed everything
+    # through the provider and keep vectors in the shared LanceDB store
+    inner = synthetic_embedder() if EMBEDDER_PROVIDER == "synthetic" else build_embedder(embedder_config(api_key))
+    embedder = CachedEmbeddingFunction(inner, f"{EMBEDDER_PROVIDER}/{EMBEDDER_MODEL}")
+    return Memory(
+        llm=llm,
+        embedder=embedder,
+        storage=FlatVectorStorage(os.path.join(MEMORY_STORE_DIR, f"project_{project_id}")),
+        root_scope=f"/crew/project-{project_id}",
+    )
@@ -1,45 +1,128 @@
 import os
-from crewai import Agent, Task, Crew, Process, LLM
-from crewai_tools import DirectoryReadTool
-from crewai.tools import BaseTool
-from pydantic import Field
-from github import Github
-from sqlalchemy.orm import Session
-import crud, models, schemas
+from crewai import Task, Crew, Process
+from crewai.tasks.task_output import TaskOutput
+from github import GithubException
+import crud, schemas, llm_client
+from context_budget import BudgetedTask, CONTEXT_BUDGET_TOKENS
+from telemetry import RunTelemetry
+from crew_memory import build_crew_memory
+from guidelines import render_backstory
+from crew_templates import ARCHITECTURE_CREW
+from run_planner import task_fingerprint, content_hash, plan_reuse
+from repo_digest import REPO_DIGEST_ENABLED, REPO_DIGEST_TOKENS, get_or_build_digest, render_digest
+from github_tools import (
+    GithubMultiFileReaderTool, GithubGlobTool, GithubCodeSearchTool, GithubDirectoryListerTool, open_repo_source
+)
+from repo_reference import parse_repo_reference
 from database import SessionLocal
 
-class GithubRepoReaderTool(BaseTool):
-    name: str = "Read Github Codebase File"
-    description: str = "Reads the contents of a specific file in the provided GitHub repository. Input MUST be the exact file path (e.g. 'README.md' or 'src/main.py')."
-    github_repo_name: str = Field(description="The name of the github repository to read from")
-    
-    def _run(self, file_path: str) -> str:
-        try:
-            g = Github(os.environ.get("GITHUB_PERSONAL_ACCESS_TOKEN"))
-            repo = g.get_repo(self.github_repo_name)
-            file_content = repo.get_contents(file_path)
-            return file_content.decoded_content.decode('utf-8')
-        except Exception as e:
-            return f"Error reading from Github: {str(e)}"
-
-class GithubDirectoryListerTool(BaseTool):
-    name: str = "List Github Directory Contents"
-    description: str = "Lists all files and folders in a specific directory of the GitHub repository. Input should be the directory path (use '' for the root directory)."
-    github_repo_name: str = Field(description="The name of the github repository to read from")
-    
-    def _run(self, dir_path: str) -> str:
+# "dag" runs tasks as soon as the tasks they depend on are done; "sequential" is the classic pipeline
+CREW_EXECUTION_MODE = os.environ.get("CREW_EXECUTION_MODE", "dag")
+
+# Which upstream outputs each task actually needs, as declared by the crew template
+TASK_DEPENDENCIES = ARCHITECTURE_CREW.dependencies()
+
+# Reuse outputs of earlier runs for tasks whose inputs have not changed (see run_planner.py)
+INCREMENTAL_RUNS = os.environ.get("INCREMENTAL_RUNS", "true").lower() == "true"
+
+# Per-task context budgets in tokens, e.g. CONTEXT_BUDGETS="audit_security=10000,plan_infrastructure=4000".
+# Tasks not listed use CONTEXT_BUDGET_TOKENS.
+TASK_CONTEXT_BUDGETS = {
+    key.strip(): int(value)
+    for key, _, value in (item.partition("=") for item in os.environ.get("CONTEXT_BUDGETS", "").split(",") if item.strip())
+}
+
+def schedule_waves(task_keys, dependencies, completed=()):
+    # Group tasks into waves whose dependencies are all satisfied by earlier waves
+    done = set(completed)
+    remaining = [k for k in task_keys if k not in done]
+    waves = []
+    while remaining:
+        wave = [k for k in remaining if all(d in done for d in dependencies[k])]
+        if not wave:
+            raise ValueError(f"Task dependency cycle between: {', '.join(remaining)}")
+        waves.append(wave)
+        done.update(wave)
+        remaining = [k for k in remaining if k not in done]
+    return waves
+
+def async_task_keys(waves):
+    # crewAI runs consecutive async tasks concurrently and makes the next synchronous task
+    # wait for them; a crew may not end on several async tasks
+    return {key for index, wave in enumerate(waves) if len(wave) > 1 and index < len(waves) - 1 for key in wave}
+
+# Agent steps can be very chatty; only this much of each step is pushed to the event stream
+STEP_EVENT_MAX_CHARS = 2000
+
+def _emit_event(project_id: int, event_type: str, data: dict):
+    # Callbacks may fire from crewAI worker threads, so each event uses its own session
+    db = SessionLocal()
+    try:
+        crud.create_run_event(db, project_id, event_type, data)
+    finally:
+        db.close()
+
+def upstream_tasks(task_keys):
+    # The tasks whose outputs each task is handed: its declared dependencies when running
+    # as a DAG, every earlier task in the sequential pipeline
+    if CREW_EXECUTION_MODE == "dag":
+        return {key: TASK_DEPENDENCIES[key] for key in task_keys}
+    return {key: task_keys[:index] for index, key in enumerate(task_keys)}
+
+def _make_task_callback(project_id: int, job_id: int, task_key: str, task: Task = None, fingerprint=None, run_id: int = None):
+    # Write-through persistence: every finished task is saved immediately so a later
+    # failure does not throw away the work of the agents that already ran
+    def on_task_completed(output):
+        db = SessionLocal()
         try:
-            g = Github(os.environ.get("GITHUB_PERSONAL_ACCESS_TOKEN"))
-            repo = g.get_repo(self.github_repo_name)
-            contents = repo.get_contents(dir_path)
-            files = [f"- {f.path} ({f.type})" for f in contents]
-            return f"Contents of '{dir_path}':\n" + "\n".join(files)
-        except Exception as e:
-            return f"Error listing directory from Github: {str(e)}"
-
-def run_crew_for_project(project_id: int):
+            # Output row and its live event go out in one transaction, with the prompt
+            # size the task ran with
+            crud.create_agent_outputs(db, project_id, [(task_key, schemas.AgentOutputCreate(
+                agent_name=output.agent,
+                task_name=output.description[:50] + "...",
+                output_content=output.raw,
+                input_fingerprint=fingerprint() if fingerprint else None,
+                **(getattr(task, "token_usage", None) or {})
+            ))], job_id=job_id, events=True, run_id=run_id)
+        finally:
+            db.close()
+    return on_task_completed
+
+def _restore_task_output(task: Task, db_output):
+    task.output = TaskOutput(
+        description=task.description,
+        raw=db_output.output_content,
+        agent=task.agent.role
+    )
+
+def _make_step_callback(project_id: int, agent_role: str):
+    def on_step(step):
+        text = getattr(step, "thought", None) or getattr(step, "output", None) or getattr(step, "result", None) or getattr(step, "text", None)
+        if text:
+            _emit_event(project_id, "agent_step", {
+                "agent_name": agent_role,
+                "tool": getattr(step, "tool", None),
+                "text": str(text)[:STEP_EVENT_MAX_CHARS],
+            })
+    return on_step
+
+# LLM clients by API key. The worker pool builds one before forking (see warm_up), so run
+# processes inherit it along with everything crewAI imports lazily on first use.
+_llm_clients = {}
+
+def get_llm(api_key: str):
+    if api_key not in _llm_clients:
+        _llm_clients[api_key] = llm_client.build_llm(api_key)
+    return _llm_clients[api_key]
+
+def warm_up():
+    os.environ["OPENAI_API_KEY"] = "fake-key-to-bypass-crewai-checks"
+    ARCHITECTURE_CREW.build_agents(get_llm(os.environ.get("GOOGLE_API_KEY")))
+
+def run_crew_for_project(project_id: int, job_id: int = None):
     # Setup DB session
     db = SessionLocal()
+    run = None
     try:
         # Fetch Project Data
         project = crud.get_project(db, project_id)
@@ -53,168 +136,137 @@ def run_crew_for_project(project_id: int):
         if not req_text:
             req_text = "No specific requirements provided."
             
+        # Shared guideline versions the project references, plus its own knowledge base text
         kb = crud.get_knowledge_base(db, project_id)
-        pm_text = kb.pm_guidelines if kb and kb.pm_guidelines else "None provided."
-        architect_text = kb.architect_guidelines if kb and kb.architect_guidelines else "None provided."
-        systems_text = kb.systems_guidelines if kb and kb.systems_guidelines else "None provided."
-        ai_text = kb.ai_guidelines if kb and kb.ai_guidelines else "None provided."
-        ux_text = kb.ux_guidelines if kb and kb.ux_guidelines else "None provided."
-        security_text = kb.security_standards if kb and kb.security_standards else "None provided."
+        guidelines = crud.get_project_guidelines(db, project_id)
+
+        def backstory(field, preamble):
+            return render_backstory(preamble, guidelines[field], getattr(kb, field, None) if kb else None)
 
         # Setup Environment Variables (Assumes they are loaded in the environment)
         os.environ["OPENAI_API_KEY"] = "fake-key-to-bypass-crewai-checks"
         api_key = os.environ.get("GOOGLE_API_KEY")
         
         # Parse GitHub URL
-        github_url = project.github_url
-        if github_url and "github.com/" in github_url:
-            github_repo = github_url.split("github.com/")[-1].strip("/")
-        elif github_url:
-            github_repo = github_url.strip("/")
-        else:
-            github_repo = None
+        github_repo = parse_repo_reference(project.github_url)
 
-        gemini_llm = LLM(
-            model="gemini/gemini-3.1-pro-preview", 
-            temperature=0.4,
-            api_key=api_key
-        )
+        # Identical prompts (e.g. unchanged upstream tasks on a re-run) are served from the response cache
+        gemini_llm = get_llm(api_key)
 
         architect_tools = []
+        repo_digest = ""
         if github_repo:
-            repo_reader_tool = GithubRepoReaderTool(github_repo_name=github_repo)
-            dir_lister_tool = GithubDirectoryListerTool(github_repo_name=github_repo)
-            architect_tools = [repo_reader_tool, dir_lister_tool]
-
-        # Build Agents
-        lead_product_manager = Agent(
-            role='Lead Product Manager',
-            goal='Read the raw product requirements and break it down into strict, atomic features.',
-            backstory=f'You are a methodical Product Manager who prevents scope creep. You read messy human ideas and turn them into beautifully structured specs.\n\nMANDATORY GUIDELINES:\n{pm_text}',
-            verbose=True,
-            allow_delegation=False,
-            llm=gemini_llm
-        )
+            # The tools share one local snapshot of the commit (or one pooled client and
+            # per-commit cache) for the whole run. Each reads, finds or searches many files
+            # per call, so exploring a repository takes a few LLM turns rather than one per file.
+            repo_source = open_repo_source(github_repo)
+            architect_tools = [
+                tool(github_repo_name=github_repo, source=repo_source)
+                for tool in (GithubGlobTool, GithubCodeSearchTool, GithubMultiFileReaderTool, GithubDirectoryListerTool)
+            ]
+            if REPO_DIGEST_ENABLED:
+                # The architect starts with a map of the repository instead of listing it level by level
+                # (an aid only: if GitHub cannot list the tree, the run goes on without it)
+                try:
+                    digest, cached = get_or_build_digest(db, github_repo, repo_source)
+                except GithubException as e:
+                    _emit_event(project_id, "repo_digest", {"sha": repo_source.sha, "error": str(e)})
+                else:
+                    repo_digest = render_digest(digest, REPO_DIGEST_TOKENS)
+                    _emit_event(project_id, "repo_digest", {
+                        "sha": repo_source.sha, "files": len(digest["files"]), "cached": cached,
+                        "failed": digest.get("failed", 0), "tokens": llm_client.estimate_tokens(repo_digest),
+                    })
 
-        lead_architect = Agent(
-            role='Lead AI Systems Architect',
-            goal='Design scalable, robust, and forward-looking solutions mapping business requirements to technical architecture.',
-            backstory=f'You are a pragmatic, battle-tested software architect. You favor simplicity over complexity but know when to use advanced design patterns. {"You thoroughly analyze the existing codebase before rendering decisions. " if github_repo else ""}You prefer Python and Next.js.\n\nMANDATORY GUIDELINES:\n{architect_text}',
-            verbose=True,
-            allow_delegation=True,
-            tools=architect_tools,
-            llm=gemini_llm
+        # Agents and tasks come from the shared template, specialised for this project
+        variants = ("repo",) if github_repo else ()
+        agents = ARCHITECTURE_CREW.build_agents(
+            gemini_llm, variants, backstory=backstory, tools={"architect": architect_tools}, verbose=True
         )
+        for agent in agents.values():
+            agent.step_callback = _make_step_callback(project_id, agent.role)
 
-        systems_engineer = Agent(
-            role='Senior Systems Engineer',
-            goal='Ensure the architecture translates into a solid, deployable infrastructure, focusing on databases, CI/CD, and cloud services.',
-            backstory=f'You live in the terminal. You believe everything should be "infrastructure as code" and despise manual deployment steps. You are deeply familiar with AWS, Docker, and Kubernetes.\n\nMANDATORY GUIDELINES:\n{systems_text}',
-            verbose=True,
-            allow_delegation=False,
-            llm=gemini_llm
-        )
+        tasks = ARCHITECTURE_CREW.build_tasks(agents, variants, params={"requirements": req_text, "repo_digest": repo_digest}, task_class=BudgetedTask)
+        for task_key, task in tasks.items():
+            task.context_budget = TASK_CONTEXT_BUDGETS.get(task_key, CONTEXT_BUDGET_TOKENS)
 
-        ai_specialist = Agent(
-            role='AI Integration Specialist',
-            goal='Identify and design the integration points for Large Language Models and other AI functionalities.',
-            backstory=f'You are obsessed with the latest AI models. You know the strengths and weaknesses of Gemini, Claude, and GPT-4.\n\nMANDATORY GUIDELINES:\n{ai_text}',
-            verbose=True,
-            allow_delegation=False,
-            llm=gemini_llm
-        )
+        repo_sha = repo_source.sha if github_repo else None
+        upstream = upstream_tasks(list(tasks))
+        # Every output this execution ends up with is grouped under its run
+        run = crud.start_run(db, project_id, job_id, repo_sha)
 
-        ux_designer = Agent(
-            role='Lead UX/UI Designer',
-            goal='Ensure the final software architecture and product design provide an intuitive, seamless, and visually stunning user experience.',
-            backstory=f'You are a militant advocate for the end-user. You despise convoluted workflows. \n\nMANDATORY UX GUIDELINES TO FOLLOW:\n{ux_text}',
-            verbose=True,
-            allow_delegation=False,
-            llm=gemini_llm
-        )
+        def fingerprint(task_key, upstream_hashes):
+            return task_fingerprint(tasks[task_key], upstream_hashes, repo_sha)
 
-        security_agent = Agent(
-            role='Chief Information Security Officer (CISO)',
-            goal='Audit the architecture, infrastructure, and workflows to ensure maximum security, compliance, and data privacy.',
-            backstory=f'You are paranoid by profession. You assume every system will be breached. \n\nMANDATORY SECURITY STANDARDS TO FOLLOW:\n{security_text}',
-            verbose=True,
-            allow_delegation=False,
-            llm=gemini_llm
-        )
+        def completed_fingerprint(task_key):
+            # Computed when the task finishes, from the upstream outputs it actually read
+            return lambda: fingerprint(task_key, [content_hash(tasks[d].output.raw) for d in upstream[task_key]])
 
-        # Build Tasks
-        deconstruct_requirements = Task(
-            description=f'Analyze the following raw product requirements:\n{req_text}\n\nIdentify the core, distinct features of the application and create a structured breakdown.',
-            expected_output='A structured markdown document listing each atomic feature and its core user stories.',
-            agent=lead_product_manager
-        )
+        # Resume from the checkpoint: tasks finished by an earlier attempt of this job
+        # (or by the failed job it resumes) are restored instead of re-run
+        checkpoint = {}
+        if job_id:
+            checkpoint = crud.get_job_outputs(db, job_id)
+            job = crud.get_job(db, job_id)
+            if not checkpoint and job.resume_from_job_id:
+                crud.copy_job_outputs(db, job.resume_from_job_id, job_id, run_id=run.id)
+                checkpoint = crud.get_job_outputs(db, job_id)
+            if not checkpoint and INCREMENTAL_RUNS:
+                # Outputs of earlier runs whose inputs are unchanged become this job's checkpoint
+                reused = plan_reuse(list(tasks), upstream, fingerprint,
+                                    lambda task_key, fp: crud.find_output_by_fingerprint(db, project_id, task_key, fp))
+                _emit_event(project_id, "run_plan", {
+                    "reused": list(reused), "rerun": [k for k in tasks if k not in reused]
+                })
+                crud.reuse_agent_outputs(db, project_id, reused, job_id, events=True, run_id=run.id)
+                checkpoint = crud.get_job_outputs(db, job_id)
 
-        if github_repo:
-            architect_instruction = '1. READ the feature breakdown produced by the Product Manager to understand the scope.\n2. USE your Github tools to thoroughly explore the current state of the provided repository.\n3. Identify the core components required to build this system and integrate the new features.\n4. Draft a high-level architecture diagram (text-based or Mermaid) showing the relations between systems.'
-            architect_output = 'A comprehensive, technical blueprint of the application architecture, referencing existing code structure and integrating the new feature requests.'
+        pending_tasks = []
+        if CREW_EXECUTION_MODE == "dag":
+            for task_key in checkpoint:
+                _restore_task_output(tasks[task_key], checkpoint[task_key])
+            waves = schedule_waves(list(tasks), TASK_DEPENDENCIES, completed=checkpoint.keys())
+            concurrent = async_task_keys(waves)
+            for wave in waves:
+                for task_key in wave:
+                    task = tasks[task_key]
+                    task.context = [tasks[d] for d in TASK_DEPENDENCIES[task_key]]
+                    task.async_execution = task_key in concurrent
+                    task.callback = _make_task_callback(project_id, job_id, task_key, task, completed_fingerprint(task_key), run.id)
+                    pending_tasks.append(task)
         else:
-            architect_instruction = '1. READ the feature breakdown produced by the Product Manager to understand the scope.\n2. Identify the core components required to build this system from scratch based on the requirements.\n3. Draft a high-level architecture diagram (text-based or Mermaid) showing the relations between systems.'
-            architect_output = 'A comprehensive, technical blueprint of the application architecture from scratch.'
+            for task_key, task in tasks.items():
+                if task_key in checkpoint:
+                    _restore_task_output(task, checkpoint[task_key])
+                    continue
+                if checkpoint:
+                    # Restored tasks are not part of the crew, so hand their outputs over explicitly
+                    task.context = list(tasks.values())[:list(tasks).index(task_key)]
+                task.callback = _make_task_callback(project_id, job_id, task_key, task, completed_fingerprint(task_key), run.id)
+                pending_tasks.append(task)
 
-        draft_architecture = Task(
-            description=architect_instruction,
-            expected_output=architect_output,
-            agent=lead_architect
-        )
+        if pending_tasks:
+            # Start Execution
+            development_team = Crew(
+                agents=list(agents.values()),
+                tasks=pending_tasks,
+                process=Process.sequential,
+                # Embeddings are cached across runs and projects; vectors stay on local disk
+                memory=build_crew_memory(project_id, api_key, gemini_llm),
+            )
 
-        plan_infrastructure = Task(
-            description='Analyze the architecture drafted by the Lead Architect. Determine the necessary cloud resources (compute, databases, caching). Outline a deployment strategy.',
-            expected_output='A bulleted list of required infrastructure components and a step-by-step deployment guide.',
-            agent=systems_engineer
-        )
-
-        design_ai_features = Task(
-            description='Review the architecture and identify where LLMs or AI agents can provide the most value. Define the required prompts, data pipelines, and API integrations.',
-            expected_output='A detailed specification for the AI features, including suggested model choices and data flow diagrams.',
-            agent=ai_specialist
-        )
-
-        design_user_experience = Task(
-            description='Critique the technical architecture from the end-user\'s perspective. Identify potential friction points. Suggest UI components and user flows that simplify complex interactions.',
-            expected_output='A UX review document outlining potential usability issues in the architecture and concrete suggestions for an intuitive user interface layout and flow.',
-            agent=ux_designer
-        )
-
-        audit_security = Task(
-            description='Review the architecture, infrastructure plan, and AI design. Identify potential vulnerabilities, ensure proper data encryption strategies are implemented, and verify compliance with standard privacy regulations (e.g., GDPR/CCPA concepts).',
-            expected_output='A security audit report detailing identified risks and mandatory changes required to secure the architecture before deployment.',
-            agent=security_agent
-        )
-
-        # Start Execution
-        development_team = Crew(
-            agents=[lead_product_manager, lead_architect, systems_engineer, ai_specialist, ux_designer, security_agent],
-            tasks=[deconstruct_requirements, draft_architecture, plan_infrastructure, design_ai_features, design_user_experience, audit_security],
-            process=Process.sequential,
-            memory=True,
-            embedder={
-                "provider": "google-generativeai",
-                "config": {
-                    "model": "models/embedding-001",
-                    "api_key": api_key,
-                }
-            }
-        )
-
-        # Kickoff
-        result = development_team.kickoff()
-        
-        # Save Outputs to Database
-        # Since standard kickoff returns a CrewOutput string, we will just save the final result from each task.
-        for task in development_team.tasks:
-            crud.create_agent_output(db, project_id, schemas.AgentOutputCreate(
-                agent_name=task.agent.role,
-                task_name=task.description[:50] + "...",
-                output_content=task.output.raw if task.output else "No output"
-            ))
+            # Kickoff, recording LLM, tool and task spans into run_metrics
+            telemetry = RunTelemetry(project_id, job_id, {str(task.id): task_key for task_key, task in tasks.items()})
+            with telemetry.attach():
+                development_team.kickoff()
 
+        crud.finish_run(db, run.id, "completed")
         crud.update_project_status(db, project_id, "completed")
     except Exception as e:
+        if run is not None:
+            crud.finish_run(db, run.id, "failed")
         crud.update_project_status(db, project_id, f"error: {str(e)}")
+        # Re-raise so the worker pool can record the failure and schedule a retry
+        raise
     finally:
         db.close()
@@ -0,0 +1,211 @@
+from typing import Dict, List, Optional
+from pydantic import BaseModel, model_validator
+from crewai import Agent, Task
+from guidelines import NO_GUIDELINES
+
+# Declarative crew definitions shared by the web worker (crew_runner.py) and the CLI
+# (development_team.py). Templates are validated once, at import; a run only picks its
+# variants, formats the task descriptions and instantiates the crewAI objects.
+
+class AgentTemplate(BaseModel):
+    role: str
+    goal: str
+    backstory: str
+    guidelines_field: Optional[str] = None  # Knowledge base field appended to the backstory ("" in a variant: none)
+    guidelines_heading: str = "MANDATORY GUIDELINES:"
+    allow_delegation: bool = False
+    variants: Dict[str, Dict[str, str]] = {}  # Variant name -> overridden fields
+
+class TaskTemplate(BaseModel):
+    agent: str
+    description: str  # May use {placeholders} filled from the run's params
+    expected_output: str
+    depends_on: List[str] = []
+    variants: Dict[str, Dict[str, str]] = {}
+
+class CrewTemplate(BaseModel):
+    name: str
+    variants: List[str] = []
+    agents: Dict[str, AgentTemplate]
+    tasks: Dict[str, TaskTemplate]  # In pipeline order
+    param_defaults: Dict[str, str] = {}  # Values of optional task description placeholders
+
+    @model_validator(mode="after")
+    def check_references(self):
+        seen = set()
+        for key, task in self.tasks.items():
+            if task.agent not in self.agents:
+                raise ValueError(f"Task {key} uses unknown agent {task.agent}")
+            # Dependencies must come earlier, which also rules out cycles
+            unknown = [d for d in task.depends_on if d not in seen]
+            if unknown:
+                raise ValueError(f"Task {key} depends on {', '.join(unknown)}, which must be defined before it")
+            seen.add(key)
+        for key, template in [*self.agents.items(), *self.tasks.items()]:
+            for variant, overrides in template.variants.items():
+                if variant not in self.variants:
+                    raise ValueError(f"{key} overrides undeclared variant {variant}")
+                unknown = set(overrides) - set(type(template).model_fields)
+                if unknown:
+                    raise ValueError(f"{key} variant {variant} overrides unknown fields: {', '.join(sorted(unknown))}")
+        return self
+
+    def dependencies(self):
+        return {key: list(task.depends_on) for key, task in self.tasks.items()}
+
+    @staticmethod
+    def _resolve(template, variants):
+        fields = template.model_dump(exclude={"variants"})
+        for variant in variants:
+            fields.update(template.variants.get(variant, {}))
+        return fields
+
+    def build_agents(self, llm, variants=(), backstory=None, tools=None, **agent_kwargs):
+        # backstory(guidelines_field, preamble) renders the guidelines into the backstory, or
+        # returns None when there are none to include (the section is then left out); without
+        # it the guidelines section reads NO_GUIDELINES
+        agents = {}
+        for key, template in self.agents.items():
+            fields = self._resolve(template, variants)
+            text = fields["backstory"]
+            if fields["guidelines_field"]:
+                preamble = f"{text}\n\n{fields['guidelines_heading']}\n"
+                rendered = backstory(fields["guidelines_field"], preamble) if backstory else preamble + NO_GUIDELINES
+                text = text if rendered is None else rendered
+            agents[key] = Agent(
+                role=fields["role"], goal=fields["goal"], backstory=text,
+                allow_delegation=fields["allow_delegation"], tools=(tools or {}).get(key, []),
+                llm=llm, **agent_kwargs
+            )
+        return agents
+
+    def build_tasks(self, agents, variants=(), params=None, task_class=Task, **task_kwargs):
+        tasks = {}
+        for key, template in self.tasks.items():
+            fields = self._resolve(template, variants)
+            tasks[key] = task_class(
+                description=fields["description"].format_map({**self.param_defaults, **(params or {})}),
+                expected_output=fields["expected_output"],
+                agent=agents[fields["agent"]],
+                **task_kwargs
+            )
+        return tasks
+
+# The architecture review crew. "repo" applies when there is a GitHub repository to
+# analyze; "cli" is the file-based flow of development_team.py (which also uses "repo"),
+# with the CLI's own backstories and guidelines only where it has knowledge files.
+ARCHITECTURE_CREW = CrewTemplate(
+    name="architecture_review",
+    variants=["repo", "cli"],
+    # repo_digest: the repository overview from repo_digest.py, when there is one
+    param_defaults={"repo_digest": ""},
+    agents={
+        "product_manager": AgentTemplate(
+            role="Lead Product Manager",
+            goal="Read the raw product requirements and break it down into strict, atomic features.",
+            backstory="You are a methodical Product Manager who prevents scope creep. You read messy human ideas and turn them into beautifully structured specs.",
+            guidelines_field="pm_guidelines",
+            variants={"cli": {
+                "goal": "Read the raw product requirements document and break it down into strict, atomic feature files to ensure modular development.",
+                "backstory": "You are a methodical Product Manager who prevents scope creep. You read messy human ideas and turn them into beautifully structured, isolated feature specs.",
+                "guidelines_field": "",
+            }},
+        ),
+        "architect": AgentTemplate(
+            role="Lead AI Systems Architect",
+            goal="Design scalable, robust, and forward-looking solutions mapping business requirements to technical architecture.",
+            backstory="You are a pragmatic, battle-tested software architect. You favor simplicity over complexity but know when to use advanced design patterns. You prefer Python and Next.js.",
+            guidelines_field="architect_guidelines",
+            allow_delegation=True,
+            variants={
+                "repo": {"backstory": "You are a pragmatic, battle-tested software architect. You favor simplicity over complexity but know when to use advanced design patterns. You thoroughly analyze the existing codebase before rendering decisions. You prefer Python and Next.js."},
+                "cli": {"guidelines_field": ""},
+            },
+        ),
+        "systems_engineer": AgentTemplate(
+            role="Senior Systems Engineer",
+            goal="Ensure the architecture translates into a solid, deployable infrastructure, focusing on databases, CI/CD, and cloud services.",
+            backstory='You live in the terminal. You believe everything should be "infrastructure as code" and despise manual deployment steps. You are deeply familiar with AWS, Docker, and Kubernetes.',
+            guidelines_field="systems_guidelines",
+            variants={"cli": {"guidelines_field": ""}},
+        ),
+        "ai_specialist": AgentTemplate(
+            role="AI Integration Specialist",
+            goal="Identify and design the integration points for Large Language Models and other AI functionalities.",
+            backstory="You are obsessed with the latest AI models. You know the strengths and weaknesses of Gemini, Claude, and GPT-4.",
+            guidelines_field="ai_guidelines",
+            variants={"cli": {
+                "backstory": "You are obsessed with the latest AI models. You know the strengths and weaknesses of Gemini, Claude, and GPT-4. You focus on prompt engineering, RAG architectures, and ensuring AI features actually solve user problems.",
+                "guidelines_field": "",
+            }},
+        ),
+        "ux_designer": AgentTemplate(
+            role="Lead UX/UI Designer",
+            goal="Ensure the final software architecture and product design provide an intuitive, seamless, and visually stunning user experience.",
+            backstory="You are a militant advocate for the end-user. You despise convoluted workflows. ",
+            guidelines_field="ux_guidelines",
+            guidelines_heading="MANDATORY UX GUIDELINES TO FOLLOW:",
+            variants={"cli": {"backstory": "You are a militant advocate for the end-user. You despise convoluted workflows, hidden menus, and jarring visual transitions. You believe that great software should feel invisible and require zero training."}},
+        ),
+        "security_officer": AgentTemplate(
+            role="Chief Information Security Officer (CISO)",
+            goal="Audit the architecture, infrastructure, and workflows to ensure maximum security, compliance, and data privacy.",
+            backstory="You are paranoid by profession. You assume every system will be breached. ",
+            guidelines_field="security_standards",
+            guidelines_heading="MANDATORY SECURITY STANDARDS TO FOLLOW:",
+            variants={"cli": {"backstory": "You are paranoid by profession. You assume every system will be breached and design accordingly. You focus on Zero Trust, principle of least privilege, and strict compliance with global data privacy laws."}},
+        ),
+    },
+    tasks={
+        "deconstruct_requirements": TaskTemplate(
+            agent="product_manager",
+            description="Analyze the following raw product requirements:\n{requirements}\n\nIdentify the core, distinct features of the application and create a structured breakdown.",
+            expected_output="A structured markdown document listing each atomic feature and its core user stories.",
+            variants={"cli": {
+                "description": "1. Read the `requirements.md` file to understand the overall project.\n2. Identify the core, distinct features of the application.\n3. For each feature you identify, use your tool to create a new markdown file inside the `features/` directory (e.g., `features/conversational_search.md`). The file should contain a clear description of that specific feature and any user stories.",
+                "expected_output": "Multiple atomic markdown files created in the `features/` directory, one for each feature.",
+            }},
+        ),
+        "draft_architecture": TaskTemplate(
+            agent="architect",
+            depends_on=["deconstruct_requirements"],
+            description="1. READ the feature breakdown produced by the Product Manager to understand the scope.\n2. Identify the core components required to build this system from scratch based on the requirements.\n3. Draft a high-level architecture diagram (text-based or Mermaid) showing the relations between systems.",
+            expected_output="A comprehensive, technical blueprint of the application architecture from scratch.",
+            variants={
+                "repo": {
+                    "description": "1. READ the feature breakdown produced by the Product Manager to understand the scope.\n2. USE your Github tools to thoroughly explore the current state of the provided repository: find files by pattern, search the code, and read every file you need in as few calls as possible.\n3. Identify the core components required to build this system and integrate the new features.\n4. Draft a high-level architecture diagram (text-based or Mermaid) showing the relations between systems.\n\n{repo_digest}",
+                    "expected_output": "A comprehensive, technical blueprint of the application architecture, referencing existing code structure and integrating the new feature requests.",
+                },
+                "cli": {"description": "1. READ the contents of the `features/` directory produced by the Product Manager to understand the scope.\n2. USE your Github tools to thoroughly explore the current state of the provided repository.\n3. Identify the core components required to build this system and integrate the new features.\n4. Draft a high-level architecture diagram (text-based or Mermaid) showing the relations between systems."},
+            },
+        ),
+        # Infrastructure, AI and UX only read the architect's blueprint, so they can run
+        # side by side; the security audit waits for all of them
+        "plan_infrastructure": TaskTemplate(
+            agent="systems_engineer",
+            depends_on=["draft_architecture"],
+            description="Analyze the architecture drafted by the Lead Architect. Determine the necessary cloud resources (compute, databases, caching). Outline a deployment strategy.",
+            expected_output="A bulleted list of required infrastructure components and a step-by-step deployment guide.",
+        ),
+        "design_ai_features": TaskTemplate(
+            agent="ai_specialist",
+            depends_on=["draft_architecture"],
+            description="Review the architecture and identify where LLMs or AI agents can provide the most value. Define the required prompts, data pipelines, and API integrations.",
+            expected_output="A detailed specification for the AI features, including suggested model choices and data flow diagrams.",
+        ),
+        "design_user_experience": TaskTemplate(
+            agent="ux_designer",
+            depends_on=["draft_architecture"],
+            description="Critique the technical architecture from the end-user's perspective. Identify potential friction points. Suggest UI components and user flows that simplify complex interactions.",
+            expected_output="A UX review document outlining potential usability issues in the architecture and concrete suggestions for an intuitive user interface layout and flow.",
+        ),
+        "audit_security": TaskTemplate(
+            agent="security_officer",
+            depends_on=["draft_architecture", "plan_infrastructure", "design_ai_features", "design_user_experience"],
+            description="Review the architecture, infrastructure plan, and AI design. Identify potential vulnerabilities, ensure proper data encryption strategies are implemented, and verify compliance with standard privacy regulations (e.g., GDPR/CCPA concepts).",
+            expected_output="A security audit report detailing identified risks and mandatory changes required to secure the architecture before deployment.",
+        ),
+    },
+)
+
+CREW_TEMPLATES = {ARCHITECTURE_CREW.name: ARCHITECTURE_CREW}
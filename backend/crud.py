@@ -1,11 +1,98 @@
-from sqlalchemy.orm import Session
-import models, schemas
+import os
+import json
+import time
+import base64
+import hashlib
+from datetime import datetime, timedelta
+from sqlalchemy import func, or_, and_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, load_only, selectinload, defer, aliased
+import models, schemas, search_index
+from blob_store import blob_store, BLOB_GC_MIN_AGE_SECONDS
+
+ACTIVE_JOB_STATUSES = ("queued", "running")
+JOB_PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+# Run events only feed the live view, so each project keeps its newest ones once a run ends
+RUN_EVENTS_KEEP = int(os.environ.get("RUN_EVENTS_KEEP", "1000"))
+KB_FIELDS = ("pm_guidelines", "architect_guidelines", "systems_guidelines", "ai_guidelines", "ux_guidelines", "security_standards")
 
 def get_project(db: Session, project_id: int):
     return db.query(models.Project).filter(models.Project.id == project_id).first()
 
-def get_projects(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Project).offset(skip).limit(limit).all()
+# Read queries are built as statements so the sync functions here and the async ones in
+# async_crud.py execute exactly the same SQL.
+
+def project_detail_query(project_id: int, include_outputs: bool = True):
+    # Relationships are fetched with one SELECT each instead of lazily per access
+    outputs = selectinload(models.Project.agent_outputs)
+    if not include_outputs:
+        outputs = outputs.options(defer(models.AgentOutput.inline_content))
+    return select(models.Project).options(
+        selectinload(models.Project.knowledge_base),
+        selectinload(models.Project.guideline_refs),
+        selectinload(models.Project.requirements),
+        outputs
+    ).where(models.Project.id == project_id)
+
+def project_version_query(project_id: int):
+    return select(models.Project.id, models.Project.version).where(models.Project.id == project_id)
+
+def get_project_version(db: Session, project_id: int):
+    # None if the project does not exist; rows created before versioning count as version 0
+    row = db.execute(project_version_query(project_id)).first()
+    return None if row is None else row.version or 0
+
+def touch_project_statement(project_id: int):
+    # An UPDATE rather than an attribute increment so concurrent writers never reuse a version
+    return update(models.Project).where(models.Project.id == project_id).values(
+        version=func.coalesce(models.Project.version, 0) + 1,
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False)
+
+def touch_project(db: Session, project_id: int):
+    # Part of the caller's transaction; committed with the change it records
+    db.execute(touch_project_statement(project_id))
+
+def get_project_detail(db: Session, project_id: int, include_outputs: bool = True):
+    return db.scalars(project_detail_query(project_id, include_outputs)).first()
+
+def encode_project_cursor(db_project):
+    raw = f"{db_project.created_at.isoformat()}|{db_project.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_project_cursor(cursor: str):
+    # Raises ValueError for anything that is not a cursor we handed out
+    try:
+        created_at, project_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split("|")
+        return datetime.fromisoformat(created_at), int(project_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def projects_query(limit: int = 100, cursor: str = None, status: str = None, title: str = None):
+    # Newest first, paginated by (created_at, id) so deep pages cost the same as the first.
+    # Listings only need the summary columns; relationships are never touched.
+    query = select(models.Project).options(load_only(
+        models.Project.id, models.Project.title, models.Project.description,
+        models.Project.github_url, models.Project.status, models.Project.created_at
+    ))
+    if status == "error":
+        # Failed projects carry the message in their status ("error: ...")
+        query = query.where(models.Project.status >= "error", models.Project.status < "error\uffff")
+    elif status:
+        query = query.where(models.Project.status == status)
+    if title:
+        # Prefix match expressed as a range so the title index can be used
+        query = query.where(models.Project.title >= title, models.Project.title < title + "\uffff")
+    if cursor:
+        created_at, project_id = decode_project_cursor(cursor)
+        query = query.where(or_(
+            models.Project.created_at < created_at,
+            and_(models.Project.created_at == created_at, models.Project.id < project_id)
+        ))
+    return query.order_by(models.Project.created_at.desc(), models.Project.id.desc()).limit(limit)
+
+def get_projects(db: Session, limit: int = 100, cursor: str = None, status: str = None, title: str = None):
+    return db.scalars(projects_query(limit=limit, cursor=cursor, status=status, title=title)).all()
 
 def create_project(db: Session, project: schemas.ProjectCreate):
     db_project = models.Project(title=project.title, description=project.description, github_url=project.github_url)
@@ -24,6 +111,7 @@ def create_project(db: Session, project: schemas.ProjectCreate):
         security_standards=""
     )
     db.add(db_kb)
+    db.add_all(default_guideline_refs(db_project.id, db.scalars(default_guideline_documents_query()).all()))
     db.commit()
     return db_project
 
@@ -31,8 +119,9 @@ def update_project_status(db: Session, project_id: int, status: str):
     db_project = get_project(db, project_id)
     if db_project:
         db_project.status = status
+        db.add(models.RunEvent(project_id=project_id, event_type="status", data=json.dumps({"status": status})))
+        touch_project(db, project_id)
         db.commit()
-        db.refresh(db_project)
     return db_project
 
 def get_knowledge_base(db: Session, project_id: int):
@@ -47,18 +136,157 @@ def update_knowledge_base(db: Session, project_id: int, kb: schemas.KnowledgeBas
         db_kb.ai_guidelines = kb.ai_guidelines
         db_kb.ux_guidelines = kb.ux_guidelines
         db_kb.security_standards = kb.security_standards
+        touch_project(db, project_id)
         db.commit()
         db.refresh(db_kb)
     else:
         db_kb = models.KnowledgeBase(project_id=project_id, **kb.dict())
         db.add(db_kb)
+        touch_project(db, project_id)
         db.commit()
         db.refresh(db_kb)
     return db_kb
 
+# --- Guideline library ---
+
+def guideline_documents_query():
+    return select(models.GuidelineDocument).order_by(models.GuidelineDocument.name)
+
+def guideline_document_by_name_query(name: str):
+    return select(models.GuidelineDocument).where(models.GuidelineDocument.name == name)
+
+def default_guideline_documents_query():
+    return guideline_documents_query().where(models.GuidelineDocument.is_default.is_(True))
+
+def default_guideline_refs(project_id: int, documents):
+    # New projects follow the latest version of every standard marked is_default (opt-in,
+    # per document) instead of copying it
+    return [
+        models.GuidelineReference(project_id=project_id, kb_field=document.kb_field, document_id=document.id, position=position)
+        for position, document in enumerate(documents)
+    ]
+
+def guideline_versions_query(document_id: int):
+    # Listings leave the bodies out; fetch a single version for its content
+    return select(models.GuidelineVersion).options(defer(models.GuidelineVersion.content)).where(
+        models.GuidelineVersion.document_id == document_id
+    ).order_by(models.GuidelineVersion.version.desc())
+
+def guideline_version_query(document_id: int, version: int):
+    return select(models.GuidelineVersion).where(
+        models.GuidelineVersion.document_id == document_id, models.GuidelineVersion.version == version
+    )
+
+def guideline_content_hash(content: str):
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+def new_guideline_version(db_document, content: str, latest_hash: str = None):
+    # Returns the next version, or None when the content equals the latest one
+    content_hash = guideline_content_hash(content)
+    if content_hash == latest_hash:
+        return None
+    db_document.latest_version = (db_document.latest_version or 0) + 1
+    return models.GuidelineVersion(document_id=db_document.id, version=db_document.latest_version, content=content, content_hash=content_hash)
+
+def latest_guideline_hash_query(db_document):
+    return select(models.GuidelineVersion.content_hash).where(
+        models.GuidelineVersion.document_id == db_document.id,
+        models.GuidelineVersion.version == db_document.latest_version
+    )
+
+def touch_guideline_followers_statement(document_id: int):
+    # Projects that follow a document's latest version see new content, so their ETags move
+    followers = select(models.GuidelineReference.project_id).where(
+        models.GuidelineReference.document_id == document_id, models.GuidelineReference.version.is_(None)
+    )
+    return update(models.Project).where(models.Project.id.in_(followers)).values(
+        version=func.coalesce(models.Project.version, 0) + 1,
+        updated_at=datetime.utcnow()
+    ).execution_options(synchronize_session=False)
+
+def create_guideline_document(db: Session, document: schemas.GuidelineDocumentCreate):
+    db_document = models.GuidelineDocument(name=document.name, kb_field=document.kb_field, is_default=document.is_default, latest_version=0)
+    db.add(db_document)
+    db.flush()
+    db.add(new_guideline_version(db_document, document.content))
+    db.commit()
+    return db_document
+
+def add_guideline_version(db: Session, db_document, content: str):
+    db_version = new_guideline_version(db_document, content, db.scalar(latest_guideline_hash_query(db_document)))
+    if db_version is None:
+        return db.scalars(guideline_version_query(db_document.id, db_document.latest_version)).first()
+    db.add(db_version)
+    db.execute(touch_guideline_followers_statement(db_document.id))
+    db.commit()
+    return db_version
+
+def guideline_references(project_id: int, refs):
+    positions = {}
+    db_refs = []
+    for ref in refs:
+        position = positions[ref.kb_field] = positions.get(ref.kb_field, -1) + 1
+        db_refs.append(models.GuidelineReference(project_id=project_id, position=position, **ref.model_dump()))
+    return db_refs
+
+def set_guideline_references(db: Session, project_id: int, refs):
+    db.query(models.GuidelineReference).filter(models.GuidelineReference.project_id == project_id).delete(synchronize_session=False)
+    db_refs = guideline_references(project_id, refs)
+    db.add_all(db_refs)
+    touch_project(db, project_id)
+    db.commit()
+    return db_refs
+
+# Guideline versions never change once written, so a process keeps every body it has
+# loaded and only fetches versions it has not seen yet
+_guideline_contents = {}
+
+def project_guideline_versions_query(project_id: int):
+    ref = models.GuidelineReference
+    resolved = func.coalesce(ref.version, models.GuidelineDocument.latest_version)
+    return select(ref.kb_field, models.GuidelineVersion.id, models.GuidelineVersion.document_id, models.GuidelineVersion.version).join(
+        models.GuidelineDocument, models.GuidelineDocument.id == ref.document_id
+    ).join(
+        models.GuidelineVersion,
+        and_(models.GuidelineVersion.document_id == ref.document_id, models.GuidelineVersion.version == resolved)
+    ).where(ref.project_id == project_id).order_by(ref.kb_field, ref.position, ref.id)
+
+def get_project_guidelines(db: Session, project_id: int):
+    # {kb_field: [(document_id, version, content), ...]} for the versions a project references
+    rows = db.execute(project_guideline_versions_query(project_id)).all()
+    missing = [row.id for row in rows if row.id not in _guideline_contents]
+    if missing:
+        for version_id, content in db.execute(select(models.GuidelineVersion.id, models.GuidelineVersion.content).where(models.GuidelineVersion.id.in_(missing))):
+            _guideline_contents[version_id] = content
+    guidelines = {field: [] for field in KB_FIELDS}
+    for row in rows:
+        guidelines[row.kb_field].append((row.document_id, row.version, _guideline_contents[row.id]))
+    return guidelines
+
+def sync_guideline_files(db: Session, directory: str):
+    # Loads <kb_field>.md files (e.g. knowledge/ux_guidelines.md) into the library. They are
+    # not defaults: projects only follow them once referenced. Unchanged files add nothing,
+    # so this is cheap to run on every start.
+    if not os.path.isdir(directory):
+        return
+    for field in KB_FIELDS:
+        path = os.path.join(directory, f"{field}.md")
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            content = f.read()
+        db_document = db.scalars(guideline_document_by_name_query(field)).first()
+        if db_document is None:
+            create_guideline_document(db, schemas.GuidelineDocumentCreate(name=field, kb_field=field, content=content))
+        else:
+            add_guideline_version(db, db_document, content)
+
 def create_requirement(db: Session, project_id: int, requirement: schemas.RequirementCreate):
     db_req = models.Requirement(project_id=project_id, content=requirement.content)
     db.add(db_req)
+    db.flush()
+    index_documents(db, [search_index.requirement_document(db_req)])
+    touch_project(db, project_id)
     db.commit()
     db.refresh(db_req)
     return db_req
@@ -66,12 +294,584 @@ def create_requirement(db: Session, project_id: int, requirement: schemas.Requir
 def get_requirements(db: Session, project_id: int):
     return db.query(models.Requirement).filter(models.Requirement.project_id == project_id).all()
 
-def create_agent_output(db: Session, project_id: int, output: schemas.AgentOutputCreate):
-    db_output = models.AgentOutput(project_id=project_id, **output.dict())
+def create_agent_output(db: Session, project_id: int, output: schemas.AgentOutputCreate, job_id: int = None, task_key: str = None):
+    db_output = models.AgentOutput(project_id=project_id, job_id=job_id, task_key=task_key, **output.dict())
     db.add(db_output)
+    db.flush()
+    index_documents(db, [search_index.output_document(db_output, output.output_content)])
+    touch_project(db, project_id)
     db.commit()
     db.refresh(db_output)
     return db_output
 
-def get_agent_outputs(db: Session, project_id: int):
-    return db.query(models.AgentOutput).filter(models.AgentOutput.project_id == project_id).order_by(models.AgentOutput.created_at.asc()).all()
+def latest_output_hashes_query(project_id: int, task_keys):
+    # Body hash of the most recent output of each task
+    latest = select(func.max(models.AgentOutput.id)).where(
+        models.AgentOutput.project_id == project_id,
+        models.AgentOutput.task_key.in_(task_keys),
+        models.AgentOutput.content_hash.isnot(None)
+    ).group_by(models.AgentOutput.task_key)
+    return select(models.AgentOutput.task_key, models.AgentOutput.content_hash).where(models.AgentOutput.id.in_(latest))
+
+def create_agent_outputs(db: Session, project_id: int, outputs, job_id: int = None, events: bool = False, run_id: int = None):
+    # Inserts many (task_key, AgentOutputCreate) pairs in a single transaction. Rows are
+    # flushed rather than refreshed, which is enough to know their ids, and each can be
+    # paired with its task_completed event in the same commit. Events carry the summary
+    # and preview only; clients fetch bodies from /outputs/{id}/content.
+    # Each body is stored as a delta against the task's previous version when that is smaller.
+    bases = dict(db.execute(latest_output_hashes_query(project_id, [task_key for task_key, _ in outputs if task_key])).all())
+    db_outputs = []
+    for task_key, output in outputs:
+        db_output = models.AgentOutput(project_id=project_id, job_id=job_id, run_id=run_id, task_key=task_key,
+                                       **output.model_dump(exclude={"output_content"}))
+        db_output.set_content(output.output_content, bases.get(task_key))
+        db_outputs.append(db_output)
+    return _add_agent_outputs(db, project_id, db_outputs, events, bodies=[output.output_content for _, output in outputs])
+
+def index_documents(db: Session, documents):
+    # Search index rows join the caller's transaction, so they commit with what they index
+    if search_index.SEARCH_ENABLED and documents:
+        db.execute(search_index.INSERT_DOCUMENT, documents)
+
+def _add_agent_outputs(db: Session, project_id: int, db_outputs, events: bool, bodies=None):
+    db.add_all(db_outputs)
+    db.flush()
+    if bodies is not None:
+        # Reused copies are not indexed: the output they were copied from already is
+        index_documents(db, [search_index.output_document(o, body) for o, body in zip(db_outputs, bodies)])
+    if events:
+        db.add_all([
+            models.RunEvent(project_id=project_id, event_type="task_completed",
+                            data=json.dumps(schemas.AgentOutputSummary.model_validate(o).model_dump(mode="json")))
+            for o in db_outputs
+        ])
+    touch_project(db, project_id)
+    db.commit()
+    return db_outputs
+
+def reuse_agent_outputs(db: Session, project_id: int, sources, job_id: int, events: bool = False, run_id: int = None):
+    # Copies {task_key: AgentOutput} rows into a job. The body stays where it is: the copy
+    # points at the same blob (or carries the same legacy inline text).
+    columns = ("agent_name", "task_name", "inline_content", "content_hash", "content_size", "preview",
+               "prompt_tokens", "context_tokens", "context_tokens_before", "input_fingerprint")
+    db_outputs = [
+        models.AgentOutput(project_id=project_id, job_id=job_id, run_id=run_id, task_key=task_key, reused_from_id=source.reused_from_id or source.id,
+                           **{column: getattr(source, column) for column in columns})
+        for task_key, source in sources.items()
+    ]
+    return _add_agent_outputs(db, project_id, db_outputs, events) if db_outputs else []
+
+def get_job_outputs(db: Session, job_id: int):
+    # The checkpoint of a job: the latest output of every task it has finished, keyed by task
+    outputs = db.query(models.AgentOutput).filter(
+        models.AgentOutput.job_id == job_id,
+        models.AgentOutput.task_key.isnot(None)
+    ).order_by(models.AgentOutput.id.asc()).all()
+    return {o.task_key: o for o in outputs}
+
+def copy_job_outputs(db: Session, from_job_id: int, to_job_id: int, run_id: int = None):
+    sources = get_job_outputs(db, from_job_id)
+    if not sources:
+        return []
+    return reuse_agent_outputs(db, next(iter(sources.values())).project_id, sources, to_job_id, run_id=run_id)
+
+def find_output_by_fingerprint(db: Session, project_id: int, task_key: str, fingerprint: str):
+    # The most recent output of this task computed from exactly these inputs
+    return db.query(models.AgentOutput).filter(
+        models.AgentOutput.input_fingerprint == fingerprint,
+        models.AgentOutput.project_id == project_id,
+        models.AgentOutput.task_key == task_key
+    ).order_by(models.AgentOutput.id.desc()).first()
+
+def agent_outputs_query(project_id: int, since: int = None, limit: int = None):
+    # Ids increase with insertion, so "since" is a cursor: only rows the client has not seen
+    query = select(models.AgentOutput).where(models.AgentOutput.project_id == project_id)
+    if since:
+        query = query.where(models.AgentOutput.id > since)
+    query = query.order_by(models.AgentOutput.id.asc())
+    if limit:
+        query = query.limit(limit)
+    return query
+
+def get_agent_outputs(db: Session, project_id: int, since: int = None, limit: int = None):
+    return db.scalars(agent_outputs_query(project_id, since=since, limit=limit)).all()
+
+def search(db: Session, query: str, project_id: int = None, agent_name: str = None, kind: str = None, limit: int = 20, offset: int = 0):
+    match = search_index.match_expression(query)
+    if not match:
+        return []
+    return db.execute(search_index.search_statement(match, project_id, agent_name, kind, limit, offset)).mappings().all()
+
+def start_run(db: Session, project_id: int, job_id: int = None, repo_sha: str = None):
+    # A retried or resumed attempt of a job continues the job's run
+    db_run = db.query(models.Run).filter(models.Run.job_id == job_id).first() if job_id else None
+    if db_run is None:
+        number = db.query(func.coalesce(func.max(models.Run.number), 0)).filter(models.Run.project_id == project_id).scalar() + 1
+        db_run = models.Run(project_id=project_id, job_id=job_id, number=number)
+        db.add(db_run)
+    db_run.status, db_run.repo_sha, db_run.finished_at = "running", repo_sha, None
+    db.commit()
+    db.refresh(db_run)
+    return db_run
+
+def finish_run(db: Session, run_id: int, status: str):
+    db.query(models.Run).filter(models.Run.id == run_id).update({"status": status, "finished_at": datetime.utcnow()})
+    db_run = db.get(models.Run, run_id)
+    if db_run is not None:
+        prune_run_events(db, db_run.project_id)
+    db.commit()
+
+def runs_query(project_id: int):
+    return select(models.Run).where(models.Run.project_id == project_id).order_by(models.Run.number.desc())
+
+def previous_run_query(db_run):
+    return select(models.Run).where(
+        models.Run.project_id == db_run.project_id, models.Run.number < db_run.number
+    ).order_by(models.Run.number.desc()).limit(1)
+
+def run_outputs_query(run_id: int, include_content: bool = False):
+    query = select(models.AgentOutput).where(models.AgentOutput.run_id == run_id).order_by(models.AgentOutput.id.asc())
+    # Legacy inline bodies are only needed to read content
+    return query if include_content else query.options(defer(models.AgentOutput.inline_content))
+
+def latest_by_task(db_outputs):
+    # A task that ran more than once in a run (e.g. across attempts) counts with its last output
+    return {o.task_key: o for o in db_outputs}
+
+def get_run_outputs(db: Session, run_id: int, include_content: bool = False):
+    return latest_by_task(db.scalars(run_outputs_query(run_id, include_content)).all())
+
+def get_job(db: Session, job_id: int):
+    return db.query(models.Job).filter(models.Job.id == job_id).first()
+
+def get_active_job(db: Session, project_id: int):
+    return db.query(models.Job).filter(
+        models.Job.project_id == project_id,
+        models.Job.status.in_(ACTIVE_JOB_STATUSES)
+    ).order_by(models.Job.id.desc()).first()
+
+def get_last_failed_job(db: Session, project_id: int):
+    return db.query(models.Job).filter(
+        models.Job.project_id == project_id,
+        models.Job.status.in_(("failed", "cancelled"))
+    ).order_by(models.Job.id.desc()).first()
+
+def enqueue_job(db: Session, project_id: int, max_attempts: int = 3, resume: bool = False, priority: int = 1, batch_id: str = None):
+    # A project only ever has one queued or running job; re-submitting returns the existing one
+    existing = get_active_job(db, project_id)
+    if existing:
+        return existing, False
+    resume_from = get_last_failed_job(db, project_id) if resume else None
+    db_job = models.Job(
+        project_id=project_id, max_attempts=max_attempts, priority=priority, batch_id=batch_id,
+        resume_from_job_id=resume_from.id if resume_from else None
+    )
+    db.add(db_job)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request queued one first (ix_jobs_active_project_id)
+        db.rollback()
+        return get_active_job(db, project_id), False
+    db.refresh(db_job)
+    return db_job, True
+
+def claim_next_job(db: Session, worker_id: str, lease_seconds: int):
+    now = datetime.utcnow()
+    requeue_stale_jobs(db, now - timedelta(seconds=lease_seconds))
+    # Higher priority classes go first. Within a class, batches take turns: the job whose
+    # batch has the fewest running jobs wins, so one large batch cannot starve the others.
+    running = aliased(models.Job)
+    running_in_batch = select(func.count(running.id)).where(
+        running.batch_id == models.Job.batch_id,
+        running.status == "running"
+    ).correlate(models.Job).scalar_subquery()
+    candidates = db.query(models.Job.id).filter(
+        models.Job.status == "queued",
+        models.Job.available_at <= now
+    ).order_by(
+        func.coalesce(models.Job.priority, 1).asc(), running_in_batch.asc(),
+        models.Job.available_at.asc(), models.Job.id.asc()
+    ).limit(5).all()
+    for (job_id,) in candidates:
+        # Conditional update so that two workers racing for the same row cannot both win
+        claimed = db.query(models.Job).filter(
+            models.Job.id == job_id,
+            models.Job.status == "queued"
+        ).update({
+            models.Job.status: "running",
+            models.Job.worker_id: worker_id,
+            models.Job.attempts: models.Job.attempts + 1,
+            models.Job.started_at: now,
+            models.Job.heartbeat_at: now,
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return get_job(db, job_id)
+    return None
+
+def requeue_stale_jobs(db: Session, stale_before: datetime):
+    # Jobs whose worker stopped heartbeating (crash, restart) go back on the queue
+    stale = db.query(models.Job).filter(
+        models.Job.status == "running",
+        models.Job.heartbeat_at < stale_before
+    ).all()
+    for db_job in stale:
+        if db_job.cancel_requested:
+            db_job.status = "cancelled"
+            db_job.finished_at = datetime.utcnow()
+        elif db_job.attempts >= db_job.max_attempts:
+            db_job.status = "failed"
+            db_job.error = db_job.error or "Worker lost while running job"
+            db_job.finished_at = datetime.utcnow()
+        else:
+            db_job.status = "queued"
+            db_job.available_at = datetime.utcnow()
+            update_project_status(db, db_job.project_id, "queued")
+    if stale:
+        db.commit()
+    return stale
+
+def heartbeat_jobs(db: Session, job_ids):
+    if not job_ids:
+        return
+    db.query(models.Job).filter(models.Job.id.in_(job_ids)).update(
+        {models.Job.heartbeat_at: datetime.utcnow()}, synchronize_session=False
+    )
+    db.commit()
+
+def set_job_error(db: Session, job_id: int, error: str):
+    db_job = get_job(db, job_id)
+    if db_job:
+        db_job.error = error
+        db.commit()
+    return db_job
+
+def complete_job(db: Session, job_id: int):
+    db_job = get_job(db, job_id)
+    if db_job:
+        db_job.status = "completed"
+        db_job.error = None
+        db_job.finished_at = datetime.utcnow()
+        db.commit()
+    return db_job
+
+def fail_job(db: Session, job_id: int, retry_backoff_seconds: int):
+    db_job = get_job(db, job_id)
+    if not db_job:
+        return None
+    if db_job.attempts < db_job.max_attempts and not db_job.cancel_requested:
+        # Exponential backoff between attempts
+        delay = retry_backoff_seconds * (2 ** (db_job.attempts - 1))
+        db_job.status = "queued"
+        db_job.available_at = datetime.utcnow() + timedelta(seconds=delay)
+        update_project_status(db, db_job.project_id, "queued")
+    else:
+        db_job.status = "failed"
+        db_job.finished_at = datetime.utcnow()
+        update_project_status(db, db_job.project_id, f"error: {db_job.error or 'run failed'}")
+    db.commit()
+    return db_job
+
+def cancel_job(db: Session, job_id: int):
+    db_job = get_job(db, job_id)
+    if not db_job or db_job.status not in ACTIVE_JOB_STATUSES:
+        return db_job
+    db_job.cancel_requested = True
+    if db_job.status == "queued":
+        db_job.status = "cancelled"
+        db_job.finished_at = datetime.utcnow()
+        update_project_status(db, db_job.project_id, "cancelled")
+    # Running jobs are stopped by the worker that owns them
+    db.commit()
+    return db_job
+
+def mark_job_cancelled(db: Session, job_id: int):
+    db_job = get_job(db, job_id)
+    if db_job:
+        db_job.status = "cancelled"
+        db_job.finished_at = datetime.utcnow()
+        # The terminated run process never reached finish_run(); close its run here
+        db.query(models.Run).filter(models.Run.job_id == job_id, models.Run.status == "running").update(
+            {"status": "cancelled", "finished_at": db_job.finished_at}
+        )
+        update_project_status(db, db_job.project_id, "cancelled")
+        prune_run_events(db, db_job.project_id)
+        db.commit()
+    return db_job
+
+def get_cancel_requested_job_ids(db: Session, job_ids):
+    if not job_ids:
+        return set()
+    rows = db.query(models.Job.id).filter(
+        models.Job.id.in_(job_ids),
+        models.Job.cancel_requested == True
+    ).all()
+    return {row[0] for row in rows}
+
+def get_batch_jobs(db: Session, batch_id: str):
+    return db.query(models.Job).filter(models.Job.batch_id == batch_id).order_by(models.Job.id.asc()).all()
+
+def create_run_event(db: Session, project_id: int, event_type: str, data: dict):
+    db_event = models.RunEvent(project_id=project_id, event_type=event_type, data=json.dumps(data))
+    db.add(db_event)
+    db.commit()
+    return db_event
+
+def run_events_query(project_id: int, after_id: int = 0, limit: int = 100):
+    return select(models.RunEvent).where(
+        models.RunEvent.project_id == project_id,
+        models.RunEvent.id > after_id
+    ).order_by(models.RunEvent.id.asc()).limit(limit)
+
+def get_run_events(db: Session, project_id: int, after_id: int = 0, limit: int = 100):
+    return db.scalars(run_events_query(project_id, after_id=after_id, limit=limit)).all()
+
+def prune_run_events(db: Session, project_id: int, keep: int = RUN_EVENTS_KEEP):
+    # Deletes all but the project's newest events (mostly per-step agent progress);
+    # a client resuming from a deleted id simply continues with the newer ones
+    cutoff = db.query(models.RunEvent.id).filter(models.RunEvent.project_id == project_id).order_by(
+        models.RunEvent.id.desc()
+    ).offset(keep).limit(1).scalar()
+    if cutoff is not None:
+        db.query(models.RunEvent).filter(models.RunEvent.project_id == project_id, models.RunEvent.id <= cutoff).delete(synchronize_session=False)
+
+def get_last_run_event_id(db: Session, project_id: int):
+    last = db.query(models.RunEvent.id).filter(
+        models.RunEvent.project_id == project_id
+    ).order_by(models.RunEvent.id.desc()).first()
+    return last[0] if last else 0
+
+def record_cache_stat(db: Session, name: str, hits: int = 0, misses: int = 0, evictions: int = 0):
+    updated = db.query(models.CacheStats).filter(models.CacheStats.name == name).update({
+        models.CacheStats.hits: models.CacheStats.hits + hits,
+        models.CacheStats.misses: models.CacheStats.misses + misses,
+        models.CacheStats.evictions: models.CacheStats.evictions + evictions,
+    }, synchronize_session=False)
+    if not updated:
+        db.add(models.CacheStats(name=name, hits=hits, misses=misses, evictions=evictions))
+    db.commit()
+
+def get_llm_cache_entry(db: Session, key: str, ttl_seconds: int):
+    db_entry = db.query(models.LLMCacheEntry).filter(models.LLMCacheEntry.key == key).first()
+    now = datetime.utcnow()
+    if db_entry and db_entry.created_at < now - timedelta(seconds=ttl_seconds):
+        db.delete(db_entry)
+        db.commit()
+        record_cache_stat(db, "llm", evictions=1)
+        db_entry = None
+    if db_entry is None:
+        record_cache_stat(db, "llm", misses=1)
+        return None
+    db_entry.hit_count = db_entry.hit_count + 1
+    db_entry.last_accessed_at = now
+    db.commit()
+    record_cache_stat(db, "llm", hits=1)
+    return db_entry
+
+def put_llm_cache_entry(db: Session, key: str, model: str, response: str, max_entries: int, max_bytes: int):
+    db.merge(models.LLMCacheEntry(
+        key=key, model=model, response=response, size_bytes=len(response.encode("utf-8")),
+        hit_count=0, created_at=datetime.utcnow(), last_accessed_at=datetime.utcnow()
+    ))
+    db.commit()
+    evict_llm_cache(db, max_entries, max_bytes)
+
+def get_embedding_cache_entries(db: Session, keys):
+    # One lookup for a whole batch of texts; SQLite caps bound parameters, so chunk the keys
+    found = {}
+    keys = list(keys)
+    for start in range(0, len(keys), 500):
+        for entry in db.query(models.EmbeddingCacheEntry).filter(models.EmbeddingCacheEntry.key.in_(keys[start:start + 500])):
+            found[entry.key] = entry.vector
+    hits = len(found)
+    record_cache_stat(db, "embedding", hits=hits, misses=len(keys) - hits)
+    return found
+
+def put_embedding_cache_entries(db: Session, model: str, vectors):
+    # vectors: {key: float32 bytes}; embeddings never change, so an existing key is kept
+    existing = {key for (key,) in db.query(models.EmbeddingCacheEntry.key).filter(models.EmbeddingCacheEntry.key.in_(list(vectors)))}
+    db.add_all([
+        models.EmbeddingCacheEntry(key=key, model=model, dimensions=len(vector) // 4, vector=vector)
+        for key, vector in vectors.items() if key not in existing
+    ])
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker stored the same texts first
+        db.rollback()
+
+def get_repo_digest(db: Session, repo: str, sha: str):
+    return db.query(models.RepoDigest).filter(models.RepoDigest.repo == repo, models.RepoDigest.sha == sha).first()
+
+def save_repo_digest(db: Session, repo: str, sha: str, version: int, data: bytes):
+    db_digest = get_repo_digest(db, repo, sha)
+    if db_digest is None:
+        db.add(models.RepoDigest(repo=repo, sha=sha, version=version, data=data))
+    else:
+        db_digest.version, db_digest.data = version, data
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker digested the same commit first
+        db.rollback()
+
+def evict_llm_cache(db: Session, max_entries: int, max_bytes: int):
+    # Least recently used entries go first until both bounds hold again
+    entries, total_bytes = db.query(func.count(models.LLMCacheEntry.key), func.coalesce(func.sum(models.LLMCacheEntry.size_bytes), 0)).one()
+    if entries <= max_entries and total_bytes <= max_bytes:
+        return 0
+    victims = []
+    for key, size_bytes in db.query(models.LLMCacheEntry.key, models.LLMCacheEntry.size_bytes).order_by(models.LLMCacheEntry.last_accessed_at.asc()).all():
+        if entries <= max_entries and total_bytes <= max_bytes:
+            break
+        victims.append(key)
+        entries -= 1
+        total_bytes -= size_bytes or 0
+    db.query(models.LLMCacheEntry).filter(models.LLMCacheEntry.key.in_(victims)).delete(synchronize_session=False)
+    db.commit()
+    evicted = len(victims)
+    record_cache_stat(db, "llm", evictions=evicted)
+    return evicted
+
+def collect_blob_garbage(db: Session, min_age_seconds: int = BLOB_GC_MIN_AGE_SECONDS):
+    # Blobs of outputs whose transaction rolled back are referenced by no row
+    referenced = {h for (h,) in db.query(models.AgentOutput.content_hash).filter(models.AgentOutput.content_hash.isnot(None)).distinct()}
+    return blob_store.collect_garbage(referenced, min_age_seconds)
+
+# --- Shared rate limits ---
+
+def acquire_rate_limits(db: Session, requests, now: float = None):
+    # requests: [(bucket name, amount, capacity, refill per second)]. Takes from every
+    # bucket or from none, and returns 0 on success or the seconds to wait before retrying.
+    # Updates are conditional on the refill timestamp read, so two processes racing for
+    # the same tokens cannot both spend them; the loser simply re-reads.
+    fixed_now = now
+    while True:
+        now = time.time() if fixed_now is None else fixed_now
+        buckets = {b.name: b for b in db.query(models.RateLimitBucket).filter(
+            models.RateLimitBucket.name.in_([name for name, _, _, _ in requests])
+        ).all()}
+        wait, updates = 0.0, []
+        for name, amount, capacity, refill_per_second in requests:
+            bucket = buckets.get(name)
+            if bucket is None:
+                db.add(models.RateLimitBucket(name=name, tokens=capacity, refilled_at=now, blocked_until=0.0))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                break
+            tokens = min(capacity, (bucket.tokens or 0.0) + (now - (bucket.refilled_at or now)) * refill_per_second)
+            if (bucket.blocked_until or 0.0) > now:
+                wait = max(wait, bucket.blocked_until - now)
+            # A request larger than the whole bucket may go once the bucket is full
+            needed = min(amount, capacity)
+            if tokens < needed:
+                wait = max(wait, (needed - tokens) / refill_per_second)
+            updates.append((bucket, tokens - amount))
+        else:
+            if wait > 0:
+                db.rollback()
+                return wait
+            won = all(db.query(models.RateLimitBucket).filter(
+                models.RateLimitBucket.name == bucket.name,
+                models.RateLimitBucket.refilled_at == bucket.refilled_at
+            ).update({
+                models.RateLimitBucket.tokens: tokens,
+                models.RateLimitBucket.refilled_at: now,
+            }, synchronize_session=False) for bucket, tokens in updates)
+            if won:
+                db.commit()
+                return 0.0
+            db.rollback()
+        db.expire_all()
+
+def charge_rate_limit(db: Session, name: str, amount: float):
+    # Usage only known after the call (e.g. completion tokens) is taken on credit
+    db.query(models.RateLimitBucket).filter(models.RateLimitBucket.name == name).update(
+        {models.RateLimitBucket.tokens: models.RateLimitBucket.tokens - amount}, synchronize_session=False
+    )
+    db.commit()
+
+def block_rate_limit(db: Session, name: str, until: float):
+    db.query(models.RateLimitBucket).filter(
+        models.RateLimitBucket.name == name,
+        func.coalesce(models.RateLimitBucket.blocked_until, 0.0) < until
+    ).update({models.RateLimitBucket.blocked_until: until}, synchronize_session=False)
+    db.commit()
+
+# --- Run metrics ---
+
+def create_run_metrics(db: Session, rows):
+    db.add_all([models.RunMetric(**row) for row in rows])
+    db.commit()
+
+def run_metrics_query(project_id: int, job_id: int = None):
+    query = select(models.RunMetric).where(models.RunMetric.project_id == project_id)
+    if job_id is not None:
+        query = query.where(models.RunMetric.job_id == job_id)
+    return query.order_by(models.RunMetric.started_at.asc(), models.RunMetric.id.asc())
+
+def latest_metrics_job_query(project_id: int):
+    return select(func.max(models.RunMetric.job_id)).where(models.RunMetric.project_id == project_id)
+
+def summarize_run_metrics(project_id: int, job_id: int, spans):
+    # Rolls spans up per task, agent and tool. LLM and tool calls are attributed to the
+    # task that made them; a task's duration is its own wall clock.
+    groups = {"totals": {}, "tasks": {}, "agents": {}, "tools": {}}
+
+    def totals(group, name):
+        return groups[group].setdefault(name, schemas.MetricTotals(name=name))
+
+    for span in spans:
+        targets = [totals("totals", "run")]
+        if span.task_key:
+            targets.append(totals("tasks", span.task_key))
+        if span.kind == "task":
+            for t in targets[1:]:
+                t.duration_ms += span.duration_ms or 0.0
+            continue
+        if span.agent_name:
+            targets.append(totals("agents", span.agent_name))
+        if span.kind == "tool_call":
+            targets.append(totals("tools", span.name))
+        for t in targets:
+            if span.kind == "llm_call":
+                t.llm_calls += 1
+                t.llm_ms += span.duration_ms or 0.0
+                t.prompt_tokens += span.prompt_tokens or 0
+                t.completion_tokens += span.completion_tokens or 0
+                t.cost_usd += span.cost_usd or 0.0
+            else:
+                t.tool_calls += 1
+                t.tool_ms += span.duration_ms or 0.0
+                t.bytes += span.bytes or 0
+            if span.error:
+                t.errors += 1
+    for group in ("agents", "tools"):
+        for t in groups[group].values():
+            t.duration_ms = t.llm_ms + t.tool_ms
+    run = totals("totals", "run")
+    if spans:
+        ends = [s.started_at + timedelta(milliseconds=s.duration_ms or 0) for s in spans]
+        run.duration_ms = (max(ends) - min(s.started_at for s in spans)).total_seconds() * 1000
+    return schemas.RunMetrics(
+        project_id=project_id, job_id=job_id, totals=run,
+        tasks=list(groups["tasks"].values()), agents=list(groups["agents"].values()), tools=list(groups["tools"].values()),
+        spans=[schemas.RunMetric.model_validate(s) for s in spans]
+    )
+
+def metric_totals_query():
+    # Lifetime totals per kind/name/agent for the Prometheus endpoint
+    m = models.RunMetric
+    return select(
+        m.kind, m.name, m.agent_name,
+        func.count(m.id), func.coalesce(func.sum(m.duration_ms), 0.0),
+        func.coalesce(func.sum(m.prompt_tokens), 0), func.coalesce(func.sum(m.completion_tokens), 0),
+        func.coalesce(func.sum(m.bytes), 0), func.coalesce(func.sum(m.cost_usd), 0.0),
+        func.count(m.error)
+    ).group_by(m.kind, m.name, m.agent_name)
+
+def job_status_counts_query():
+    return select(models.Job.status, func.count(models.Job.id)).group_by(models.Job.status)
@@ -1,13 +1,67 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, inspect, text, event
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./ai_architect_studio.db"
+SQLALCHEMY_DATABASE_URL = os.environ.get("DATABASE_URL", "sqlite:///./ai_architect_studio.db")
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+# Connection pool used by the async engine that serves the API routes
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", "20"))
+
+# SQLite storage profile. "production" lets the crew worker write while the dashboard
+# reads (WAL), trades per-commit fsyncs for speed (synchronous=NORMAL), memory-maps
+# reads and waits for locks instead of failing with "database is locked".
+# "safe" keeps SQLite's defaults.
+DB_PROFILE = os.environ.get("DB_PROFILE", "production")
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_PRAGMAS = {
+    "production": [
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}",
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+        "PRAGMA temp_store=MEMORY",
+    ],
+    "safe": [
+        f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}",
+    ],
+}
+
+def async_database_url(url: str):
+    # The same database through an asyncio driver: aiosqlite locally, asyncpg for Postgres
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    if url.startswith("postgresql://") or url.startswith("postgres://"):
+        return "postgresql+asyncpg://" + url.split("://", 1)[1]
+    return url
+
+def _apply_sqlite_profile(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS[DB_PROFILE]:
+        cursor.execute(pragma)
+    cursor.close()
 
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False} if IS_SQLITE else {},
+    **({} if IS_SQLITE else {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True})
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL),
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+)
+
+if IS_SQLITE:
+    event.listen(engine, "connect", _apply_sqlite_profile)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_profile)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
 # Dependency
@@ -17,3 +71,31 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def upgrade_schema(metadata):
+    # create_all() only creates missing tables, so add columns and indexes introduced
+    # after a database was first created. New columns are always nullable.
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        if inspector.has_table("jobs") and "ix_jobs_active_project_id" not in {i["name"] for i in inspector.get_indexes("jobs")}:
+            # Before the one-active-job-per-project index existed, concurrent enqueues could
+            # leave duplicates; keep each project's newest active job
+            conn.execute(text(
+                "UPDATE jobs SET status = 'cancelled', error = 'Duplicate of a newer active job' "
+                "WHERE status IN ('queued', 'running') AND id NOT IN "
+                "(SELECT MAX(id) FROM jobs WHERE status IN ('queued', 'running') GROUP BY project_id)"
+            ))
+        for table in metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    column_type = column.type.compile(dialect=engine.dialect)
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}"))
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
@@ -0,0 +1,344 @@
+import os
+import re
+import json
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import threading
+import subprocess
+import urllib.request
+from typing import Any, List
+from crewai.tools import BaseTool
+from pydantic import Field
+from github import Github, Auth, GithubException
+from repo_reference import local_repo_path, is_local_reference
+
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")  # Point at a fake server in tests
+GITHUB_CACHE_DIR = os.environ.get("GITHUB_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".github_cache"))
+GITHUB_POOL_SIZE = int(os.environ.get("GITHUB_POOL_SIZE", "10"))
+# Download the whole repository once per commit and serve every read locally. The search
+# tools read many files per call, so this is the default; "false" fetches file by file.
+GITHUB_SNAPSHOT = os.environ.get("GITHUB_SNAPSHOT", "true").lower() == "true"
+
+# Limits of the batched repository tools, which keep one tool result within the context
+REPO_READ_MAX_FILES = int(os.environ.get("REPO_READ_MAX_FILES", "20"))
+REPO_READ_MAX_FILE_CHARS = int(os.environ.get("REPO_READ_MAX_FILE_CHARS", "12000"))
+REPO_READ_MAX_TOTAL_CHARS = int(os.environ.get("REPO_READ_MAX_TOTAL_CHARS", "60000"))
+REPO_GLOB_MAX_RESULTS = int(os.environ.get("REPO_GLOB_MAX_RESULTS", "300"))
+REPO_SEARCH_MAX_MATCHES = int(os.environ.get("REPO_SEARCH_MAX_MATCHES", "100"))
+REPO_SEARCH_MAX_FILE_BYTES = int(os.environ.get("REPO_SEARCH_MAX_FILE_BYTES", str(1024 * 1024)))
+# Without a snapshot every searched file is one REST call, so a search may only read this many
+REPO_SEARCH_MAX_API_FILES = int(os.environ.get("REPO_SEARCH_MAX_API_FILES", "50"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+def get_github_client(token: str = None):
+    # One connection-pooled client per process; a crew run owns its worker process
+    token = token or os.environ.get("GITHUB_PERSONAL_ACCESS_TOKEN")
+    with _clients_lock:
+        if token not in _clients:
+            _clients[token] = Github(
+                auth=Auth.Token(token) if token else None,
+                base_url=GITHUB_API_URL,
+                pool_size=GITHUB_POOL_SIZE
+            )
+        return _clients[token]
+
+def _cache_name(value: str):
+    return hashlib.sha256(value.encode("utf-8")).hexdigest()
+
+class GithubRepoSource:
+    # Reads one repository at a fixed commit through the REST API. Everything fetched is
+    # kept in memory and on disk under the commit SHA, so repeated reads (in this run or
+    # in later runs against the same commit) never hit the network again.
+    def __init__(self, client, repo_name: str, ref: str = None):
+        self.repo = client.get_repo(repo_name)
+        self.sha = self.repo.get_commit(ref or self.repo.default_branch).sha
+        self.cache_dir = os.path.join(GITHUB_CACHE_DIR, repo_name.replace("/", "__"), self.sha)
+        self._memory = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, kind: str, path: str, fetch):
+        key = (kind, path)
+        with self._lock:
+            if key in self._memory:
+                return self._memory[key]
+        disk_path = os.path.join(self.cache_dir, kind, _cache_name(path))
+        if os.path.exists(disk_path):
+            with open(disk_path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        else:
+            value = fetch()
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            tmp_path = f"{disk_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, disk_path)
+        with self._lock:
+            self._memory[key] = value
+        return value
+
+    def read_file(self, path: str):
+        def fetch():
+            contents = self.repo.get_contents(path, ref=self.sha)
+            if isinstance(contents, list):
+                raise IsADirectoryError(f"'{path}' is a directory")
+            return contents.decoded_content.decode("utf-8")
+        return self._cached("files", path, fetch)
+
+    def list_dir(self, path: str):
+        def fetch():
+            contents = self.repo.get_contents(path, ref=self.sha)
+            if not isinstance(contents, list):
+                contents = [contents]
+            return [[c.path, c.type] for c in contents]
+        return [tuple(entry) for entry in self._cached("dirs", path, fetch)]
+
+    def files(self):
+        # Every file in the commit with its size, from one recursive tree request
+        def fetch():
+            return [[e.path, e.size] for e in self.repo.get_git_tree(self.sha, recursive=True).tree if e.type == "blob"]
+        return [tuple(entry) for entry in self._cached("tree", "", fetch)]
+
+    def snapshot(self):
+        # One tarball download replaces every later per-file request
+        target = os.path.join(self.cache_dir, "tree")
+        if not os.path.isdir(target):
+            url = self.repo.get_archive_link("tarball", ref=self.sha)
+            os.makedirs(self.cache_dir, exist_ok=True)
+            staging = tempfile.mkdtemp(dir=self.cache_dir)
+            try:
+                with urllib.request.urlopen(url) as response, tarfile.open(fileobj=response, mode="r|gz") as archive:
+                    archive.extractall(staging, filter="data")
+                # GitHub tarballs wrap everything in a single "<owner>-<repo>-<sha>/" folder
+                entries = os.listdir(staging)
+                root = os.path.join(staging, entries[0]) if len(entries) == 1 else staging
+                try:
+                    os.replace(root, target)
+                except OSError:
+                    # Another worker snapshotted the same commit meanwhile; its tree is as good
+                    if not os.path.isdir(target):
+                        raise
+            finally:
+                shutil.rmtree(staging, ignore_errors=True)
+        return LocalRepoSource(target, sha=self.sha)
+
+class LocalRepoSource:
+    # Serves the same reads from a directory on disk: a downloaded snapshot or a local git checkout
+    def __init__(self, root: str, sha: str = None):
+        self.root = os.path.realpath(root)
+        self.sha = sha or self._git_head()
+        self._files = None
+
+    def _git_head(self):
+        try:
+            return subprocess.run(["git", "-C", self.root, "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _resolve(self, path: str):
+        full_path = os.path.realpath(os.path.join(self.root, path.strip("/")))
+        if full_path != self.root and not full_path.startswith(self.root + os.sep):
+            raise PermissionError(f"'{path}' is outside of the repository")
+        return full_path
+
+    def read_file(self, path: str):
+        with open(self._resolve(path), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def list_dir(self, path: str):
+        full_path = self._resolve(path)
+        entries = []
+        for entry in sorted(os.scandir(full_path), key=lambda e: e.name):
+            if entry.name == ".git":
+                continue
+            rel_path = os.path.relpath(entry.path, self.root).replace(os.sep, "/")
+            entries.append((rel_path, "dir" if entry.is_dir() else "file"))
+        return entries
+
+    def _walk(self):
+        # A git checkout lists what git would (tracked and untracked files, minus ignored
+        # ones such as virtualenvs and build output); anything else is walked
+        try:
+            listed = subprocess.run(
+                ["git", "-C", self.root, "ls-files", "-z", "--cached", "--others", "--exclude-standard"],
+                capture_output=True, text=True, check=True
+            ).stdout
+            return sorted(set(path for path in listed.split("\0") if path))
+        except (OSError, subprocess.CalledProcessError):
+            pass
+        paths = []
+        for dir_path, dir_names, file_names in os.walk(self.root):
+            dir_names[:] = [d for d in dir_names if d != ".git"]
+            paths += [os.path.relpath(os.path.join(dir_path, name), self.root).replace(os.sep, "/") for name in file_names]
+        return sorted(paths)
+
+    def files(self):
+        if self._files is None:
+            files = []
+            for path in self._walk():
+                try:
+                    files.append((path, os.path.getsize(os.path.join(self.root, path))))
+                except OSError:
+                    continue  # Deleted since listing, or a dangling link
+            self._files = files
+        return self._files
+
+def glob_regex(pattern: str):
+    # "**" spans directories, "*" and "?" stay within one path segment; a pattern without
+    # "/" matches file names at any depth, so "*.py" finds every Python file
+    pattern = pattern.strip().strip("/") or "**"
+    if "/" not in pattern and "**" not in pattern:
+        pattern = "**/" + pattern
+    regex, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            regex, i = regex + "(?:.*/)?", i + 3
+        elif pattern.startswith("**", i):
+            regex, i = regex + ".*", i + 2
+        else:
+            regex += {"*": "[^/]*", "?": "[^/]"}.get(pattern[i], re.escape(pattern[i]))
+            i += 1
+    return re.compile(regex + r"\Z")
+
+def glob_files(source, pattern: str):
+    match = glob_regex(pattern).match
+    return [(path, size) for path, size in source.files() if match(path)]
+
+def read_files(source, paths, max_file_chars: int = REPO_READ_MAX_FILE_CHARS, max_total_chars: int = REPO_READ_MAX_TOTAL_CHARS):
+    # One section per path; files beyond the per-file or total budget are cut, not dropped
+    sections, budget = [], max_total_chars
+    for path in paths:
+        try:
+            content = source.read_file(path)
+        except Exception as e:
+            sections.append(f"=== {path} ===\nError: {e}")
+            continue
+        limit = max(min(max_file_chars, budget), 0)
+        if len(content) > limit:
+            content = content[:limit] + f"\n[... truncated {len(content) - limit} of {len(content)} characters]"
+        budget -= min(len(content), limit)
+        sections.append(f"=== {path} ===\n{content}")
+    return "\n\n".join(sections)
+
+def search_files(source, regex, path_pattern: str = "**", max_matches: int = REPO_SEARCH_MAX_MATCHES):
+    # (path, line number, line) for every matching line, in path order; binary and very
+    # large files are skipped. Returns the matches, whether the limit cut them short and
+    # how many files the GitHub API failed to serve.
+    matches, failed = [], 0
+    candidates = [(path, size) for path, size in glob_files(source, path_pattern) if size <= REPO_SEARCH_MAX_FILE_BYTES]
+    if isinstance(source, GithubRepoSource) and len(candidates) > REPO_SEARCH_MAX_API_FILES:
+        raise ValueError(
+            f"{len(candidates)} files match '{path_pattern}', but without a repository snapshot a search reads at most "
+            f"{REPO_SEARCH_MAX_API_FILES}; use a narrower path glob"
+        )
+    for path, size in candidates:
+        try:
+            content = source.read_file(path)
+        except (UnicodeDecodeError, OSError):
+            continue
+        except GithubException:
+            failed += 1  # Not found, rate limited or too large for the API; search the rest
+            continue
+        for number, line in enumerate(content.splitlines(), 1):
+            if regex.search(line):
+                if len(matches) == max_matches:
+                    return matches, True, failed
+                matches.append((path, number, line.strip()[:200]))
+    return matches, False, failed
+
+def open_repo_source(repo_reference: str, token: str = None):
+    # repo_reference comes from parse_repo_reference; local paths are checked again here
+    if is_local_reference(repo_reference):
+        return LocalRepoSource(local_repo_path(repo_reference))
+    source = GithubRepoSource(get_github_client(token), repo_reference)
+    if GITHUB_SNAPSHOT:
+        return source.snapshot()
+    return source
+
+class GithubDirectoryListerTool(BaseTool):
+    name: str = "List Github Directory Contents"
+    description: str = "Lists all files and folders in a specific directory of the GitHub repository. Input should be the directory path (use '' for the root directory)."
+    github_repo_name: str = Field(description="The name of the github repository to read from")
+    source: Any = Field(default=None, exclude=True, description="Shared, cached repository source for this run")
+
+    def _run(self, dir_path: str) -> str:
+        try:
+            files = [f"- {path} ({kind})" for path, kind in self.source.list_dir(dir_path)]
+            return f"Contents of '{dir_path}':\n" + "\n".join(files)
+        except Exception as e:
+            return f"Error listing directory from Github: {str(e)}"
+
+class GithubMultiFileReaderTool(BaseTool):
+    name: str = "Read Github Codebase Files"
+    description: str = (
+        "Reads several files of the GitHub repository in one call. Input is a list of exact file paths "
+        f"(e.g. ['README.md', 'src/main.py']), at most {REPO_READ_MAX_FILES} per call. Long files are truncated; "
+        "prefer reading all the files you need at once over one call per file."
+    )
+    github_repo_name: str = Field(description="The name of the github repository to read from")
+    source: Any = Field(default=None, exclude=True, description="Shared, cached repository source for this run")
+
+    def _run(self, file_paths: List[str]) -> str:
+        if isinstance(file_paths, str):
+            file_paths = [file_paths]
+        if not file_paths:
+            return "Provide at least one file path. Use 'Find Github Files' to discover paths."
+        note = ""
+        if len(file_paths) > REPO_READ_MAX_FILES:
+            note = f"\n\n[Only the first {REPO_READ_MAX_FILES} of {len(file_paths)} paths were read]"
+            file_paths = file_paths[:REPO_READ_MAX_FILES]
+        return read_files(self.source, file_paths) + note
+
+class GithubGlobTool(BaseTool):
+    name: str = "Find Github Files"
+    description: str = (
+        "Lists every file of the GitHub repository whose path matches a glob pattern, recursively, with sizes. "
+        "'**' matches any number of directories and '*' any characters within one: e.g. '**/*.py', "
+        "'src/**/test_*.ts', 'Dockerfile'. Use '**' for the whole tree."
+    )
+    github_repo_name: str = Field(description="The name of the github repository to read from")
+    source: Any = Field(default=None, exclude=True, description="Shared, cached repository source for this run")
+
+    def _run(self, pattern: str) -> str:
+        try:
+            files = glob_files(self.source, pattern)
+        except Exception as e:
+            return f"Error listing files from Github: {str(e)}"
+        if not files:
+            return f"No files match '{pattern}'."
+        lines = [f"- {path} ({size} bytes)" for path, size in files[:REPO_GLOB_MAX_RESULTS]]
+        if len(files) > REPO_GLOB_MAX_RESULTS:
+            lines.append(f"[{len(files) - REPO_GLOB_MAX_RESULTS} more files; use a narrower pattern]")
+        return f"{len(files)} files match '{pattern}':\n" + "\n".join(lines)
+
+class GithubCodeSearchTool(BaseTool):
+    name: str = "Search Github Code"
+    description: str = (
+        "Searches the contents of the GitHub repository's files with a regular expression and returns every "
+        "matching line as path:line: text. Optionally restrict the files with a glob such as '**/*.py'. "
+        "Use it to find where something is defined or used instead of opening files one by one."
+    )
+    github_repo_name: str = Field(description="The name of the github repository to read from")
+    source: Any = Field(default=None, exclude=True, description="Shared, cached repository source for this run")
+
+    def _run(self, regex: str, path_glob: str = "**") -> str:
+        if not regex:
+            return "Provide a regular expression to search for."
+        try:
+            compiled = re.compile(regex, re.IGNORECASE)
+        except re.error as e:
+            return f"Invalid regular expression: {e}"
+        try:
+            matches, truncated, failed = search_files(self.source, compiled, path_glob or "**")
+        except Exception as e:
+            return f"Error searching Github: {str(e)}"
+        note = f"\n[{failed} files could not be read from GitHub and were not searched]" if failed else ""
+        if not matches:
+            return f"No lines match /{regex}/ in '{path_glob}'." + note
+        lines = [f"{path}:{number}: {line}" for path, number, line in matches]
+        if truncated:
+            lines.append(f"[Stopped after {REPO_SEARCH_MAX_MATCHES} matches; use a narrower pattern or glob]")
+        return "\n".join(lines) + note
@@ -0,0 +1,32 @@
+import os
+import hashlib
+
+# Agent backstories are a fixed preamble plus the guidelines a project uses: the shared
+# library versions it references, then its own knowledge base text. Renders are cached by
+# those versions, so projects on the same standards get byte-identical prompts (which the
+# LLM response cache can then serve) and editing a shared document only changes the key.
+
+BACKSTORY_CACHE_SIZE = int(os.environ.get("BACKSTORY_CACHE_SIZE", "512"))
+NO_GUIDELINES = "None provided."
+
+_rendered = {}
+
+def guideline_text(references, inline_text: str = None):
+    # references: [(document_id, version, content), ...] from crud.get_project_guidelines
+    parts = [content for _, _, content in references if content]
+    if inline_text:
+        parts.append(inline_text)
+    return "\n\n".join(parts) or NO_GUIDELINES
+
+def render_backstory(preamble: str, references, inline_text: str = None):
+    key = (
+        preamble,
+        tuple((document_id, version) for document_id, version, _ in references),
+        hashlib.sha256(inline_text.encode("utf-8")).hexdigest() if inline_text else None,
+    )
+    backstory = _rendered.get(key)
+    if backstory is None:
+        if len(_rendered) >= BACKSTORY_CACHE_SIZE:
+            _rendered.clear()
+        backstory = _rendered[key] = preamble + guideline_text(references, inline_text)
+    return backstory
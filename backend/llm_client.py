@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from abc import abstractmethod
+from typing import Any
+from pydantic import PrivateAttr
+from crewai import LLM
+from crewai.llms.base_llm import BaseLLM, LLMCallType, call_stop_override, llm_call_context
+import crud
+from database import SessionLocal
+
+LLM_MODEL = os.environ.get("LLM_MODEL", "gemini/gemini-3.1-pro-preview")
+LLM_TEMPERATURE = float(os.environ.get("LLM_TEMPERATURE", "0.4"))
+# Point at any OpenAI-compatible endpoint, e.g. fake_llm_server.py in tests and benchmarks
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL")
+
+# Where answers come from: "live" calls the provider; "record" does too and appends every
+# exchange to LLM_TRANSCRIPT_PATH; "replay" answers from that transcript without a network;
+# "synthetic" makes up answers of LLM_SYNTHETIC_TOKENS tokens after LLM_SYNTHETIC_LATENCY
+# seconds, using each agent's tools LLM_SYNTHETIC_TOOL_CALLS times first
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "live")
+LLM_TRANSCRIPT_PATH = os.environ.get("LLM_TRANSCRIPT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".llm_transcripts", "transcript.jsonl"))
+LLM_REPLAY_LATENCY_SCALE = float(os.environ.get("LLM_REPLAY_LATENCY_SCALE", "0"))  # 1 replays recorded latencies
+LLM_SYNTHETIC_LATENCY = float(os.environ.get("LLM_SYNTHETIC_LATENCY", "0"))
+LLM_SYNTHETIC_TOKENS = int(os.environ.get("LLM_SYNTHETIC_TOKENS", "400"))
+LLM_SYNTHETIC_TOOL_CALLS = int(os.environ.get("LLM_SYNTHETIC_TOOL_CALLS", "1"))
+
+# Global limits shared by every crew run in every worker process (0 disables a limit)
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "60"))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", "1000000"))
+LLM_RATE_LIMIT_RETRIES = int(os.environ.get("LLM_RATE_LIMIT_RETRIES", "6"))
+LLM_RATE_LIMIT_BACKOFF = float(os.environ.get("LLM_RATE_LIMIT_BACKOFF", "2.0"))
+
+# Response cache bounds (all overridable from the environment)
+LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+LLM_CACHE_TTL_SECONDS = int(os.environ.get("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+class DelegatingLLM(BaseLLM):
+    # Wraps another LLM so behaviour (caching, limits, metrics) can be layered around its calls
+    inner: Any
+
+    def __init__(self, inner, **kwargs):
+        super().__init__(model=inner.model, temperature=inner.temperature, provider=inner.provider, inner=inner, **kwargs)
+
+    def _call_inner(self, messages, *args, **kwargs):
+        # Agents apply their stop words to the LLM they hold (this wrapper); pass them through
+        with call_stop_override(self.inner, self.stop_sequences or self.inner.stop):
+            return self.inner.call(messages, *args, **kwargs)
+
+    def call(self, messages, *args, **kwargs):
+        return self._call_inner(messages, *args, **kwargs)
+
+    def supports_function_calling(self):
+        return self.inner.supports_function_calling()
+
+    def supports_stop_words(self):
+        return self.inner.supports_stop_words()
+
+    def get_context_window_size(self):
+        return self.inner.get_context_window_size()
+
+    def get_token_usage_summary(self):
+        return self.inner.get_token_usage_summary()
+
+def cache_key(model: str, temperature, messages, tools=None):
+    # Messages carry the system prompt (role, goal, backstory + guidelines), the task
+    # description and the upstream context, so identical inputs hash identically
+    payload = {
+        "model": model,
+        "temperature": temperature,
+        "messages": messages,
+        "tools": sorted(t.get("function", {}).get("name", "") if isinstance(t, dict) else str(t) for t in (tools or [])),
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class CachedLLM(DelegatingLLM):
+    def call(self, messages, *args, **kwargs):
+        key = cache_key(self.model, self.temperature, messages, kwargs.get("tools"))
+        db = SessionLocal()
+        try:
+            cached = crud.get_llm_cache_entry(db, key, LLM_CACHE_TTL_SECONDS)
+            if cached is not None:
+                return cached.response
+        finally:
+            db.close()
+
+        response = self._call_inner(messages, *args, **kwargs)
+        # Only final text is cacheable; native tool-call payloads are left alone
+        if isinstance(response, str) and response:
+            db = SessionLocal()
+            try:
+                crud.put_llm_cache_entry(db, key, self.model, response, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_MAX_BYTES)
+            finally:
+                db.close()
+        return response
+
+def estimate_tokens(value):
+    # ~4 characters per token is close enough for budgeting
+    if isinstance(value, str):
+        return max(1, len(value) // 4)
+    return max(1, len(json.dumps(value, default=str)) // 4)
+
+def is_rate_limit_error(error: BaseException):
+    # Providers surface 429s differently (openai.RateLimitError, google ClientError with
+    # RESOURCE_EXHAUSTED, plain exceptions wrapping either), so walk the cause chain
+    while error is not None:
+        if getattr(error, "status_code", None) == 429 or getattr(error, "code", None) == 429:
+            return True
+        text = f"{type(error).__name__} {error}".lower()
+        if "ratelimit" in text or "rate limit" in text or "resource_exhausted" in text or " 429" in text:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+def retry_after_seconds(error: BaseException):
+    response = getattr(error, "response", None)
+    value = getattr(response, "headers", {}).get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class RateLimitedLLM(DelegatingLLM):
+    # Waits for the shared request and token buckets before every call, and on a 429 blocks
+    # the buckets for every worker and retries with exponential backoff and jitter
+    requests_per_minute: int = LLM_REQUESTS_PER_MINUTE
+    tokens_per_minute: int = LLM_TOKENS_PER_MINUTE
+    max_retries: int = LLM_RATE_LIMIT_RETRIES
+    backoff: float = LLM_RATE_LIMIT_BACKOFF
+    session_factory: Any = SessionLocal
+
+    def _limits(self, prompt_tokens: int):
+        limits = []
+        if self.requests_per_minute:
+            limits.append(("llm_requests", 1, self.requests_per_minute, self.requests_per_minute / 60))
+        if self.tokens_per_minute:
+            limits.append(("llm_tokens", prompt_tokens, self.tokens_per_minute, self.tokens_per_minute / 60))
+        return limits
+
+    def _acquire(self, limits):
+        while limits:
+            db = self.session_factory()
+            try:
+                wait = crud.acquire_rate_limits(db, limits)
+            finally:
+                db.close()
+            if not wait:
+                return
+            time.sleep(min(wait, 30) + random.uniform(0, 0.05))
+
+    def call(self, messages, *args, **kwargs):
+        limits = self._limits(estimate_tokens(messages))
+        attempt = 0
+        while True:
+            self._acquire(limits)
+            try:
+                response = self._call_inner(messages, *args, **kwargs)
+                break
+            except Exception as e:
+                if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                    raise
+                delay = retry_after_seconds(e) or self.backoff * (2 ** attempt) * random.uniform(0.5, 1.0)
+                attempt += 1
+                if not limits:
+                    time.sleep(delay)
+                    continue
+                db = self.session_factory()
+                try:
+                    for name, _, _, _ in limits:
+                        crud.block_rate_limit(db, name, time.time() + delay)
+                finally:
+                    db.close()
+
+        if self.tokens_per_minute and response:
+            db = self.session_factory()
+            try:
+                crud.charge_rate_limit(db, "llm_tokens", estimate_tokens(response))
+            finally:
+                db.close()
+        return response
+
+def transcript_key(messages, tools=None):
+    # Independent of the configured model, so a transcript replays under any LLM_MODEL
+    return cache_key("", None, messages, tools)
+
+def _system_prompt_key(messages):
+    # Groups exchanges by agent and task when the full conversation does not match exactly
+    if isinstance(messages, str):
+        return hashlib.sha256(messages.encode("utf-8")).hexdigest()
+    return hashlib.sha256(json.dumps(messages[:2], sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+class RecordingLLM(DelegatingLLM):
+    # Appends every final-text exchange to a JSON Lines transcript that ReplayLLM can serve
+    path: str = LLM_TRANSCRIPT_PATH
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def call(self, messages, *args, **kwargs):
+        started = time.perf_counter()
+        response = self._call_inner(messages, *args, **kwargs)
+        if isinstance(response, str):
+            record = {
+                "key": transcript_key(messages, kwargs.get("tools")),
+                "prompt_key": _system_prompt_key(messages),
+                "model": self.model,
+                "latency": round(time.perf_counter() - started, 4),
+                "response": response,
+            }
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return response
+
+class OfflineLLM(BaseLLM):
+    # Answers without a provider but emits the same call events as a real client, so
+    # telemetry, callbacks and token accounting see an ordinary run. Subclasses supply
+    # the answer and its simulated latency in seconds.
+    @abstractmethod
+    def _answer(self, messages, tools):
+        ...
+
+    def call(self, messages, tools=None, callbacks=None, available_functions=None, from_task=None, from_agent=None, response_model=None):
+        with llm_call_context():
+            self._emit_call_started_event(messages=messages, tools=tools, callbacks=callbacks, available_functions=available_functions,
+                                          from_task=from_task, from_agent=from_agent)
+            response, latency = self._answer(messages, tools)
+            if latency:
+                time.sleep(latency)
+            prompt_tokens, completion_tokens = estimate_tokens(messages), estimate_tokens(response)
+            usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens}
+            self._track_token_usage_internal(usage)
+            self._emit_call_completed_event(response=response, call_type=LLMCallType.LLM_CALL, from_task=from_task,
+                                            from_agent=from_agent, messages=messages, usage=usage)
+            return response
+
+    def supports_function_calling(self):
+        # Tools are used through the ReAct text format, which synthetic answers can follow
+        return False
+
+    def get_context_window_size(self):
+        return 1_000_000
+
+class ReplayLLM(OfflineLLM):
+    # Serves a recorded transcript deterministically: the exchange with the same messages,
+    # else the next unused one recorded for the same agent and task, in recording order
+    path: str = LLM_TRANSCRIPT_PATH
+    latency_scale: float = LLM_REPLAY_LATENCY_SCALE
+    _by_key: Any = PrivateAttr(default=None)
+    _by_prompt: Any = PrivateAttr(default=None)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def _load(self):
+        self._by_key, self._by_prompt = {}, {}
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    self._by_key.setdefault(record["key"], record)
+                    self._by_prompt.setdefault(record["prompt_key"], []).append(record)
+
+    def _answer(self, messages, tools):
+        with self._lock:
+            if self._by_key is None:
+                self._load()
+            record = self._by_key.get(transcript_key(messages, tools))
+            if record is None:
+                pending = self._by_prompt.get(_system_prompt_key(messages))
+                if not pending:
+                    raise LookupError(f"No recorded LLM response for this prompt in {self.path}")
+                record = pending.pop(0)
+        return record["response"], record.get("latency", 0) * self.latency_scale
+
+SYNTHETIC_WORDS = (
+    "service", "queue", "cache", "schema", "endpoint", "latency", "tenant", "index", "worker", "token",
+    "gateway", "replica", "session", "payload", "retry", "budget", "shard", "event", "stream", "policy",
+)
+TOOL_NAMES = re.compile(r"only one name of \[(.*?)\]")
+
+class SyntheticLLM(OfflineLLM):
+    # Deterministic stand-in answers: the same prompt always gets the same text
+    latency: float = LLM_SYNTHETIC_LATENCY
+    completion_tokens: int = LLM_SYNTHETIC_TOKENS
+    tool_calls: int = LLM_SYNTHETIC_TOOL_CALLS
+
+    def _tool_action(self, messages, step):
+        text = messages if isinstance(messages, str) else "\n".join(str(m.get("content", "")) for m in messages)
+        match = TOOL_NAMES.search(text)
+        names = [n.strip() for n in match.group(1).split(",") if n.strip()] if match else []
+        if not names:
+            return None
+        name = names[step % len(names)]
+        arguments = {}
+        schema = re.search(rf"Tool Name: {re.escape(name)}\nTool Arguments: (.*?)\nTool Description:", text, re.DOTALL)
+        if schema:
+            try:
+                properties = json.loads(schema.group(1)).get("properties", {})
+                arguments = {arg: [] if spec.get("type") == "array" else "" for arg, spec in properties.items()}
+            except ValueError:
+                pass
+        return f"Thought: I should look at the codebase first.\nAction: {name}\nAction Input: {json.dumps(arguments)}"
+
+    def _answer(self, messages, tools):
+        steps = 0 if isinstance(messages, str) else sum(1 for m in messages if m.get("role") == "assistant")
+        if steps < self.tool_calls:
+            action = self._tool_action(messages, steps)
+            if action:
+                return action, self.latency
+        rng = random.Random(transcript_key(messages, tools))
+        words = [rng.choice(SYNTHETIC_WORDS) for _ in range(self.completion_tokens * 4 // 7)]
+        body = "\n".join(" ".join(words[i:i + 12]).capitalize() + "." for i in range(0, len(words), 12))
+        return f"Thought: I now know the final answer\nFinal Answer: ## Synthetic answer\n{body}", self.latency
+
+def build_llm(api_key: str):
+    if LLM_BACKEND in ("synthetic", "replay"):
+        # Offline backends have no provider limits to respect
+        if LLM_BACKEND == "synthetic":
+            llm = SyntheticLLM(model=f"synthetic/{LLM_MODEL}", temperature=LLM_TEMPERATURE)
+        else:
+            llm = ReplayLLM(model=f"replay/{LLM_MODEL}", temperature=LLM_TEMPERATURE)
+    else:
+        llm_kwargs = {"base_url": LLM_BASE_URL} if LLM_BASE_URL else {}
+        llm = LLM(model=LLM_MODEL, temperature=LLM_TEMPERATURE, api_key=api_key, **llm_kwargs)
+        if LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE:
+            llm = RateLimitedLLM(llm)
+    # Outermost, so cache hits never spend rate-limit budget
+    if LLM_CACHE_ENABLED:
+        llm = CachedLLM(llm)
+    if LLM_BACKEND == "record":
+        # Outside the cache too: a transcript must hold every answer the crew received
+        llm = RecordingLLM(llm)
+    return llm
@@ -1,13 +1,25 @@
-from fastapi import FastAPI, Depends, HTTPException, BackgroundTasks
+import os
+import json
+import uuid
+import hashlib
+import asyncio
+import multiprocessing
+from fastapi import FastAPI, Depends, HTTPException, Request, Response, Query
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional, Union
 
-import crud, models, schemas
-from database import SessionLocal, engine, get_db
+import crud, async_crud, models, schemas, search_index, worker
+from run_diff import diff_runs
+from blob_store import blob_store
+from database import AsyncSessionLocal, SessionLocal, engine, get_async_db, upgrade_schema
 
 # Create the database tables
 models.Base.metadata.create_all(bind=engine)
+upgrade_schema(models.Base.metadata)
 
 app = FastAPI(title="AI Architect Studio - Intake Engine")
 
@@ -18,57 +30,517 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
+# Compress JSON responses above a size threshold. The SSE stream is left uncompressed by
+# the middleware itself so events are not held back in a compression buffer.
+GZIP_MINIMUM_SIZE = int(os.environ.get("GZIP_MINIMUM_SIZE", "1024"))
+GZIP_COMPRESS_LEVEL = int(os.environ.get("GZIP_COMPRESS_LEVEL", "6"))
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_COMPRESS_LEVEL)
+
+# Crew runs execute in a separate worker pool process: run `python worker.py` next to the
+# API. For a single-process deployment set RUN_EMBEDDED_WORKER_POOL=true and the API starts
+# one itself; never with `uvicorn --workers N`, which would start N competing pools.
+RUN_EMBEDDED_WORKER_POOL = os.environ.get("RUN_EMBEDDED_WORKER_POOL", "false").lower() == "true"
+embedded_pool = None
+
+@app.on_event("startup")
+def start_embedded_worker_pool():
+    global embedded_pool
+    if RUN_EMBEDDED_WORKER_POOL:
+        embedded_pool = multiprocessing.get_context("spawn").Process(target=worker.run_pool, daemon=False)
+        embedded_pool.start()
+
+# Organization-wide standards (knowledge/<kb_field>.md, the files the CLI reads) are loaded
+# into the shared guideline library on startup, for projects to reference explicitly.
+# Set GUIDELINES_DIR="" to skip.
+GUIDELINES_DIR = os.environ.get("GUIDELINES_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "knowledge"))
+
+@app.on_event("startup")
+def load_guideline_files():
+    if GUIDELINES_DIR:
+        with SessionLocal() as db:
+            crud.sync_guideline_files(db, GUIDELINES_DIR)
+
+@app.on_event("shutdown")
+def stop_embedded_worker_pool():
+    if embedded_pool and embedded_pool.is_alive():
+        embedded_pool.terminate()
+        embedded_pool.join(timeout=15)
+
+# --- Conditional requests ---
+
+def _project_etag(project_id: int, version: int):
+    # Weak: the same version may be served as different (but equivalent) JSON encodings
+    return f'W/"p{project_id}-v{version}"'
+
+def _etag_matches(request: Request, etag: str):
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored on both sides
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag.removeprefix("W/") in tags
+
+def _not_modified(etag: str):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
 # --- Routes ---
 
 @app.get("/ping")
-def ping():
+async def ping():
     return {"status": "ok"}
 
 @app.post("/projects/", response_model=schemas.Project)
-def create_project(project: schemas.ProjectCreate, db: Session = Depends(get_db)):
-    return crud.create_project(db=db, project=project)
+async def create_project(project: schemas.ProjectCreate, db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.create_project(db=db, project=project)
+
+@app.get("/projects/", response_model=List[schemas.ProjectSummary])
+async def read_projects(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    title: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db)
+):
+    # The next page is requested by passing back the X-Next-Cursor response header
+    try:
+        projects = await async_crud.get_projects(db, limit=limit + 1, cursor=cursor, status=status, title=title)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(projects) > limit:
+        projects = projects[:limit]
+        response.headers["X-Next-Cursor"] = crud.encode_project_cursor(projects[-1])
+    return projects
 
-@app.get("/projects/", response_model=List[schemas.Project])
-def read_projects(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    return crud.get_projects(db, skip=skip, limit=limit)
+@app.get("/projects/{project_id}", response_model=Union[schemas.Project, schemas.ProjectDetail])
+async def read_project(
+    project_id: int, request: Request, response: Response, include_outputs: bool = True, db: AsyncSession = Depends(get_async_db)
+):
+    # Pollers revalidate with If-None-Match; an unchanged project costs one indexed lookup
+    version = await async_crud.get_project_version(db, project_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    etag = _project_etag(project_id, version)
+    if _etag_matches(request, etag):
+        return _not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
 
-@app.get("/projects/{project_id}", response_model=schemas.Project)
-def read_project(project_id: int, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
+    db_project = await async_crud.get_project_detail(db, project_id=project_id, include_outputs=include_outputs)
     if db_project is None:
         raise HTTPException(status_code=404, detail="Project not found")
-    return db_project
+    if not include_outputs:
+        return schemas.ProjectDetail.model_validate(db_project)
+    return await run_in_threadpool(schemas.Project.model_validate, db_project)
 
 @app.post("/projects/{project_id}/requirements/", response_model=schemas.Requirement)
-def create_requirement_for_project(
-    project_id: int, requirement: schemas.RequirementCreate, db: Session = Depends(get_db)
+async def create_requirement_for_project(
+    project_id: int, requirement: schemas.RequirementCreate, db: AsyncSession = Depends(get_async_db)
 ):
-    return crud.create_requirement(db=db, project_id=project_id, requirement=requirement)
+    return await async_crud.create_requirement(db=db, project_id=project_id, requirement=requirement)
 
 @app.put("/projects/{project_id}/knowledge_base/", response_model=schemas.KnowledgeBase)
-def update_kb_for_project(
-    project_id: int, kb: schemas.KnowledgeBaseBase, db: Session = Depends(get_db)
+async def update_kb_for_project(
+    project_id: int, kb: schemas.KnowledgeBaseBase, db: AsyncSession = Depends(get_async_db)
+):
+    return await async_crud.update_knowledge_base(db=db, project_id=project_id, kb=kb)
+
+@app.put("/projects/{project_id}/guidelines/", response_model=List[schemas.GuidelineReference])
+async def set_project_guidelines(
+    project_id: int, refs: List[schemas.GuidelineReferenceBase], db: AsyncSession = Depends(get_async_db)
 ):
-    return crud.update_knowledge_base(db=db, project_id=project_id, kb=kb)
+    # Replaces the project's references; version=null follows the document's latest version
+    if await async_crud.get_project(db, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    for ref in refs:
+        _check_kb_field(ref.kb_field)
+        db_document = await async_crud.get_guideline_document(db, ref.document_id)
+        if db_document is None:
+            raise HTTPException(status_code=404, detail=f"Guideline document {ref.document_id} not found")
+        if ref.version is not None and not 1 <= ref.version <= db_document.latest_version:
+            raise HTTPException(status_code=404, detail=f"Guideline document {ref.document_id} has no version {ref.version}")
+    return await async_crud.set_guideline_references(db, project_id, refs)
+
+# --- Shared guideline library ---
+
+def _check_kb_field(kb_field: str):
+    if kb_field not in crud.KB_FIELDS:
+        raise HTTPException(status_code=400, detail=f"kb_field must be one of: {', '.join(crud.KB_FIELDS)}")
+
+async def _get_guideline_document_or_404(db: AsyncSession, document_id: int):
+    db_document = await async_crud.get_guideline_document(db, document_id)
+    if db_document is None:
+        raise HTTPException(status_code=404, detail="Guideline document not found")
+    return db_document
+
+@app.post("/guidelines/", response_model=schemas.GuidelineDocument, status_code=201)
+async def create_guideline_document(document: schemas.GuidelineDocumentCreate, db: AsyncSession = Depends(get_async_db)):
+    _check_kb_field(document.kb_field)
+    if await async_crud.get_guideline_document_by_name(db, document.name) is not None:
+        raise HTTPException(status_code=409, detail="A guideline document with this name already exists")
+    return await async_crud.create_guideline_document(db, document)
+
+@app.get("/guidelines/", response_model=List[schemas.GuidelineDocument])
+async def read_guideline_documents(db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_guideline_documents(db)
+
+@app.get("/guidelines/{document_id}/versions/", response_model=List[schemas.GuidelineVersionSummary])
+async def read_guideline_versions(document_id: int, db: AsyncSession = Depends(get_async_db)):
+    await _get_guideline_document_or_404(db, document_id)
+    return await async_crud.get_guideline_versions(db, document_id)
+
+@app.post("/guidelines/{document_id}/versions/", response_model=schemas.GuidelineVersionSummary)
+async def create_guideline_version(document_id: int, version: schemas.GuidelineVersionCreate, db: AsyncSession = Depends(get_async_db)):
+    # Unchanged content returns the current latest version instead of adding one
+    db_document = await _get_guideline_document_or_404(db, document_id)
+    return await async_crud.add_guideline_version(db, db_document, version.content)
+
+@app.get("/guidelines/{document_id}/versions/{version}", response_model=schemas.GuidelineVersion)
+async def read_guideline_version(document_id: int, version: int, request: Request, response: Response, db: AsyncSession = Depends(get_async_db)):
+    db_version = await async_crud.get_guideline_version(db, document_id, version)
+    if db_version is None:
+        raise HTTPException(status_code=404, detail="Guideline version not found")
+    # Versions are immutable, so clients keep them for good
+    headers = {"ETag": f'"{db_version.content_hash}"', "Cache-Control": "private, max-age=31536000, immutable"}
+    if _etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return db_version
+
+@app.get("/projects/{project_id}/outputs/", response_model=Union[List[schemas.AgentOutput], List[schemas.AgentOutputSummary]])
+async def get_outputs_for_project(
+    project_id: int,
+    request: Request,
+    response: Response,
+    since: Optional[int] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),  # Unset returns every output, as before paging
+    include_content: bool = True,
+    db: AsyncSession = Depends(get_async_db)
+):
+    version = await async_crud.get_project_version(db, project_id)
+    if version is not None:
+        # New outputs bump the project version, so it also validates any page of outputs
+        etag = _project_etag(project_id, version)
+        if _etag_matches(request, etag):
+            return _not_modified(etag)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+
+    outputs = await async_crud.get_agent_outputs(db=db, project_id=project_id, since=since, limit=limit + 1 if limit else None)
+    if limit and len(outputs) > limit:
+        outputs = outputs[:limit]
+        response.headers["X-Next-Cursor"] = str(outputs[-1].id)
+    if not include_content:
+        return [schemas.AgentOutputSummary.model_validate(o) for o in outputs]
+    # Bodies come from the blob store, so read them off the event loop
+    return await run_in_threadpool(lambda: [schemas.AgentOutput.model_validate(o) for o in outputs])
+
+def _parse_range(range_header: str, size: int):
+    # Single "bytes=start-end", "bytes=start-" or "bytes=-suffix" ranges
+    unit, _, spec = range_header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    if start == "":
+        if not end.isdigit() or int(end) == 0:
+            return None
+        return max(size - int(end), 0), size - 1
+    if not start.isdigit() or (end and not end.isdigit()):
+        return None
+    start, end = int(start), min(int(end) if end else size - 1, size - 1)
+    if start >= size or start > end:
+        return None
+    return start, end
+
+@app.get("/outputs/{output_id}/content")
+async def get_output_content(output_id: int, request: Request, db: AsyncSession = Depends(get_async_db)):
+    db_output = await async_crud.get_agent_output(db, output_id)
+    if db_output is None:
+        raise HTTPException(status_code=404, detail="Output not found")
+
+    if db_output.content_hash:
+        content_hash = db_output.content_hash
+        body = await run_in_threadpool(blob_store.get, content_hash)
+    else:
+        body = (db_output.inline_content or "").encode("utf-8")
+        content_hash = hashlib.sha256(body).hexdigest()
 
-@app.get("/projects/{project_id}/outputs/", response_model=List[schemas.AgentOutput])
-def get_outputs_for_project(project_id: int, db: Session = Depends(get_db)):
-    return crud.get_agent_outputs(db=db, project_id=project_id)
+    # Output bodies never change, so the content hash is a strong validator
+    etag = f'"{content_hash}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes", "Cache-Control": "private, max-age=31536000, immutable"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
 
-import crew_runner
+    media_type = "text/markdown; charset=utf-8"
+    range_header = request.headers.get("range")
+    if range_header and request.headers.get("if-range", etag) == etag:
+        byte_range = _parse_range(range_header, len(body))
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{len(body)}"})
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+        # Byte ranges address the uncompressed body, so partial responses are never gzipped
+        headers["Content-Encoding"] = "identity"
+        return Response(content=body[start:end + 1], status_code=206, media_type=media_type, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+# --- Live run events (Server-Sent Events) ---
+
+EVENT_POLL_INTERVAL = float(os.environ.get("EVENT_POLL_INTERVAL", "0.5"))
+EVENT_KEEPALIVE_SECONDS = 15
+
+def _is_terminal_status(status: str):
+    return status in ("completed", "cancelled") or status.startswith("error")
+
+def _format_sse(event_id: int, event_type: str, data: str):
+    return f"id: {event_id}\nevent: {event_type}\ndata: {data}\n\n"
+
+async def _load_snapshot(project_id: int):
+    async with AsyncSessionLocal() as db:
+        # The cursor is read first: anything committed while the snapshot loads is then both
+        # in the snapshot and streamed after it, never in neither
+        last_event_id = await async_crud.get_last_run_event_id(db, project_id)
+        db_project = await async_crud.get_project(db, project_id)
+        if db_project is None:
+            return None
+        outputs = [schemas.AgentOutputSummary.model_validate(o).model_dump(mode="json") for o in await async_crud.get_agent_outputs(db, project_id)]
+        return last_event_id, {"status": db_project.status, "outputs": outputs}
+
+async def _load_events(project_id: int, after_id: int):
+    # A short-lived session per poll so idle streams do not pin pooled connections
+    async with AsyncSessionLocal() as db:
+        events = [(e.id, e.event_type, e.data) for e in await async_crud.get_run_events(db, project_id, after_id=after_id)]
+        db_project = await async_crud.get_project(db, project_id)
+        return events, db_project.status if db_project else "error: project deleted"
+
+@app.get("/projects/{project_id}/events")
+async def stream_project_events(project_id: int, request: Request, last_event_id: Optional[int] = None):
+    # Browsers send Last-Event-ID automatically when an EventSource reconnects
+    header_id = request.headers.get("last-event-id")
+    if header_id and header_id.isdigit():
+        last_event_id = int(header_id)
+
+    snapshot = None
+    if last_event_id is None:
+        snapshot = await _load_snapshot(project_id)
+        if snapshot is None:
+            raise HTTPException(status_code=404, detail="Project not found")
+
+    async def event_generator():
+        cursor = last_event_id
+        if snapshot is not None:
+            cursor, data = snapshot
+            yield _format_sse(cursor, "snapshot", json.dumps(data))
+            if _is_terminal_status(data["status"]):
+                return
+        idle = 0.0
+        while not await request.is_disconnected():
+            events, status = await _load_events(project_id, cursor)
+            for event_id, event_type, data in events:
+                cursor = event_id
+                yield _format_sse(event_id, event_type, data)
+                if event_type == "status" and _is_terminal_status(json.loads(data)["status"]):
+                    return
+            if events:
+                idle = 0.0
+                continue
+            if _is_terminal_status(status):
+                return
+            idle += EVENT_POLL_INTERVAL
+            if idle >= EVENT_KEEPALIVE_SECONDS:
+                idle = 0.0
+                yield ": keepalive\n\n"
+            await asyncio.sleep(EVENT_POLL_INTERVAL)
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+
+def _job_priority(priority: str):
+    if priority not in crud.JOB_PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority '{priority}', expected one of: {', '.join(crud.JOB_PRIORITIES)}")
+    return crud.JOB_PRIORITIES[priority]
 
 @app.post("/projects/{project_id}/run", response_model=dict)
-def run_project_crew(project_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
-    db_project = crud.get_project(db, project_id=project_id)
+async def run_project_crew(project_id: int, resume: bool = False, priority: str = "normal", db: AsyncSession = Depends(get_async_db)):
+    job_priority = _job_priority(priority)
+    db_project = await async_crud.get_project(db, project_id=project_id)
     if not db_project:
         raise HTTPException(status_code=404, detail="Project not found")
-        
-    if db_project.status == "running":
-        raise HTTPException(status_code=400, detail="Project is already running")
-        
-    crud.update_project_status(db, project_id, "starting")
-    background_tasks.add_task(crew_runner.run_crew_for_project, project_id)
-    return {"status": "accepted", "message": "Crew execution started in background."}
 
+    db_job, created = await async_crud.enqueue_job(db, project_id, max_attempts=worker.JOB_MAX_ATTEMPTS, resume=resume, priority=job_priority)
+    if not created:
+        return {"status": "accepted", "job_id": db_job.id, "message": "A crew run for this project is already queued or running."}
+
+    await async_crud.update_project_status(db, project_id, "queued")
+    return {"status": "accepted", "job_id": db_job.id, "message": "Crew execution queued."}
+
+@app.post("/batches/", response_model=schemas.BatchRun, status_code=202)
+async def run_batch(batch: schemas.BatchRunCreate, db: AsyncSession = Depends(get_async_db)):
+    # Queues one job per project. The worker pool bounds how many run at once, takes
+    # turns between batches and shares one LLM rate limit across all of them.
+    job_priority = _job_priority(batch.priority)
+    project_ids = list(dict.fromkeys(batch.project_ids))
+    for project_id in project_ids:
+        if await async_crud.get_project(db, project_id) is None:
+            raise HTTPException(status_code=404, detail=f"Project {project_id} not found")
+
+    batch_id = uuid.uuid4().hex
+    jobs = []
+    for project_id in project_ids:
+        db_job, created = await async_crud.enqueue_job(
+            db, project_id, max_attempts=worker.JOB_MAX_ATTEMPTS, resume=batch.resume, priority=job_priority, batch_id=batch_id
+        )
+        if created:
+            await async_crud.update_project_status(db, project_id, "queued")
+        # Projects that already had a run in flight keep it; it is reported as-is
+        jobs.append(db_job)
+    return {"batch_id": batch_id, "jobs": jobs}
+
+@app.get("/batches/{batch_id}", response_model=schemas.BatchRun)
+async def read_batch(batch_id: str, db: AsyncSession = Depends(get_async_db)):
+    jobs = await async_crud.get_batch_jobs(db, batch_id)
+    if not jobs:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"batch_id": batch_id, "jobs": jobs}
+
+@app.get("/projects/{project_id}/metrics", response_model=schemas.RunMetrics)
+async def read_run_metrics(project_id: int, job_id: Optional[int] = None, db: AsyncSession = Depends(get_async_db)):
+    # Spans and per task/agent/tool totals of one run (the latest one by default)
+    if await async_crud.get_project(db, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return await async_crud.get_run_metrics(db, project_id, job_id)
+
+def _prometheus_labels(**labels):
+    escaped = {k: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for k, v in labels.items() if v is not None}
+    return "{" + ",".join(f'{k}="{v}"' for k, v in escaped.items()) + "}"
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics(db: AsyncSession = Depends(get_async_db)):
+    # Prometheus text format, aggregated from run_metrics over all runs
+    totals, job_counts = await async_crud.get_metric_totals(db)
+    metrics = {
+        "architect_llm_calls_total": ("counter", "LLM calls made by crew agents"),
+        "architect_llm_seconds_total": ("counter", "Time spent waiting on LLM calls"),
+        "architect_llm_tokens_total": ("counter", "LLM tokens by direction"),
+        "architect_llm_cost_usd_total": ("counter", "Estimated LLM spend"),
+        "architect_llm_errors_total": ("counter", "Failed LLM calls"),
+        "architect_tool_calls_total": ("counter", "Tool calls made by crew agents"),
+        "architect_tool_seconds_total": ("counter", "Time spent in tool calls"),
+        "architect_tool_bytes_total": ("counter", "Bytes returned by tool calls"),
+        "architect_tool_errors_total": ("counter", "Failed tool calls"),
+        "architect_tasks_total": ("counter", "Finished crew tasks"),
+        "architect_task_seconds_total": ("counter", "Wall clock time of crew tasks"),
+        "architect_jobs": ("gauge", "Crew jobs by status"),
+    }
+    samples = {name: [] for name in metrics}
+    for kind, name, agent, count, duration_ms, prompt_tokens, completion_tokens, size, cost, errors in totals:
+        if kind == "llm_call":
+            labels = dict(model=name, agent=agent)
+            samples["architect_llm_calls_total"].append((labels, count))
+            samples["architect_llm_seconds_total"].append((labels, duration_ms / 1000))
+            samples["architect_llm_tokens_total"].append(({**labels, "direction": "prompt"}, prompt_tokens))
+            samples["architect_llm_tokens_total"].append(({**labels, "direction": "completion"}, completion_tokens))
+            samples["architect_llm_cost_usd_total"].append((labels, cost))
+            samples["architect_llm_errors_total"].append((labels, errors))
+        elif kind == "tool_call":
+            labels = dict(tool=name, agent=agent)
+            samples["architect_tool_calls_total"].append((labels, count))
+            samples["architect_tool_seconds_total"].append((labels, duration_ms / 1000))
+            samples["architect_tool_bytes_total"].append((labels, size))
+            samples["architect_tool_errors_total"].append((labels, errors))
+        elif kind == "task":
+            labels = dict(task=name, agent=agent)
+            samples["architect_tasks_total"].append((labels, count))
+            samples["architect_task_seconds_total"].append((labels, duration_ms / 1000))
+    for status, count in job_counts:
+        samples["architect_jobs"].append((dict(status=status), count))
+
+    lines = []
+    for name, (metric_type, help_text) in metrics.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+        lines += [f"{name}{_prometheus_labels(**labels)} {value}" for labels, value in samples[name]]
+    return PlainTextResponse("\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+@app.get("/search", response_model=List[schemas.SearchHit])
+async def search(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    project_id: Optional[int] = None,
+    agent: Optional[str] = None,
+    kind: Optional[str] = Query(None, pattern="^(output|requirement)$"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Ranked full-text search over agent outputs and requirements, optionally within one
+    # project or one agent role. The next page is at the X-Next-Offset response header.
+    if not search_index.SEARCH_ENABLED:
+        raise HTTPException(status_code=501, detail="Full-text search requires SQLite with FTS5")
+    hits = await async_crud.search(db, q, project_id=project_id, agent_name=agent, kind=kind, limit=limit + 1, offset=offset)
+    if len(hits) > limit:
+        hits = hits[:limit]
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return hits
+
+@app.get("/cache/stats", response_model=List[schemas.CacheStats])
+async def read_cache_stats(db: AsyncSession = Depends(get_async_db)):
+    return await async_crud.get_cache_stats(db)
+
+@app.get("/projects/{project_id}/runs", response_model=List[schemas.Run])
+async def read_runs(project_id: int, db: AsyncSession = Depends(get_async_db)):
+    if await async_crud.get_project_version(db, project_id) is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return await async_crud.get_runs(db, project_id)
+
+async def _get_run_or_404(db: AsyncSession, run_id: int):
+    db_run = await async_crud.get_run(db, run_id)
+    if db_run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return db_run
+
+@app.get("/runs/{run_id}", response_model=schemas.RunDetail)
+async def read_run(run_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_run = await _get_run_or_404(db, run_id)
+    outputs = await async_crud.get_run_outputs(db, run_id)
+    return schemas.RunDetail(**schemas.Run.model_validate(db_run).model_dump(), outputs=list(outputs.values()))
+
+@app.get("/runs/{run_id}/diff", response_model=schemas.RunDiff)
+async def read_run_diff(
+    run_id: int,
+    against: Optional[int] = Query(None, description="Run to compare with; defaults to the project's previous run"),
+    context: int = Query(3, ge=0, le=50),
+    db: AsyncSession = Depends(get_async_db)
+):
+    db_run = await _get_run_or_404(db, run_id)
+    if against is None:
+        db_against = await async_crud.get_previous_run(db, db_run)
+    else:
+        db_against = await _get_run_or_404(db, against)
+        if db_against.project_id != db_run.project_id:
+            raise HTTPException(status_code=400, detail="Runs belong to different projects")
+    new_outputs = await async_crud.get_run_outputs(db, run_id, include_content=True)
+    old_outputs = await async_crud.get_run_outputs(db, db_against.id, include_content=True) if db_against else {}
+    # Bodies are read from the blob store and diffed off the event loop
+    tasks = await run_in_threadpool(diff_runs, old_outputs, new_outputs, context)
+    return {"run_id": run_id, "against_run_id": db_against.id if db_against else None, "tasks": tasks}
+
+@app.get("/jobs/{job_id}", response_model=schemas.Job)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_job = await async_crud.get_job(db, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_job
+
+@app.post("/jobs/{job_id}/cancel", response_model=schemas.Job)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_async_db)):
+    db_job = await async_crud.cancel_job(db, job_id)
+    if db_job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return db_job
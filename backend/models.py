@@ -1,10 +1,19 @@
-from sqlalchemy import Column, Integer, String, Text, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, Boolean, Index, LargeBinary, event, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
+from blob_store import blob_store
+import search_index
+
+OUTPUT_PREVIEW_CHARS = 500
 
 class Project(Base):
     __tablename__ = "projects"
+    __table_args__ = (
+        # Keyset pagination walks (created_at, id), optionally within one status
+        Index("ix_projects_created_at_id", "created_at", "id"),
+        Index("ix_projects_status_created_at_id", "status", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, index=True)
@@ -12,10 +21,17 @@ class Project(Base):
     github_url = Column(String, nullable=True)
     status = Column(String, default="draft")  # draft, running, completed, error
     created_at = Column(DateTime, default=datetime.utcnow)
+    # Bumped whenever the project or anything shown with it changes; the API's ETags derive from it
+    version = Column(Integer, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow)
 
     requirements = relationship("Requirement", back_populates="project", cascade="all, delete-orphan")
     knowledge_base = relationship("KnowledgeBase", back_populates="project", uselist=False, cascade="all, delete-orphan")
     agent_outputs = relationship("AgentOutput", back_populates="project", cascade="all, delete-orphan")
+    jobs = relationship("Job", back_populates="project", cascade="all, delete-orphan")
+    events = relationship("RunEvent", back_populates="project", cascade="all, delete-orphan")
+    guideline_refs = relationship("GuidelineReference", back_populates="project", cascade="all, delete-orphan",
+                                  order_by="(GuidelineReference.kb_field, GuidelineReference.position, GuidelineReference.id)")
 
 class Requirement(Base):
     __tablename__ = "requirements"
@@ -40,14 +56,232 @@ class KnowledgeBase(Base):
 
     project = relationship("Project", back_populates="knowledge_base")
 
+class GuidelineDocument(Base):
+    # An organization-wide standard shared by many projects. Its text lives in immutable
+    # GuidelineVersion rows; projects point at a document instead of copying it.
+    __tablename__ = "guideline_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True)
+    kb_field = Column(String)  # The knowledge base field it feeds, e.g. ux_guidelines
+    is_default = Column(Boolean, default=False)  # Opt-in: referenced by every new project
+    latest_version = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    versions = relationship("GuidelineVersion", back_populates="document", cascade="all, delete-orphan")
+
+class GuidelineVersion(Base):
+    __tablename__ = "guideline_versions"
+    __table_args__ = (
+        Index("ix_guideline_versions_document_id_version", "document_id", "version", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("guideline_documents.id"))
+    version = Column(Integer)
+    content = Column(Text)
+    content_hash = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    document = relationship("GuidelineDocument", back_populates="versions")
+
+class GuidelineReference(Base):
+    __tablename__ = "guideline_references"
+    __table_args__ = (
+        Index("ix_guideline_references_project_id_kb_field", "project_id", "kb_field"),
+        Index("ix_guideline_references_document_id", "document_id"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"))
+    kb_field = Column(String)
+    document_id = Column(Integer, ForeignKey("guideline_documents.id"))
+    version = Column(Integer, nullable=True)  # None follows the document's latest version
+    position = Column(Integer, default=0)  # Order of documents within one field
+
+    project = relationship("Project", back_populates="guideline_refs")
+
 class AgentOutput(Base):
     __tablename__ = "agent_outputs"
+    __table_args__ = (
+        Index("ix_agent_outputs_project_id_id", "project_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     project_id = Column(Integer, ForeignKey("projects.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=True, index=True)
     agent_name = Column(String) # E.g., Lead Architect, UX Designer
     task_name = Column(String)
-    output_content = Column(Text)
+    task_key = Column(String, nullable=True)  # Stable task identifier used for checkpoints
+    # Bodies live in the blob store; the row keeps only their hash, size and a preview.
+    # Rows written before that still carry the body inline.
+    inline_content = Column("output_content", Text, nullable=True)
+    content_hash = Column(String, nullable=True, index=True)
+    content_size = Column(Integer, nullable=True)
+    preview = Column(String, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)  # Estimated size of the task's prompt
+    context_tokens = Column(Integer, nullable=True)  # Upstream context as sent, after the budget
+    context_tokens_before = Column(Integer, nullable=True)  # Upstream context before trimming
+    # Hash of everything the task's result depends on (prompt, guidelines, model, repository
+    # commit, upstream outputs); a later run with the same fingerprint reuses this output
+    input_fingerprint = Column(String, nullable=True, index=True)
+    reused_from_id = Column(Integer, nullable=True)  # Output this row was copied from, if any
+    run_id = Column(Integer, ForeignKey("runs.id"), nullable=True, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     project = relationship("Project", back_populates="agent_outputs")
+
+    @property
+    def output_content(self):
+        if self.content_hash:
+            return blob_store.get_text(self.content_hash)
+        return self.inline_content
+
+    @output_content.setter
+    def output_content(self, value):
+        self.set_content(value)
+
+    def set_content(self, value: str, base_hash: str = None):
+        # base_hash: the body of the previous version of this task, stored as a delta base
+        self.content_hash, self.content_size = blob_store.put_text(value, base_hash)
+        self.preview = value[:OUTPUT_PREVIEW_CHARS]
+        self.inline_content = None
+
+class Run(Base):
+    # One execution of the crew for a project and the outputs it ended up with, whether
+    # computed, restored from a checkpoint or reused from an earlier run. Every attempt of
+    # a job adds to the same run; runs started without a job get a run of their own.
+    __tablename__ = "runs"
+    __table_args__ = (
+        Index("ix_runs_project_id_number", "project_id", "number", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=True, index=True)
+    number = Column(Integer)  # 1, 2, ... within the project
+    status = Column(String, default="running")  # running, completed, failed
+    repo_sha = Column(String, nullable=True)  # Repository commit the architect read
+    started_at = Column(DateTime, default=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # The claim query scans queued jobs in priority order
+        Index("ix_jobs_status_priority_available_at", "status", "priority", "available_at"),
+        # At most one queued or running job per project, even when two requests enqueue at once
+        Index(
+            "ix_jobs_active_project_id", "project_id", unique=True,
+            sqlite_where=text("status IN ('queued', 'running')"), postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    status = Column(String, default="queued", index=True)  # queued, running, completed, failed, cancelled
+    priority = Column(Integer, default=1)  # 0 high, 1 normal, 2 low (see crud.JOB_PRIORITIES)
+    batch_id = Column(String, nullable=True, index=True)  # Set when queued by a batch run
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    cancel_requested = Column(Boolean, default=False)
+    resume_from_job_id = Column(Integer, nullable=True)  # Failed job whose completed tasks are reused
+    error = Column(Text, nullable=True)
+    worker_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    available_at = Column(DateTime, default=datetime.utcnow)  # Retries are delayed by pushing this forward
+    started_at = Column(DateTime, nullable=True)
+    heartbeat_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+    project = relationship("Project", back_populates="jobs")
+
+class RunEvent(Base):
+    __tablename__ = "run_events"
+
+    id = Column(Integer, primary_key=True, index=True)  # Doubles as the SSE event id clients resume from
+    project_id = Column(Integer, ForeignKey("projects.id"), index=True)
+    event_type = Column(String)  # status, task_completed, agent_step
+    data = Column(Text)  # JSON payload
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    project = relationship("Project", back_populates="events")
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_cache"
+
+    key = Column(String, primary_key=True)  # sha256 of model, temperature and the full prompt messages
+    model = Column(String)
+    response = Column(Text)
+    size_bytes = Column(Integer)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_accessed_at = Column(DateTime, default=datetime.utcnow, index=True)
+
+class EmbeddingCacheEntry(Base):
+    __tablename__ = "embedding_cache"
+
+    key = Column(String, primary_key=True)  # sha256 of the embedding model and the text
+    model = Column(String)
+    dimensions = Column(Integer)
+    vector = Column(LargeBinary)  # float32, native byte order
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RepoDigest(Base):
+    # Overview of a repository at one commit (see repo_digest.py), shared by every project
+    # and run that reads it. data is gzipped JSON.
+    __tablename__ = "repo_digests"
+    __table_args__ = (
+        Index("ix_repo_digests_repo_sha", "repo", "sha", unique=True),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    repo = Column(String)  # "owner/name" or a local path
+    sha = Column(String)
+    version = Column(Integer)  # repo_digest.DIGEST_VERSION it was built with
+    data = Column(LargeBinary)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class RunMetric(Base):
+    __tablename__ = "run_metrics"
+    __table_args__ = (
+        Index("ix_run_metrics_project_id_job_id", "project_id", "job_id"),
+    )
+
+    # One span of a crew run: an LLM call, a tool call or a whole task. Spans of a task
+    # share its task_key, so a run can be drawn as a flame graph of tasks and their calls.
+    id = Column(Integer, primary_key=True, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"))
+    job_id = Column(Integer, ForeignKey("jobs.id"), nullable=True)
+    kind = Column(String, index=True)  # llm_call, tool_call, task
+    name = Column(String)  # Model, tool name or task key
+    agent_name = Column(String, nullable=True)
+    task_key = Column(String, nullable=True)
+    started_at = Column(DateTime)
+    duration_ms = Column(Float, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    bytes = Column(Integer, nullable=True)  # Size of a tool's output
+    cost_usd = Column(Float, nullable=True)
+    error = Column(Text, nullable=True)
+
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+
+    # Token buckets shared by every worker process (e.g. "llm_requests", "llm_tokens").
+    # Times are epoch seconds so refills can be computed without datetime rounding.
+    name = Column(String, primary_key=True)
+    tokens = Column(Float, default=0.0)  # May go negative when usage is charged after the fact
+    refilled_at = Column(Float, default=0.0)
+    blocked_until = Column(Float, default=0.0)  # Set from a provider 429 so all workers back off
+
+class CacheStats(Base):
+    __tablename__ = "cache_stats"
+
+    name = Column(String, primary_key=True)  # e.g. "llm"
+    hits = Column(Integer, default=0)
+    misses = Column(Integer, default=0)
+    evictions = Column(Integer, default=0)
+
+# The full-text index is an FTS5 virtual table, created (and backfilled) outside the ORM
+event.listen(Base.metadata, "after_create", search_index.create_search_index)
@@ -0,0 +1,198 @@
+import os
+import re
+import ast
+import json
+import gzip
+import posixpath
+from collections import Counter
+from github import GithubException
+from llm_client import estimate_tokens
+from github_tools import GithubRepoSource
+import crud
+
+# A compact map of a repository handed to the architect up front: languages, entry points,
+# the file tree with sizes and the top-level symbols of each source file. It is built once
+# per (repository, commit), stored in the database and shared by every project and run
+# that reads the same commit; each run renders it to fit its own token budget.
+
+REPO_DIGEST_ENABLED = os.environ.get("REPO_DIGEST_ENABLED", "true").lower() == "true"
+REPO_DIGEST_TOKENS = int(os.environ.get("REPO_DIGEST_TOKENS", "3000"))
+REPO_DIGEST_MAX_PARSE_BYTES = int(os.environ.get("REPO_DIGEST_MAX_PARSE_BYTES", str(256 * 1024)))
+REPO_DIGEST_MAX_PARSE_FILES = int(os.environ.get("REPO_DIGEST_MAX_PARSE_FILES", "2000"))
+# Without a snapshot every parsed file is one REST call, so far fewer are parsed
+REPO_DIGEST_MAX_API_PARSE_FILES = int(os.environ.get("REPO_DIGEST_MAX_API_PARSE_FILES", "50"))
+# Bump when the digest contents change; stored digests of another version are rebuilt
+DIGEST_VERSION = 1
+SYMBOLS_PER_FILE = 12
+
+LANGUAGES = {
+    ".py": "Python", ".js": "JavaScript", ".jsx": "JavaScript", ".mjs": "JavaScript", ".cjs": "JavaScript",
+    ".ts": "TypeScript", ".tsx": "TypeScript", ".go": "Go", ".rs": "Rust", ".java": "Java", ".kt": "Kotlin",
+    ".rb": "Ruby", ".php": "PHP", ".cs": "C#", ".c": "C", ".h": "C", ".cpp": "C++", ".hpp": "C++",
+    ".swift": "Swift", ".sql": "SQL", ".sh": "Shell", ".html": "HTML", ".css": "CSS", ".scss": "CSS",
+    ".md": "Markdown", ".json": "JSON", ".yml": "YAML", ".yaml": "YAML", ".toml": "TOML",
+}
+# Files that start or configure an application, by name
+ENTRY_POINT_NAMES = {
+    "main.py": "entry point", "app.py": "entry point", "manage.py": "Django", "wsgi.py": "WSGI", "asgi.py": "ASGI",
+    "index.js": "entry point", "index.ts": "entry point", "index.tsx": "entry point", "main.ts": "entry point",
+    "main.tsx": "entry point", "main.js": "entry point", "server.js": "server", "server.ts": "server", "main.go": "entry point",
+    "main.rs": "entry point", "Dockerfile": "container", "docker-compose.yml": "compose", "docker-compose.yaml": "compose",
+    "package.json": "manifest", "pyproject.toml": "manifest", "setup.py": "manifest", "requirements.txt": "manifest",
+    "go.mod": "manifest", "Cargo.toml": "manifest", "Makefile": "build",
+}
+# Tests often run as scripts too, but are not where an application starts
+TEST_FILE = re.compile(r"(^|/)(tests?/|test_[^/]*$|[^/]*_test\.\w+$|[^/]*\.(test|spec)\.\w+$)")
+WEB_APPS = {"FastAPI": "FastAPI app", "Flask": "Flask app", "Starlette": "Starlette app"}
+SYMBOL_PATTERNS = {
+    "JavaScript": re.compile(r"^export\s+(?:default\s+)?(?:async\s+)?(?:function\*?|class|const|let|var)\s+([A-Za-z_$][\w$]*)", re.MULTILINE),
+    "TypeScript": re.compile(r"^export\s+(?:default\s+)?(?:async\s+|abstract\s+)?(?:function\*?|class|const|let|var|interface|type|enum)\s+([A-Za-z_$][\w$]*)", re.MULTILINE),
+    "Go": re.compile(r"^(?:func\s+(?:\([^)]*\)\s*)?|type\s+)([A-Z]\w*)", re.MULTILINE),
+    "Rust": re.compile(r"^pub\s+(?:async\s+)?(?:fn|struct|enum|trait)\s+(\w+)", re.MULTILINE),
+}
+
+def language_of(path: str):
+    return LANGUAGES.get(posixpath.splitext(path)[1].lower())
+
+def python_symbols(text: str):
+    # Public top-level functions and classes, and whether the module runs as a script or
+    # creates a web app
+    tree = ast.parse(text)
+    symbols, entry = [], None
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and not node.name.startswith("_"):
+            symbols.append(f"class {node.name}" if isinstance(node, ast.ClassDef) else f"{node.name}()")
+        elif isinstance(node, ast.If) and "__main__" in ast.unparse(node.test):
+            entry = "__main__"
+        elif isinstance(node, ast.Assign) and isinstance(node.value, ast.Call):
+            name = getattr(node.value.func, "id", None) or getattr(node.value.func, "attr", None)
+            entry = WEB_APPS.get(name, entry)
+    return symbols, entry
+
+def file_symbols(path: str, text: str):
+    language = language_of(path)
+    if language == "Python":
+        return python_symbols(text)
+    if posixpath.basename(path) == "package.json":
+        manifest = json.loads(text)
+        scripts = manifest.get("scripts") if isinstance(manifest, dict) else None
+        return [], f"scripts: {', '.join(list(scripts)[:8])}" if isinstance(scripts, dict) and scripts else None
+    pattern = SYMBOL_PATTERNS.get(language)
+    return (list(dict.fromkeys(pattern.findall(text))) if pattern else []), None
+
+def build_digest(source):
+    # source: a repository source from github_tools (files() and read_file())
+    files = source.files()
+    languages = Counter()
+    language_bytes = Counter()
+    symbols, entry_points, parsed, failed = {}, {}, 0, 0
+    max_parsed = REPO_DIGEST_MAX_API_PARSE_FILES if isinstance(source, GithubRepoSource) else REPO_DIGEST_MAX_PARSE_FILES
+    for path, size in files:
+        language = language_of(path)
+        if language:
+            languages[language] += 1
+            language_bytes[language] += size
+        name = posixpath.basename(path)
+        if name in ENTRY_POINT_NAMES:
+            entry_points[path] = ENTRY_POINT_NAMES[name]
+        if (language in ("Python", *SYMBOL_PATTERNS) or name == "package.json") and size <= REPO_DIGEST_MAX_PARSE_BYTES \
+                and parsed < max_parsed:
+            parsed += 1
+            try:
+                names, entry = file_symbols(path, source.read_file(path))
+            except (SyntaxError, ValueError, UnicodeDecodeError, OSError):
+                continue
+            except GithubException:
+                failed += 1  # Not found, rate limited or too large for the API; parse the rest
+                continue
+            if names:
+                symbols[path] = names
+            if entry and not TEST_FILE.search(path):
+                entry_points[path] = entry
+    return {
+        "version": DIGEST_VERSION,
+        "sha": source.sha,
+        "files": [list(f) for f in files],
+        "languages": [[language, count, language_bytes[language]] for language, count in languages.most_common()],
+        "entry_points": entry_points,
+        "symbols": symbols,
+        "failed": failed,
+    }
+
+def encode_digest(digest):
+    return gzip.compress(json.dumps(digest, separators=(",", ":")).encode("utf-8"))
+
+def decode_digest(data: bytes):
+    return json.loads(gzip.decompress(data))
+
+def get_or_build_digest(db, repo: str, source):
+    # The stored digest of this commit, or a new one. Sources without a commit (a plain
+    # directory) are digested every run.
+    if source.sha:
+        db_digest = crud.get_repo_digest(db, repo, source.sha)
+        if db_digest is not None and db_digest.version == DIGEST_VERSION:
+            return decode_digest(db_digest.data), True
+    digest = build_digest(source)
+    # A digest missing files the API failed to serve is used once, not stored
+    if source.sha and not digest["failed"]:
+        crud.save_repo_digest(db, repo, source.sha, DIGEST_VERSION, encode_digest(digest))
+    return digest, False
+
+def _kb(size: int):
+    return f"{size / 1024:.1f} KB" if size < 1024 * 1024 else f"{size / 1024 / 1024:.1f} MB"
+
+def _files(count: int):
+    return f"{count} file" + ("" if count == 1 else "s")
+
+def render_digest(digest, max_tokens: int = REPO_DIGEST_TOKENS):
+    # The summary lines are always kept; entry points, directories and files follow while
+    # the budget lasts. Files with symbols or entry points are kept first, then shallow
+    # paths before deep ones and tests last; kept files are listed in path order.
+    files = digest["files"]
+    sha = (digest.get("sha") or "working tree")[:12]
+    lines = [
+        f"REPOSITORY DIGEST (commit {sha}: {_files(len(files))}, {_kb(sum(size for _, size in files))})",
+        "Languages: " + (", ".join(f"{language} {_files(count)} ({_kb(size)})" for language, count, size in digest["languages"]) or "none detected"),
+    ]
+
+    directories = Counter()
+    directory_bytes = Counter()
+    for path, size in files:
+        parts = path.split("/")[:-1]
+        for depth in range(1, min(len(parts), 2) + 1):
+            directory = "/".join(parts[:depth])
+            directories[directory] += 1
+            directory_bytes[directory] += size
+
+    def file_line(path, size):
+        names = digest["symbols"].get(path, [])
+        shown = ", ".join(names[:SYMBOLS_PER_FILE]) + (f", +{len(names) - SYMBOLS_PER_FILE} more" if len(names) > SYMBOLS_PER_FILE else "")
+        return f"  {path} ({_kb(size)})" + (f": {shown}" if shown else "")
+
+    entry_points = digest["entry_points"]
+    by_priority = sorted(files, key=lambda f: (
+        bool(TEST_FILE.search(f[0])), f[0] not in digest["symbols"] and f[0] not in entry_points, f[0].count("/"), f[0]
+    ))
+    sections = [
+        ("Entry points and manifests:", [(path, f"  {path} ({kind})") for path, kind in sorted(entry_points.items())]),
+        ("Directories:", [(d, f"  {d}/ ({_files(directories[d])}, {_kb(directory_bytes[d])})") for d in sorted(directories)]),
+        ("Files (top-level symbols):", [(path, file_line(path, size)) for path, size in by_priority]),
+    ]
+
+    budget = max_tokens - estimate_tokens("\n".join(lines))
+    for heading, entries in sections:
+        budget -= estimate_tokens(heading + "\n")
+        kept = []
+        for key, line in entries:
+            cost = estimate_tokens(line + "\n")
+            if cost > budget:
+                break
+            kept.append((key, line))
+            budget -= cost
+        if not kept:
+            budget += estimate_tokens(heading + "\n")
+            continue
+        lines += [heading] + [line for _, line in sorted(kept)]
+        if len(kept) < len(entries):
+            lines.append(f"  [... {len(entries) - len(kept)} more not shown]")
+    return "\n".join(lines)
@@ -0,0 +1,42 @@
+import os
+import re
+
+# Which repository a project points at. Clients may only name GitHub repositories
+# ("owner/repo" or a github.com URL). Local directories ("file:///path") are for
+# benchmarks and tests: they are refused unless LOCAL_REPO_ROOT names the directory they
+# must lie in, so no project can point the repository tools at arbitrary server files.
+# Kept free of the agent stack so the API can validate references cheaply.
+
+LOCAL_REPO_ROOT = os.environ.get("LOCAL_REPO_ROOT")
+GITHUB_REPO_NAME = re.compile(r"[A-Za-z0-9_.-]+/[A-Za-z0-9_.-]+")
+# A branch or file link (github.com/owner/repo/tree/<ref>/..., /blob/...) names the repository too
+GITHUB_URL = re.compile(r"(?:https?://)?(?:www\.)?github\.com/([^/?#]+/[^/?#]+?)(?:\.git)?(?:/(?:tree|blob)/[^?#]*)?/?(?:[?#].*)?")
+
+def local_repo_path(path: str):
+    # The resolved directory, if local repositories are enabled and it lies inside LOCAL_REPO_ROOT
+    if not LOCAL_REPO_ROOT:
+        raise ValueError("Local repositories are disabled; set LOCAL_REPO_ROOT to allow them")
+    root = os.path.realpath(LOCAL_REPO_ROOT)
+    full_path = os.path.realpath(path)
+    if full_path != root and not full_path.startswith(root + os.sep):
+        raise ValueError(f"'{path}' is outside of LOCAL_REPO_ROOT")
+    if not os.path.isdir(full_path):
+        raise ValueError(f"'{path}' is not a directory")
+    return full_path
+
+def parse_repo_reference(github_url: str):
+    # "owner/repo" for GitHub, an absolute directory for an allowed local repository, or
+    # None; raises ValueError for anything else
+    if not github_url:
+        return None
+    github_url = github_url.strip()
+    if github_url.startswith("file://"):
+        return local_repo_path(github_url[len("file://"):])
+    match = GITHUB_URL.fullmatch(github_url)
+    name = match.group(1) if match else github_url.strip("/")
+    if not GITHUB_REPO_NAME.fullmatch(name) or any(part.strip(".") == "" for part in name.split("/")):
+        raise ValueError(f"'{github_url}' is not a GitHub repository (expected owner/repo or a github.com URL)")
+    return name
+
+def is_local_reference(repo_reference: str):
+    return os.path.isabs(repo_reference)
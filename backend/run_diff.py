@@ -0,0 +1,31 @@
+import difflib
+
+# Server-side comparison of two runs of a project, task by task. Bodies with the same hash
+# are unchanged without being read; changed ones get a unified diff of their lines.
+
+def _body(db_output):
+    return db_output.output_content or ""
+
+def diff_task(task_key: str, old, new, context: int = 3):
+    agent_name = (new or old).agent_name
+    if old is None or new is None:
+        return {"task_key": task_key, "agent_name": agent_name, "status": "added" if old is None else "removed",
+                "old_output_id": old.id if old else None, "new_output_id": new.id if new else None}
+    result = {"task_key": task_key, "agent_name": agent_name, "old_output_id": old.id, "new_output_id": new.id}
+    if old.content_hash and old.content_hash == new.content_hash:
+        return {**result, "status": "unchanged"}
+    old_body, new_body = _body(old), _body(new)
+    if old_body == new_body:
+        return {**result, "status": "unchanged"}
+    lines = list(difflib.unified_diff(
+        old_body.splitlines(), new_body.splitlines(),
+        fromfile=f"outputs/{old.id}", tofile=f"outputs/{new.id}", n=context, lineterm=""
+    ))
+    added = sum(1 for line in lines if line.startswith("+") and not line.startswith("+++"))
+    removed = sum(1 for line in lines if line.startswith("-") and not line.startswith("---"))
+    return {**result, "status": "changed", "lines_added": added, "lines_removed": removed, "diff": "\n".join(lines) + "\n"}
+
+def diff_runs(old_outputs, new_outputs, context: int = 3):
+    # {task_key: AgentOutput} of each run, in pipeline order; tasks only the old run has come last
+    task_keys = list(new_outputs) + [k for k in old_outputs if k not in new_outputs]
+    return [diff_task(k, old_outputs.get(k), new_outputs.get(k), context) for k in task_keys]
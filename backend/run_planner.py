@@ -0,0 +1,47 @@
+import hashlib
+
+# Incremental re-runs. Every task output is stored with a fingerprint of its inputs; a new
+# run recomputes the fingerprints and reuses any output whose inputs have not changed, so
+# only dirty tasks and the tasks downstream of them run again.
+
+# Bump to invalidate every stored fingerprint, e.g. when their ingredients change
+FINGERPRINT_VERSION = "1"
+
+def content_hash(text: str):
+    # Same hash the blob store addresses output bodies by
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def output_hash(db_output):
+    return db_output.content_hash or content_hash(db_output.inline_content)
+
+def task_fingerprint(task, upstream_hashes, repo_sha: str = None):
+    # The task's own prompt (which carries the requirements), its agent's persona (which
+    # carries the guidelines), the model and context budget, the repository commit for
+    # agents that read it, and the exact upstream outputs it builds on
+    agent = task.agent
+    parts = [
+        FINGERPRINT_VERSION, task.description, task.expected_output,
+        agent.role, agent.goal, agent.backstory, str(getattr(agent.llm, "model", "")),
+        str(getattr(task, "context_budget", "")), str(getattr(task, "summary_mode", "")),
+        (repo_sha or "") if agent.tools else "",
+        *upstream_hashes,
+    ]
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+def plan_reuse(task_keys, upstream, fingerprint, lookup):
+    # task_keys in dependency order; upstream maps a task to the tasks whose outputs it reads;
+    # fingerprint(task_key, upstream_hashes) and lookup(task_key, fingerprint) -> output or None.
+    # A task can only be reused when everything it reads is reused too, because the hashes of
+    # outputs that are about to be recomputed are not known yet.
+    reused = {}
+    for task_key in task_keys:
+        if any(d not in reused for d in upstream[task_key]):
+            continue
+        found = lookup(task_key, fingerprint(task_key, [output_hash(reused[d]) for d in upstream[task_key]]))
+        if found is not None:
+            reused[task_key] = found
+    return reused
@@ -1,6 +1,7 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 from typing import List, Optional
 from datetime import datetime
+from repo_reference import parse_repo_reference
 
 # KnowledgeBase Schemas
 class KnowledgeBaseBase(BaseModel):
@@ -21,6 +22,53 @@ class KnowledgeBase(KnowledgeBaseBase):
     class Config:
         from_attributes = True
 
+# Guideline library Schemas
+class GuidelineDocumentCreate(BaseModel):
+    name: str
+    kb_field: str
+    content: str
+    is_default: bool = False
+
+class GuidelineDocument(BaseModel):
+    id: int
+    name: str
+    kb_field: str
+    is_default: bool
+    latest_version: int
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class GuidelineVersionCreate(BaseModel):
+    content: str
+
+class GuidelineVersionSummary(BaseModel):
+    id: int
+    document_id: int
+    version: int
+    content_hash: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class GuidelineVersion(GuidelineVersionSummary):
+    content: str
+
+class GuidelineReferenceBase(BaseModel):
+    kb_field: str
+    document_id: int
+    version: Optional[int] = None  # None follows the latest version
+
+class GuidelineReference(GuidelineReferenceBase):
+    id: int
+    project_id: int
+    position: int
+
+    class Config:
+        from_attributes = True
+
 # Requirement Schemas
 class RequirementBase(BaseModel):
     content: str
@@ -42,16 +90,148 @@ class AgentOutputBase(BaseModel):
     output_content: str
 
 class AgentOutputCreate(AgentOutputBase):
-    pass
+    # Estimated token counts of the task's prompt and of the upstream context, before and
+    # after fitting it to the context budget
+    prompt_tokens: Optional[int] = None
+    context_tokens: Optional[int] = None
+    context_tokens_before: Optional[int] = None
+    input_fingerprint: Optional[str] = None
+
+class AgentOutputSummary(BaseModel):
+    id: int
+    project_id: int
+    job_id: Optional[int] = None
+    agent_name: str
+    task_name: str
+    task_key: Optional[str] = None
+    content_hash: Optional[str] = None
+    content_size: Optional[int] = None
+    preview: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    context_tokens: Optional[int] = None
+    context_tokens_before: Optional[int] = None
+    input_fingerprint: Optional[str] = None
+    reused_from_id: Optional[int] = None
+    run_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class AgentOutput(AgentOutputSummary):
+    output_content: str
 
-class AgentOutput(AgentOutputBase):
+# Job Schemas
+class Job(BaseModel):
     id: int
     project_id: int
+    status: str
+    priority: Optional[int] = None
+    batch_id: Optional[str] = None
+    attempts: int
+    max_attempts: int
+    cancel_requested: bool
+    resume_from_job_id: Optional[int] = None
+    error: Optional[str] = None
     created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+# Run Schemas
+class Run(BaseModel):
+    id: int
+    project_id: int
+    job_id: Optional[int] = None
+    number: int
+    status: str
+    repo_sha: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class RunDetail(Run):
+    outputs: List[AgentOutputSummary] = []  # The run's latest output of each task
+
+class TaskDiff(BaseModel):
+    task_key: str
+    agent_name: Optional[str] = None
+    status: str  # unchanged, changed, added or removed
+    old_output_id: Optional[int] = None
+    new_output_id: Optional[int] = None
+    lines_added: int = 0
+    lines_removed: int = 0
+    diff: Optional[str] = None  # Unified diff, for changed tasks
+
+class RunDiff(BaseModel):
+    run_id: int
+    against_run_id: Optional[int] = None
+    tasks: List[TaskDiff]
+
+class BatchRunCreate(BaseModel):
+    project_ids: List[int]
+    priority: str = "normal"  # high, normal or low
+    resume: bool = False
+
+class BatchRun(BaseModel):
+    batch_id: str
+    jobs: List[Job]
+
+# Run Metrics Schemas
+class RunMetric(BaseModel):
+    id: int
+    job_id: Optional[int] = None
+    kind: str
+    name: str
+    agent_name: Optional[str] = None
+    task_key: Optional[str] = None
+    started_at: datetime
+    duration_ms: Optional[float] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    bytes: Optional[int] = None
+    cost_usd: Optional[float] = None
+    error: Optional[str] = None
 
     class Config:
         from_attributes = True
 
+class MetricTotals(BaseModel):
+    name: str
+    llm_calls: int = 0
+    tool_calls: int = 0
+    duration_ms: float = 0.0  # Wall clock of the task; summed call time for agents and tools
+    llm_ms: float = 0.0
+    tool_ms: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    bytes: int = 0
+    cost_usd: float = 0.0
+    errors: int = 0
+
+class RunMetrics(BaseModel):
+    project_id: int
+    job_id: Optional[int] = None
+    totals: MetricTotals
+    tasks: List[MetricTotals]
+    agents: List[MetricTotals]
+    tools: List[MetricTotals]
+    spans: List[RunMetric]
+
+# Cache Schemas
+class CacheStats(BaseModel):
+    name: str
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    size_bytes: int
+    hit_rate: float
+
 # Project Schemas
 class ProjectBase(BaseModel):
     title: str
@@ -59,18 +239,40 @@ class ProjectBase(BaseModel):
     github_url: Optional[str] = None
 
 class ProjectCreate(ProjectBase):
-    pass
+    @field_validator("github_url")
+    @classmethod
+    def check_github_url(cls, value):
+        # Only GitHub repositories, unless local ones are enabled (see repo_reference.py)
+        parse_repo_reference(value)
+        return value
 
 class ProjectUpdate(BaseModel):
     status: Optional[str] = None
 
-class Project(ProjectBase):
+class ProjectSummary(ProjectBase):
+    # What the dashboard lists: no relationships, no output bodies
     id: int
     status: str
     created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+class ProjectDetail(ProjectSummary):
     knowledge_base: Optional[KnowledgeBase] = None
+    guideline_refs: List[GuidelineReference] = []
     requirements: List[Requirement] = []
+    agent_outputs: List[AgentOutputSummary] = []
+
+class Project(ProjectDetail):
     agent_outputs: List[AgentOutput] = []
 
-    class Config:
-        from_attributes = True
+class SearchHit(BaseModel):
+    # An agent output (GET /outputs/{source_id}/content) or a requirement matching a search
+    kind: str  # "output" or "requirement"
+    source_id: int
+    project_id: int
+    project_title: str
+    agent_name: Optional[str] = None
+    snippet: str  # Excerpt with matches wrapped in <mark></mark>
+    score: float  # bm25, lower is a better match
@@ -0,0 +1,94 @@
+import os
+import re
+from sqlalchemy import text
+from database import IS_SQLITE
+from blob_store import blob_store
+
+# Full-text search over agent outputs and requirements: an SQLite FTS5 table holding one
+# row per document, written in the same transaction as the row it indexes. Filter columns
+# are UNINDEXED, so they are stored alongside the text but never tokenized. Other databases
+# have no FTS5; there the index is not created and search is unavailable.
+
+SEARCH_ENABLED = IS_SQLITE and os.environ.get("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+SEARCH_SNIPPET_TOKENS = int(os.environ.get("SEARCH_SNIPPET_TOKENS", "24"))
+SEARCH_MARK = ("<mark>", "</mark>")
+
+KIND_OUTPUT = "output"
+KIND_REQUIREMENT = "requirement"
+
+CREATE_INDEX = (
+    "CREATE VIRTUAL TABLE search_index USING fts5("
+    "body, kind UNINDEXED, source_id UNINDEXED, project_id UNINDEXED, agent_name UNINDEXED, "
+    "tokenize='porter unicode61')"
+)
+INSERT_DOCUMENT = text(
+    "INSERT INTO search_index (body, kind, source_id, project_id, agent_name) "
+    "VALUES (:body, :kind, :source_id, :project_id, :agent_name)"
+)
+
+def output_document(db_output, body: str):
+    return {"body": body, "kind": KIND_OUTPUT, "source_id": db_output.id,
+            "project_id": db_output.project_id, "agent_name": db_output.agent_name}
+
+def requirement_document(db_requirement):
+    return {"body": db_requirement.content or "", "kind": KIND_REQUIREMENT, "source_id": db_requirement.id,
+            "project_id": db_requirement.project_id, "agent_name": None}
+
+def create_search_index(metadata, connection, **kw):
+    # Runs after every create_all(). The first time, the index is built from existing rows;
+    # reused output copies are skipped, as on insert, because their source is indexed.
+    if not SEARCH_ENABLED or connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'search_index'"
+    ).first():
+        return
+    connection.exec_driver_sql(CREATE_INDEX)
+    documents = [
+        {"body": content or "", "kind": KIND_REQUIREMENT, "source_id": id, "project_id": project_id, "agent_name": None}
+        for id, project_id, content in connection.execute(text("SELECT id, project_id, content FROM requirements"))
+    ]
+    for id, project_id, agent_name, inline_content, content_hash in connection.execute(text(
+        "SELECT id, project_id, agent_name, output_content, content_hash FROM agent_outputs WHERE reused_from_id IS NULL"
+    )):
+        body = blob_store.get_text(content_hash) if content_hash else inline_content
+        documents.append({"body": body or "", "kind": KIND_OUTPUT, "source_id": id, "project_id": project_id, "agent_name": agent_name})
+    if documents:
+        connection.execute(INSERT_DOCUMENT, documents)
+
+TERM = re.compile(r'"([^"]*)"?|(\S+)')
+
+def match_expression(query: str):
+    # User input becomes FTS5 phrases: bare words and "quoted phrases" as typed, a trailing
+    # * for prefix search. Any phrase may match and bm25 ranks documents matching more (and
+    # rarer) terms first, so questions like "which projects chose pgvector?" work. FTS5
+    # operators and column filters are not exposed, so no input can be a syntax error.
+    phrases = []
+    for quoted, bare in TERM.findall(query or ""):
+        words = re.findall(r"\w+", quoted or bare)
+        if words:
+            phrase = '"' + " ".join(words) + '"'
+            phrases.append(phrase + "*" if bare.endswith("*") else phrase)
+    return " OR ".join(phrases)
+
+def search_statement(match: str, project_id: int = None, agent_name: str = None, kind: str = None, limit: int = 20, offset: int = 0):
+    # Best matches first (bm25 is lower for better matches), with a highlighted excerpt
+    filters, params = "", {}
+    if project_id is not None:
+        filters += " AND search_index.project_id = :project_id"
+        params["project_id"] = project_id
+    if agent_name:
+        filters += " AND search_index.agent_name = :agent_name COLLATE NOCASE"
+        params["agent_name"] = agent_name
+    if kind:
+        filters += " AND search_index.kind = :kind"
+        params["kind"] = kind
+    return text(
+        "SELECT search_index.kind, search_index.source_id, search_index.project_id, projects.title AS project_title, "
+        "search_index.agent_name, snippet(search_index, 0, :mark_open, :mark_close, '…', :snippet_tokens) AS snippet, "
+        "bm25(search_index) AS score "
+        "FROM search_index JOIN projects ON projects.id = search_index.project_id "
+        f"WHERE search_index MATCH :match{filters} "
+        "ORDER BY score LIMIT :limit OFFSET :offset"
+    ).bindparams(
+        match=match, limit=limit, offset=offset, mark_open=SEARCH_MARK[0], mark_close=SEARCH_MARK[1],
+        snippet_tokens=SEARCH_SNIPPET_TOKENS, **params
+    )
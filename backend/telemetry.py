@@ -0,0 +1,128 @@
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from crewai.events import (
+    crewai_event_bus,
+    LLMCallStartedEvent, LLMCallCompletedEvent, LLMCallFailedEvent,
+    ToolUsageStartedEvent, ToolUsageFinishedEvent, ToolUsageErrorEvent,
+    TaskCompletedEvent, TaskFailedEvent,
+)
+import crud
+from database import SessionLocal
+
+# Price of the configured model in USD per 1K tokens; 0 records no cost
+LLM_COST_PER_1K_PROMPT_TOKENS = float(os.environ.get("LLM_COST_PER_1K_PROMPT_TOKENS", "0"))
+LLM_COST_PER_1K_COMPLETION_TOKENS = float(os.environ.get("LLM_COST_PER_1K_COMPLETION_TOKENS", "0"))
+# Spans are written in batches of this size, and whatever is left when the run ends
+METRICS_FLUSH_EVERY = int(os.environ.get("METRICS_FLUSH_EVERY", "50"))
+
+def _utc(value: datetime):
+    # crewAI stamps events in aware UTC but tasks in naive local time; rows use naive UTC
+    if value.tzinfo is None:
+        value = value.astimezone()
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def _ms(started: datetime, finished: datetime):
+    return (_utc(finished) - _utc(started)).total_seconds() * 1000
+
+class RunTelemetry:
+    # Turns crewAI's event bus into run_metrics spans for one crew run. Each job runs in
+    # its own process, so every LLM, tool and task event seen while attached is this run's.
+    def __init__(self, project_id: int, job_id: int, task_keys: dict):
+        self.project_id = project_id
+        self.job_id = job_id
+        self.task_keys = task_keys  # crewAI task id -> our task key
+        self._started = {}
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, name: str, started_at: datetime, duration_ms=None, task_id=None, **fields):
+        row = dict(
+            project_id=self.project_id, job_id=self.job_id, kind=kind, name=name or "unknown",
+            task_key=self.task_keys.get(str(task_id)) if task_id else None,
+            started_at=_utc(started_at), duration_ms=duration_ms, **fields
+        )
+        with self._lock:
+            self._buffer.append(row)
+            flush = len(self._buffer) >= METRICS_FLUSH_EVERY
+        if flush:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if rows:
+            db = SessionLocal()
+            try:
+                crud.create_run_metrics(db, rows)
+            finally:
+                db.close()
+
+    def on_llm_started(self, source, event):
+        self._started[event.call_id] = event.timestamp
+
+    def on_llm_completed(self, source, event):
+        started = self._started.pop(event.call_id, event.timestamp)
+        usage = event.usage or {}
+        prompt_tokens = usage.get("prompt_tokens") or usage.get("input_tokens") or 0
+        completion_tokens = usage.get("completion_tokens") or usage.get("output_tokens") or 0
+        self.record(
+            "llm_call", event.model, started, _ms(started, event.timestamp), event.task_id,
+            agent_name=event.agent_role, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+            cost_usd=(prompt_tokens * LLM_COST_PER_1K_PROMPT_TOKENS + completion_tokens * LLM_COST_PER_1K_COMPLETION_TOKENS) / 1000,
+        )
+
+    def on_llm_failed(self, source, event):
+        started = self._started.pop(event.call_id, event.timestamp)
+        self.record("llm_call", event.model, started, _ms(started, event.timestamp), event.task_id,
+                    agent_name=event.agent_role, error=event.error)
+
+    def on_tool_started(self, source, event):
+        self._started[event.event_id] = event.timestamp
+
+    def on_tool_finished(self, source, event):
+        self._started.pop(event.started_event_id, None)
+        output = "" if event.output is None else str(event.output)
+        self.record(
+            "tool_call", event.tool_name, event.started_at, _ms(event.started_at, event.finished_at), event.task_id,
+            agent_name=event.agent_role, bytes=len(output.encode("utf-8")),
+            error=str(event.failure) if event.failure else None,
+        )
+
+    def on_tool_error(self, source, event):
+        started = self._started.pop(event.started_event_id, event.timestamp)
+        self.record("tool_call", event.tool_name, started, _ms(started, event.timestamp), event.task_id,
+                    agent_name=event.agent_role, error=str(event.error))
+
+    def on_task_finished(self, source, event):
+        task = event.task
+        if task is None or not task.start_time:
+            return
+        finished = task.end_time or datetime.now()
+        key = self.task_keys.get(str(task.id))
+        self.record("task", key, task.start_time, _ms(task.start_time, finished), task.id,
+                    agent_name=task.agent.role if task.agent else None,
+                    error=getattr(event, "error", None))
+
+    @contextmanager
+    def attach(self):
+        handlers = [
+            (LLMCallStartedEvent, self.on_llm_started),
+            (LLMCallCompletedEvent, self.on_llm_completed),
+            (LLMCallFailedEvent, self.on_llm_failed),
+            (ToolUsageStartedEvent, self.on_tool_started),
+            (ToolUsageFinishedEvent, self.on_tool_finished),
+            (ToolUsageErrorEvent, self.on_tool_error),
+            (TaskCompletedEvent, self.on_task_finished),
+            (TaskFailedEvent, self.on_task_finished),
+        ]
+        with crewai_event_bus.scoped_handlers():
+            for event_type, handler in handlers:
+                crewai_event_bus.on(event_type)(handler)
+            try:
+                yield self
+            finally:
+                # Handlers run on the bus's thread pool; let them finish before the last write
+                crewai_event_bus.flush()
+                self.flush()
@@ -0,0 +1,129 @@
+import os
+import sys
+import time
+import signal
+import socket
+import multiprocessing
+
+import crud
+from database import SessionLocal, engine
+
+# Worker pool configuration (all overridable from the environment)
+JOB_WORKER_CONCURRENCY = int(os.environ.get("JOB_WORKER_CONCURRENCY", os.cpu_count() or 1))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+JOB_LEASE_SECONDS = int(os.environ.get("JOB_LEASE_SECONDS", "60"))
+JOB_RETRY_BACKOFF = int(os.environ.get("JOB_RETRY_BACKOFF", "10"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "3"))
+# Import the agent stack (crewAI, the GitHub client, the LLM client) once in the pool
+# process so forked runs start warm instead of each paying seconds of imports. The API
+# never imports crew_runner; only run workers do.
+JOB_WORKER_WARM = os.environ.get("JOB_WORKER_WARM", "true").lower() == "true"
+# How often the pool deletes blobs no output references (see blob_store.py); 0 disables it
+BLOB_GC_INTERVAL_SECONDS = int(os.environ.get("BLOB_GC_INTERVAL_SECONDS", "3600"))
+
+def _process_context():
+    # Fork keeps child start-up cheap on Linux; fall back to spawn elsewhere
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+def execute_job(job_id: int, project_id: int):
+    # Runs inside a dedicated child process so a crashing or cancelled run never takes the pool down
+    engine.dispose(close=False)
+    import crew_runner
+
+    try:
+        crew_runner.run_crew_for_project(project_id, job_id=job_id)
+    except Exception as e:
+        db = SessionLocal()
+        try:
+            crud.set_job_error(db, job_id, str(e))
+        finally:
+            db.close()
+        sys.exit(1)
+
+class WorkerPool:
+    def __init__(self, concurrency: int = JOB_WORKER_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.ctx = _process_context()
+        self.running = {}  # job_id -> Process
+        self.stopping = False
+        self.last_blob_gc = time.monotonic()
+
+    def run_forever(self):
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        if JOB_WORKER_WARM and self.ctx.get_start_method() == "fork":
+            self.warm_up()
+        print(f"Worker pool {self.worker_id} started with {self.concurrency} slots")
+        while not self.stopping:
+            self.tick()
+            time.sleep(JOB_POLL_INTERVAL)
+        self.shutdown()
+
+    def warm_up(self):
+        started = time.perf_counter()
+        import crew_runner
+        crew_runner.warm_up()
+        print(f"Worker pool {self.worker_id} warmed up in {time.perf_counter() - started:.1f}s")
+
+    def tick(self):
+        db = SessionLocal()
+        try:
+            self._reap_finished(db)
+            self._stop_cancelled(db)
+            crud.heartbeat_jobs(db, list(self.running.keys()))
+            if BLOB_GC_INTERVAL_SECONDS and time.monotonic() - self.last_blob_gc >= BLOB_GC_INTERVAL_SECONDS:
+                self.last_blob_gc = time.monotonic()
+                deleted, freed = crud.collect_blob_garbage(db)
+                if deleted:
+                    print(f"Worker pool {self.worker_id} deleted {deleted} unreferenced blobs ({freed} bytes)")
+            while len(self.running) < self.concurrency and not self.stopping:
+                job = crud.claim_next_job(db, self.worker_id, JOB_LEASE_SECONDS)
+                if not job:
+                    break
+                process = self.ctx.Process(target=execute_job, args=(job.id, job.project_id), daemon=True)
+                process.start()
+                self.running[job.id] = process
+        finally:
+            db.close()
+
+    def _reap_finished(self, db):
+        for job_id, process in list(self.running.items()):
+            if process.is_alive():
+                continue
+            process.join()
+            del self.running[job_id]
+            if process.exitcode == 0:
+                crud.complete_job(db, job_id)
+            else:
+                crud.fail_job(db, job_id, JOB_RETRY_BACKOFF)
+
+    def _stop_cancelled(self, db):
+        for job_id in crud.get_cancel_requested_job_ids(db, list(self.running.keys())):
+            process = self.running.pop(job_id)
+            process.terminate()
+            process.join(timeout=10)
+            crud.mark_job_cancelled(db, job_id)
+
+    def _handle_stop(self, signum, frame):
+        self.stopping = True
+
+    def shutdown(self):
+        # In-flight jobs are left as "running"; their lease expires and another worker picks them up
+        for process in self.running.values():
+            process.terminate()
+        for process in self.running.values():
+            process.join(timeout=10)
+        self.running.clear()
+
+def run_pool(concurrency: int = JOB_WORKER_CONCURRENCY):
+    WorkerPool(concurrency).run_forever()
+
+if __name__ == "__main__":
+    import models
+    from database import upgrade_schema
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(models.Base.metadata)
+    run_pool(int(sys.argv[1]) if len(sys.argv) > 1 else JOB_WORKER_CONCURRENCY)
@@ -0,0 +1,64 @@
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+import httpx
+
+# Load benchmark for the intake API's read endpoints (the dashboard/live-view traffic).
+# Start the API first, e.g. `cd backend && uvicorn main:app --port 8000`,
+# then run: python bench_api.py --url http://127.0.0.1:8000 --concurrency 50 100 200
+# Run it against two checkouts to compare before/after numbers.
+
+async def seed(client, projects):
+    existing = (await client.get("/projects/", params={"limit": projects})).json()
+    ids = [p["id"] for p in existing]
+    while len(ids) < projects:
+        created = (await client.post("/projects/", json={"title": f"Bench project {len(ids)}", "description": "benchmark"})).json()
+        await client.post(f"/projects/{created['id']}/requirements/", json={"content": "Build a conversational real estate search. " * 20})
+        ids.append(created["id"])
+    return ids
+
+async def client_loop(client, project_ids, deadline, latencies, errors, index):
+    i = index
+    while time.perf_counter() < deadline:
+        if i % 2:
+            request = client.get("/projects/", params={"limit": 20})
+        else:
+            request = client.get(f"/projects/{project_ids[i % len(project_ids)]}")
+        started = time.perf_counter()
+        try:
+            response = await request
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+async def run_level(url, project_ids, concurrency, duration):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + duration
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client, project_ids, deadline, latencies, errors, i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+    print(f"concurrency={concurrency:4d}  requests={len(latencies):6d}  req/s={len(latencies) / elapsed:8.1f}  "
+          f"p50={statistics.median(latencies) * 1000 if latencies else 0:7.1f}ms  p95={p95 * 1000:7.1f}ms  errors={len(errors)}")
+
+async def main(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=30) as client:
+        project_ids = await seed(client, args.projects)
+    for concurrency in args.concurrency:
+        await run_level(args.url, project_ids, concurrency, args.duration)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Requests/sec of the intake API under concurrent dashboard load")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 100, 200])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per concurrency level")
+    parser.add_argument("--projects", type=int, default=50)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,164 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+import multiprocessing
+from functools import wraps
+
+# End-to-end crew benchmark on an offline LLM backend: every crew run does the real
+# orchestration (templates, context budgets, memory and embeddings, tools against a local
+# repository, DB writes, telemetry) while the model answers instantly or with a fixed
+# latency. Reports where each run's time goes and runs/minute at N concurrent projects.
+#   python bench_crew.py --concurrency 1 4 8                        # synthetic answers
+#   python bench_crew.py --backend replay --transcript run.jsonl    # answers recorded with LLM_BACKEND=record
+# Phases are exclusive: time spent in a nested phase (e.g. DB writes made while embedding)
+# counts only there, and "orchestration" is what remains of the run's wall time.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+PHASES = {
+    "prompt_assembly": [
+        ("crew_templates", "CrewTemplate.build_agents"), ("crew_templates", "CrewTemplate.build_tasks"),
+        ("context_budget", "fit_context"), ("crud", "get_project_guidelines"), ("run_planner", "plan_reuse"),
+    ],
+    "llm": [("llm_client", "OfflineLLM.call")],
+    "memory_embedding": [
+        ("crew_memory", "CachedEmbeddingFunction.__call__"), ("crew_memory", "FlatVectorStorage.save"),
+        ("crew_memory", "FlatVectorStorage.search"),
+    ],
+    "tools": [
+        ("github_tools", "GithubMultiFileReaderTool._run"), ("github_tools", "GithubGlobTool._run"),
+        ("github_tools", "GithubCodeSearchTool._run"), ("github_tools", "GithubDirectoryListerTool._run"),
+    ],
+    "db_writes": [
+        ("crud", "create_agent_outputs"), ("crud", "reuse_agent_outputs"), ("crud", "create_run_event"),
+        ("crud", "create_run_metrics"), ("crud", "update_project_status"), ("crud", "put_embedding_cache_entries"),
+    ],
+}
+
+_timings = {}  # phase -> [seconds, calls], per process
+_stack = threading.local()
+
+def _timed(phase, function):
+    @wraps(function)
+    def timed(*args, **kwargs):
+        frames = _stack.__dict__.setdefault("frames", [])
+        frames.append(0.0)
+        started = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = frames.pop()
+            entry = _timings.setdefault(phase, [0.0, 0])
+            entry[0] += elapsed - nested
+            entry[1] += 1
+            if frames:
+                frames[-1] += elapsed
+    return timed
+
+def instrument():
+    for phase, targets in PHASES.items():
+        for module_name, attribute in targets:
+            owner = __import__(module_name)
+            *path, name = attribute.split(".")
+            for part in path:
+                owner = getattr(owner, part)
+            setattr(owner, name, _timed(phase, getattr(owner, name)))
+
+def run_one(project_job):
+    # Runs in a fresh forked process per job, like the worker pool
+    from database import engine
+    import crew_runner
+    engine.dispose(close=False)
+    _timings.clear()
+    project_id, job_id = project_job
+    started = time.perf_counter()
+    crew_runner.run_crew_for_project(project_id, job_id=job_id)
+    return time.perf_counter() - started, {phase: tuple(value) for phase, value in _timings.items()}
+
+def seed(count, requirement, repo):
+    import crud, schemas
+    from database import SessionLocal
+    db = SessionLocal()
+    try:
+        jobs = []
+        for i in range(count):
+            project = crud.create_project(db, schemas.ProjectCreate(title=f"Bench project {i}", github_url=f"file://{repo}" if repo else None))
+            crud.create_requirement(db, project.id, schemas.RequirementCreate(content=f"{requirement} (variant {i})"))
+            job, _ = crud.enqueue_job(db, project.id)
+            jobs.append((project.id, job.id))
+        return jobs
+    finally:
+        db.close()
+
+def report(concurrency, wall, results):
+    runs = [duration for duration, _ in results]
+    print(f"\nconcurrency {concurrency}: {len(runs)} runs in {wall:.1f}s = {len(runs) / wall * 60:.1f} runs/minute, "
+          f"run p50 {statistics.median(runs) * 1000:.0f} ms, max {max(runs) * 1000:.0f} ms")
+    print(f"  {'phase':<18}{'ms/run':>10}{'share':>8}{'calls/run':>11}")
+    total = statistics.mean(runs)
+    accounted = 0.0
+    for phase in PHASES:
+        seconds = statistics.mean(timings.get(phase, (0, 0))[0] for _, timings in results)
+        calls = statistics.mean(timings.get(phase, (0, 0))[1] for _, timings in results)
+        accounted += seconds
+        print(f"  {phase:<18}{seconds * 1000:>10.1f}{seconds / total:>8.0%}{calls:>11.1f}")
+    other = max(total - accounted, 0.0)
+    print(f"  {'orchestration':<18}{other * 1000:>10.1f}{other / total:>8.0%}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--backend", choices=["synthetic", "replay"], default="synthetic")
+    parser.add_argument("--transcript", help="JSON Lines transcript for --backend replay (LLM_TRANSCRIPT_PATH)")
+    parser.add_argument("--latency", type=float, default=0.0, help="synthetic seconds per LLM call, or replay latency scale")
+    parser.add_argument("--tokens", type=int, default=400, help="synthetic completion tokens per answer")
+    parser.add_argument("--tool-calls", type=int, default=1, help="synthetic tool uses per task before answering")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--runs-per-worker", type=int, default=2)
+    parser.add_argument("--repo", default=os.path.join(ROOT, "backend"), help="local repository the architect explores ('' for none)")
+    parser.add_argument("--requirement", default="Build a collaborative task board with real-time updates, SSO and an AI assistant.")
+    args = parser.parse_args()
+
+    # Configure the backend before importing it: a scratch database and stores, offline
+    # model and embedder, no response cache (it would skip the work being measured)
+    scratch = tempfile.mkdtemp(prefix="bench_crew_")
+    os.environ.update(
+        DATABASE_URL=f"sqlite:///{scratch}/bench.db", BLOB_STORE_DIR=f"{scratch}/blobs",
+        MEMORY_STORE_DIR=f"{scratch}/memory", GITHUB_CACHE_DIR=f"{scratch}/github",
+        LLM_BACKEND=args.backend, LLM_CACHE_ENABLED="false", EMBEDDER_PROVIDER="synthetic",
+        LLM_SYNTHETIC_LATENCY=str(args.latency), LLM_REPLAY_LATENCY_SCALE=str(args.latency),
+        LLM_SYNTHETIC_TOKENS=str(args.tokens), LLM_SYNTHETIC_TOOL_CALLS=str(args.tool_calls),
+        INCREMENTAL_RUNS="false", CREWAI_DISABLE_TELEMETRY="true", OPENAI_API_KEY="fake-key-to-bypass-crewai-checks",
+    )
+    if args.repo:
+        # Local repositories are refused unless they lie under LOCAL_REPO_ROOT
+        os.environ["LOCAL_REPO_ROOT"] = os.path.abspath(args.repo)
+    if args.transcript:
+        os.environ["LLM_TRANSCRIPT_PATH"] = os.path.abspath(args.transcript)
+
+    import models
+    import crew_runner
+    from database import engine, upgrade_schema
+    models.Base.metadata.create_all(bind=engine)
+    upgrade_schema(models.Base.metadata)
+    # Like a warm worker pool: imports and the first client build happen before forking
+    crew_runner.warm_up()
+    instrument()
+    print(f"backend={args.backend} latency={args.latency} tokens={args.tokens} tool_calls={args.tool_calls} scratch={scratch}")
+
+    context = multiprocessing.get_context("fork")
+    for concurrency in args.concurrency:
+        jobs = seed(concurrency * args.runs_per_worker, args.requirement, args.repo)
+        engine.dispose()
+        started = time.perf_counter()
+        with context.Pool(concurrency, maxtasksperchild=1) as pool:
+            results = pool.map(run_one, jobs, chunksize=1)
+        report(concurrency, time.perf_counter() - started, results)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import os
+import sys
+import time
+import argparse
+import statistics
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key-to-bypass-crewai-checks")
+
+# Per-run crew setup benchmark: how long it takes to turn the shared crew template into
+# agents, tasks and a Crew for one project (no LLM calls, no network). The first build in
+# a process includes crewAI's lazy imports, which warm run workers pay before forking.
+# Run: python bench_crew_setup.py [--runs 50]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    from crewai import Crew, Process
+    import llm_client
+    from context_budget import BudgetedTask
+    from crew_templates import ARCHITECTURE_CREW
+    print(f"import + template validation: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    llm = None
+    timings = []
+    for i in range(args.runs + 1):
+        started = time.perf_counter()
+        if llm is None:
+            # Run workers keep one client per API key, so only the first run builds it
+            llm = llm_client.build_llm("bench-key")
+        variants = ("repo",) if i % 2 else ()
+        agents = ARCHITECTURE_CREW.build_agents(llm, variants, backstory=lambda field, preamble: preamble + f"Guidelines for project {i}")
+        tasks = ARCHITECTURE_CREW.build_tasks(agents, variants, params={"requirements": f"Requirements of project {i}"}, task_class=BudgetedTask)
+        Crew(agents=list(agents.values()), tasks=list(tasks.values()), process=Process.sequential)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    cold, warm = timings[0], sorted(timings[1:])
+    print(f"first build (cold): {cold:.1f} ms")
+    print(f"per-run build (warm): median {statistics.median(warm):.1f} ms, "
+          f"p95 {warm[int(len(warm) * 0.95) - 1]:.1f} ms over {args.runs} runs")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+import re
+import sys
+import argparse
+import tempfile
+import subprocess
+
+# Import-time benchmark for the API process: runs `python -X importtime -c "import main"`
+# in backend/ and fails when the import takes longer than the budget or pulls in the agent
+# stack, which only run workers should load.
+# Run: python bench_import_time.py [--budget-ms 2000] [--runs 5] [--top 15]
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend")
+IMPORT_BUDGET_MS = float(os.environ.get("IMPORT_BUDGET_MS", "2000"))
+# Top-level packages the API must not import
+FORBIDDEN_PACKAGES = ("crewai", "crewai_tools", "github", "litellm", "numpy", "crew_runner")
+LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+def measure(module: str = "main"):
+    # A fresh interpreter (and an empty database) per run; returns {module: (self_us, cumulative_us, depth)}
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, RUN_EMBEDDED_WORKER_POOL="false", DATABASE_URL=f"sqlite:///{tmp}/bench.db")
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    timings = {}
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return timings
+
+def forbidden_imports(timings):
+    return sorted(name for name in timings if name.split(".")[0] in FORBIDDEN_PACKAGES)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    totals = sorted(run[args.module][1] / 1000 for run in runs)
+    median = totals[len(totals) // 2]
+    print(f"import {args.module}: median {median:.0f} ms, min {totals[0]:.0f} ms, max {totals[-1]:.0f} ms over {args.runs} runs")
+
+    # Heaviest top-level packages of the last run
+    top_level = [(cumulative, name) for name, (_, cumulative, depth) in runs[-1].items() if depth == 1]
+    print(f"\n{'cumulative ms':>14}  package")
+    for cumulative, name in sorted(top_level, reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+
+    failures = []
+    forbidden = forbidden_imports(runs[-1])
+    if forbidden:
+        failures.append(f"agent stack imported by {args.module}: {', '.join(forbidden[:10])}")
+    if median > args.budget_ms:
+        failures.append(f"median {median:.0f} ms exceeds the {args.budget_ms:.0f} ms budget")
+    for failure in failures:
+        print(f"\nFAIL: {failure}")
+    if not failures:
+        print(f"\nOK: within the {args.budget_ms:.0f} ms budget, no agent stack imports")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
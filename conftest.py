@@ -0,0 +1,4 @@
+from scratch_stores import use_scratch_stores
+
+# Before pytest collects (and so imports) any test module; see scratch_stores.py
+use_scratch_stores()
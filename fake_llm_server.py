@@ -0,0 +1,125 @@
+import sys
+import json
+import time
+import argparse
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A local OpenAI-compatible chat completions server for tests and benchmarks. It answers
+# every request with a canned final answer and can play a rate-limited provider: it
+# returns 429s past a request budget per window, or for the first N requests.
+# Run it, then point the backend at it:
+#   python fake_llm_server.py --port 9999 --limit 30 --window 60
+#   LLM_MODEL=openai/fake-model LLM_BASE_URL=http://127.0.0.1:9999/v1 OPENAI_API_KEY=fake ...
+
+class FakeLLMState:
+    def __init__(self, limit=0, window=60.0, fail_first=0, latency=0.0):
+        self.limit = limit
+        self.window = window
+        self.fail_first = fail_first
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.accepted_at = deque()
+        self.stats = {"requests": 0, "accepted": 0, "rate_limited": 0, "in_flight": 0, "max_in_flight": 0}
+
+    def admit(self):
+        # Returns None if the request may proceed, else the Retry-After in seconds
+        now = time.monotonic()
+        with self.lock:
+            self.stats["requests"] += 1
+            while self.accepted_at and self.accepted_at[0] <= now - self.window:
+                self.accepted_at.popleft()
+            retry_after = None
+            if self.stats["requests"] <= self.fail_first:
+                retry_after = 0.0
+            elif self.limit and len(self.accepted_at) >= self.limit:
+                retry_after = self.accepted_at[0] + self.window - now
+            if retry_after is not None:
+                self.stats["rate_limited"] += 1
+                return retry_after
+            self.accepted_at.append(now)
+            self.stats["accepted"] += 1
+            self.stats["in_flight"] += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self.stats["in_flight"])
+            return None
+
+    def done(self):
+        with self.lock:
+            self.stats["in_flight"] -= 1
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, payload, headers=None):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with state.lock:
+                    return self._send_json(200, dict(state.stats))
+            self._send_json(404, {"error": {"message": "Not found"}})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                return self._send_json(404, {"error": {"message": "Not found"}})
+
+            retry_after = state.admit()
+            if retry_after is not None:
+                return self._send_json(429, {"error": {
+                    "message": "Rate limit reached for requests", "type": "requests", "code": "rate_limit_exceeded"
+                }}, headers={"Retry-After": f"{retry_after:.2f}"})
+
+            try:
+                time.sleep(state.latency)
+                prompt = "".join(str(m.get("content", "")) for m in request.get("messages", []))
+                content = f"Thought: I now know the final answer\nFinal Answer: Fake answer to a {len(prompt)} character prompt."
+                self._send_json(200, {
+                    "id": f"chatcmpl-fake-{state.stats['requests']}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": request.get("model", "fake-model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                    "usage": {
+                        "prompt_tokens": len(prompt) // 4,
+                        "completion_tokens": len(content) // 4,
+                        "total_tokens": (len(prompt) + len(content)) // 4,
+                    },
+                })
+            finally:
+                state.done()
+
+    return Handler
+
+def start_server(port=0, **options):
+    # Starts the server on a background thread; returns (server, state). Port 0 picks a free port.
+    state = FakeLLMState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OpenAI-compatible fake LLM with injectable 429s")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--limit", type=int, default=0, help="accepted requests per window before returning 429 (0 = unlimited)")
+    parser.add_argument("--window", type=float, default=60.0, help="rate-limit window in seconds")
+    parser.add_argument("--fail-first", type=int, default=0, help="answer the first N requests with 429")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    server, _ = start_server(args.port, limit=args.limit, window=args.window, fail_first=args.fail_first, latency=args.latency)
+    print(f"Fake LLM listening on http://127.0.0.1:{server.server_address[1]}/v1")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+        sys.exit(0)
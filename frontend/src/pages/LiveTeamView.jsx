@@ -2,42 +2,72 @@ import React, { useState, useEffect } from 'react';
 import { useParams, Link } from 'react-router-dom';
 import { ArrowLeft, RefreshCw, CheckCircle } from 'lucide-react';
 import ReactMarkdown from 'react-markdown';
-import { api } from '../api';
+import { api, API_URL } from '../api';
+
+const isTerminalStatus = (status) => status === 'completed' || status === 'cancelled' || status.startsWith('error');
+
+// Events only carry a preview of each output; the full body is fetched once per output
+// from its content URL, which the browser can cache indefinitely.
+function OutputBody({ output }) {
+    const [content, setContent] = useState(output.preview || '');
+
+    useEffect(() => {
+        api.get(`/outputs/${output.id}/content`, { responseType: 'text' })
+            .then(res => setContent(res.data))
+            .catch(error => console.error("Error fetching output content", error));
+    }, [output.id]);
+
+    return <ReactMarkdown>{content}</ReactMarkdown>;
+}
 
 export default function LiveTeamView() {
     const { id } = useParams();
     const [project, setProject] = useState(null);
     const [outputs, setOutputs] = useState([]);
-    const [isPolling, setIsPolling] = useState(true);
+    const [latestStep, setLatestStep] = useState(null);
 
     useEffect(() => {
-        fetchProjectData();
-        const interval = setInterval(() => {
-            if (isPolling) {
-                fetchProjectData();
-            }
-        }, 5000); // Poll every 5 seconds
+        // The server sends one snapshot, then only new events. EventSource resumes
+        // from the last received event id on its own if the connection drops.
+        const source = new EventSource(`${API_URL}/projects/${id}/events`);
 
-        return () => clearInterval(interval);
-    }, [id, isPolling]);
+        const applyStatus = (status) => {
+            setProject(prev => ({ ...prev, status }));
+            if (isTerminalStatus(status)) {
+                source.close();
+            }
+        };
 
-    const fetchProjectData = async () => {
-        try {
-            const projRes = await api.get(`/projects/${id}`);
-            const outRes = await api.get(`/projects/${id}/outputs/`);
+        source.addEventListener('snapshot', (e) => {
+            const data = JSON.parse(e.data);
+            setOutputs(data.outputs);
+            applyStatus(data.status);
+        });
+        source.addEventListener('status', (e) => {
+            applyStatus(JSON.parse(e.data).status);
+        });
+        source.addEventListener('task_completed', (e) => {
+            const output = JSON.parse(e.data);
+            setOutputs(prev => [...prev, output]);
+            setLatestStep(null);
+        });
+        source.addEventListener('agent_step', (e) => {
+            setLatestStep(JSON.parse(e.data));
+        });
+        source.onerror = (error) => {
+            console.error("Live event stream interrupted", error);
+        };
 
-            setProject(projRes.data);
-            setOutputs(outRes.data);
+        return () => source.close();
+    }, [id]);
 
-            if (projRes.data.status === 'completed' || projRes.data.status.startsWith('error')) {
-                setIsPolling(false);
-            }
-        } catch (error) {
-            console.error("Error fetching live data", error);
-        }
-    };
+    useEffect(() => {
+        api.get(`/projects/${id}?include_outputs=false`)
+            .then(res => setProject(prev => ({ ...res.data, ...(prev || {}) })))
+            .catch(error => console.error("Error fetching project", error));
+    }, [id]);
 
-    if (!project) return <div>Loading...</div>;
+    if (!project || !project.title) return <div>Loading...</div>;
 
     return (
         <div className="animate-fade-in">
@@ -72,8 +102,8 @@ export default function LiveTeamView() {
                 </div>
             ) : (
                 <div style={{ display: 'flex', flexDirection: 'column', gap: '2rem' }}>
-                    {outputs.map((output, idx) => (
-                        <div key={idx} className="glass-panel" style={{ padding: '2rem', borderLeft: '4px solid var(--accent-primary)' }}>
+                    {outputs.map((output) => (
+                        <div key={output.id} className="glass-panel" style={{ padding: '2rem', borderLeft: '4px solid var(--accent-primary)' }}>
                             <div style={{ display: 'flex', justifyContent: 'space-between', borderBottom: '1px solid var(--border-subtle)', paddingBottom: '1rem', marginBottom: '1.5rem' }}>
                                 <h3 style={{ margin: 0, color: '#a4b1fa' }}>{output.agent_name}</h3>
                                 <span style={{ fontSize: '0.8rem', color: 'var(--text-secondary)' }}>
@@ -81,7 +111,7 @@ export default function LiveTeamView() {
                                 </span>
                             </div>
                             <div className="markdown-body">
-                                <ReactMarkdown>{output.output_content}</ReactMarkdown>
+                                <OutputBody output={output} />
                             </div>
                         </div>
                     ))}
@@ -89,7 +119,7 @@ export default function LiveTeamView() {
                     {project.status === 'running' && (
                         <div style={{ textAlign: 'center', padding: '2rem', color: 'var(--text-secondary)' }}>
                             <RefreshCw size={24} className="spin" style={{ margin: '0 auto 1rem' }} />
-                            <p>Waiting for the next agent to finish...</p>
+                            <p>{latestStep ? `${latestStep.agent_name}: ${latestStep.text.slice(0, 200)}` : 'Waiting for the next agent to finish...'}</p>
                         </div>
                     )}
                 </div>
@@ -113,7 +113,7 @@ export default function ProjectDashboard() {
                             <p style={{ flex: 1 }}>{project.description || 'No description provided.'}</p>
 
                             <div style={{ borderTop: '1px solid var(--border-subtle)', paddingTop: '1rem', marginTop: '1rem', display: 'flex', justifyContent: 'flex-end' }}>
-                                {project.status === 'running' || project.status === 'completed' ? (
+                                {project.status === 'running' || project.status === 'queued' || project.status === 'completed' ? (
                                     <Link to={`/project/${project.id}/live`} className="btn btn-secondary" style={{ width: '100%' }}>
                                         View Team Output <ArrowRight size={16} />
                                     </Link>
@@ -25,7 +25,7 @@ export default function ProjectDetails() {
 
     const fetchProjectDetails = async () => {
         try {
-            const res = await api.get(`/projects/${id}`);
+            const res = await api.get(`/projects/${id}?include_outputs=false`);
             setProject(res.data);
             if (res.data.requirements && res.data.requirements.length > 0) {
                 setRequirements(res.data.requirements[res.data.requirements.length - 1].content);
@@ -5,9 +5,18 @@ echo "================================================"
 
 echo "1. Starting FastAPI Backend Server on port 8000..."
 source venv/bin/activate
-uvicorn backend.main:app --reload --host 127.0.0.1 --port 8000 &
+# The API and the worker pool must share one database and blob store: absolute paths,
+# and both processes started from backend/
+BACKEND_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/backend" && pwd)"
+export DATABASE_URL="${DATABASE_URL:-sqlite:///$BACKEND_DIR/ai_architect_studio.db}"
+export BLOB_STORE_DIR="${BLOB_STORE_DIR:-$BACKEND_DIR/.blob_store}"
+(cd "$BACKEND_DIR" && exec uvicorn main:app --reload --host 127.0.0.1 --port 8000) &
 BACKEND_PID=$!
 
+echo "   Starting crew worker pool..."
+(cd "$BACKEND_DIR" && exec python worker.py) &
+WORKER_PID=$!
+
 echo "2. Starting React Vite Frontend Server..."
 export PATH=/Users/painter/.gemini/antigravity/scratch/node-v20.18.0-darwin-arm64/bin:$PATH
 cd frontend
@@ -22,5 +31,5 @@ echo "🔌 API Docs (Swagger): http://localhost:8000/docs"
 echo "------------------------------------------------"
 echo "Type [CTRL+C] at any time to shut down the servers."
 
-trap "echo 'Shutting down servers...'; kill $BACKEND_PID $FRONTEND_PID; exit" INT TERM EXIT
+trap "echo 'Shutting down servers...'; kill $BACKEND_PID $WORKER_PID $FRONTEND_PID; exit" INT TERM EXIT
 wait
@@ -0,0 +1,20 @@
+import os
+import atexit
+import shutil
+import tempfile
+
+# Test modules import the backend at module level, and its stores read their location at
+# import time. use_scratch_stores() points them at one scratch directory first, so no test
+# writes blobs, memory or a database into backend/. conftest.py calls it under pytest;
+# test scripts call it before importing the backend, which is then a no-op under pytest.
+
+def use_scratch_stores():
+    if os.environ.get("TESTS_SCRATCH_DIR"):
+        return os.environ["TESTS_SCRATCH_DIR"]
+    scratch = tempfile.mkdtemp(prefix="tests_")
+    os.environ.update(
+        TESTS_SCRATCH_DIR=scratch, BLOB_STORE_DIR=os.path.join(scratch, "blobs"), MEMORY_STORE_DIR=os.path.join(scratch, "memory"),
+        GITHUB_CACHE_DIR=os.path.join(scratch, "github"), DATABASE_URL=f"sqlite:///{scratch}/test.db",
+    )
+    atexit.register(shutil.rmtree, scratch, ignore_errors=True)
+    return scratch
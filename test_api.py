@@ -0,0 +1,91 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+from fastapi.testclient import TestClient
+import crud, schemas
+import main
+from database import SessionLocal
+from main import app
+
+# HTTP behaviour of the read endpoints: output paging and conditional and ranged reads, and
+# the guideline library loaded on startup.
+
+client = TestClient(app)
+
+def _project_with_outputs(count):
+    db = SessionLocal()
+    try:
+        project = crud.create_project(db, schemas.ProjectCreate(title="API"))
+        outputs = [
+            (f"task_{i}", schemas.AgentOutputCreate(agent_name="Architect", task_name=f"Task {i}", output_content=f"Output {i}\n" * 50))
+            for i in range(count)
+        ]
+        crud.create_agent_outputs(db, project.id, outputs)
+        return project.id
+    finally:
+        db.close()
+
+def test_outputs_page_without_gaps_or_duplicates():
+    project_id = _project_with_outputs(7)
+    everything = client.get(f"/projects/{project_id}/outputs/", params={"include_content": False})
+    assert len(everything.json()) == 7 and "X-Next-Cursor" not in everything.headers  # Unbounded unless asked
+
+    seen, since, pages = [], None, 0
+    while True:
+        params = {"limit": 3, "include_content": False, **({"since": since} if since else {})}
+        page = client.get(f"/projects/{project_id}/outputs/", params=params)
+        seen += [o["id"] for o in page.json()]
+        pages += 1
+        since = page.headers.get("X-Next-Cursor")
+        if since is None:
+            break
+    assert pages == 3 and seen == [o["id"] for o in everything.json()]
+
+def test_unchanged_outputs_are_not_sent_again():
+    project_id = _project_with_outputs(2)
+    first = client.get(f"/projects/{project_id}/outputs/")
+    etag = first.headers["ETag"]
+    again = client.get(f"/projects/{project_id}/outputs/", headers={"If-None-Match": etag})
+    assert again.status_code == 304 and again.content == b"" and again.headers["ETag"] == etag
+    with SessionLocal() as db:
+        crud.create_agent_outputs(db, project_id, [("late", schemas.AgentOutputCreate(agent_name="Architect", task_name="Late", output_content="Late"))])
+    changed = client.get(f"/projects/{project_id}/outputs/", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and len(changed.json()) == 3 and changed.headers["ETag"] != etag
+
+def test_output_content_is_cacheable_and_ranged():
+    project_id = _project_with_outputs(1)
+    output_id = client.get(f"/projects/{project_id}/outputs/").json()[0]["id"]
+    body = ("Output 0\n" * 50).encode("utf-8")
+    full = client.get(f"/outputs/{output_id}/content")
+    etag = full.headers["ETag"]
+    assert full.status_code == 200 and full.content == body and full.headers["Accept-Ranges"] == "bytes"
+    assert client.get(f"/outputs/{output_id}/content", headers={"If-None-Match": etag}).status_code == 304
+
+    part = client.get(f"/outputs/{output_id}/content", headers={"Range": "bytes=9-17"})
+    assert part.status_code == 206 and part.content == body[9:18] and part.headers["Content-Range"] == f"bytes 9-17/{len(body)}"
+    tail = client.get(f"/outputs/{output_id}/content", headers={"Range": "bytes=-9", "If-Range": etag})
+    assert tail.status_code == 206 and tail.content == body[-9:]
+    # A stale If-Range gets the whole body; an unsatisfiable range gets 416
+    stale = client.get(f"/outputs/{output_id}/content", headers={"Range": "bytes=0-8", "If-Range": '"stale"'})
+    assert stale.status_code == 200 and stale.content == body
+    beyond = client.get(f"/outputs/{output_id}/content", headers={"Range": f"bytes={len(body)}-"})
+    assert beyond.status_code == 416 and beyond.headers["Content-Range"] == f"bytes */{len(body)}"
+
+def test_guideline_files_are_loaded_but_not_linked():
+    main.load_guideline_files()
+    names = {document["name"]: document for document in client.get("/guidelines/").json()}
+    assert {"ux_guidelines", "security_standards"} <= set(names)
+    assert not any(document["is_default"] for document in names.values())
+    project_id = client.post("/projects/", json={"title": "Unlinked"}).json()["id"]
+    with SessionLocal() as db:
+        assert not any(crud.get_project_guidelines(db, project_id).values())
+
+if __name__ == "__main__":
+    test_outputs_page_without_gaps_or_duplicates()
+    test_unchanged_outputs_are_not_sent_again()
+    test_output_content_is_cacheable_and_ranged()
+    test_guideline_files_are_loaded_but_not_linked()
+    print("API OK")
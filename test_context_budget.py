@@ -0,0 +1,39 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from crewai.utilities.formatter import DIVIDERS
+from context_budget import fit_context, trim_extractive
+from llm_client import estimate_tokens
+
+# Upstream outputs handed to a task must fit its context budget while keeping the
+# structure (headings) of every document.
+
+def _document(name, sections, words):
+    return "\n\n".join(f"## {name} {i}\n" + " ".join(f"word{j}." for j in range(words)) for i in range(sections))
+
+def test_short_context_is_untouched():
+    context = DIVIDERS.join([_document("Plan", 2, 10), _document("Blueprint", 2, 10)])
+    assert fit_context(context, 6000) == context
+
+def test_context_fits_budget_and_keeps_every_heading():
+    documents = [_document("Features", 4, 50), _document("Blueprint", 8, 2000), _document("Infra", 3, 300)]
+    fitted = fit_context(DIVIDERS.join(documents), 1500)
+    assert estimate_tokens(fitted) <= 1500 * 1.05
+    sources = fitted.split(DIVIDERS)
+    assert len(sources) == 3
+    # The short document survives whole; the long one is cut down but keeps its outline
+    assert sources[0] == documents[0]
+    assert all(f"## Blueprint {i}" in sources[1] for i in range(8))
+
+def test_trim_handles_text_without_headings():
+    text = "A sentence that repeats. " * 2000
+    trimmed = trim_extractive(text, 200)
+    assert estimate_tokens(trimmed) <= 200
+    assert trimmed.startswith("A sentence that repeats.")
+
+if __name__ == "__main__":
+    test_short_context_is_untouched()
+    test_context_fits_budget_and_keeps_every_heading()
+    test_trim_handles_text_without_headings()
+    print("Context budget OK")
@@ -0,0 +1,57 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from crewai.memory.types import MemoryRecord
+import models
+from crew_memory import CachedEmbeddingFunction, FlatVectorStorage
+
+# Crew memory must not re-embed text it has seen before, and its local index must find
+# the nearest memories and survive being reopened.
+
+def _embedder(calls):
+    def embed(texts):
+        calls.append(list(texts))
+        return [np.random.default_rng(sum(map(ord, t))).standard_normal(32) for t in texts]
+    return embed
+
+def _cached(tmp_path, calls, batch_size=100):
+    engine = create_engine(f"sqlite:///{tmp_path / 'embeddings.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    return CachedEmbeddingFunction(_embedder(calls), "fake/model", batch_size=batch_size, session_factory=sessionmaker(bind=engine))
+
+def test_embeddings_are_cached_and_batched(tmp_path):
+    calls = []
+    embed = _cached(tmp_path, calls, batch_size=2)
+    first = embed(["pm guidelines", "architect guidelines", "ux guidelines", "pm guidelines"])
+    assert [len(batch) for batch in calls] == [2, 1]
+    second = embed(["ux guidelines", "pm guidelines", "security standards"])
+    assert calls[-1] == ["security standards"]
+    assert np.array_equal(first[0], second[1])
+
+def test_flat_index_search_scope_and_persistence(tmp_path):
+    embed = _cached(tmp_path, [])
+    storage = FlatVectorStorage(str(tmp_path / "memory"))
+    texts = ["use postgres", "deploy on kubernetes", "encrypt at rest", "mobile first layout"]
+    storage.save([
+        MemoryRecord(content=text, scope=f"/crew/project-1/{'infra' if i % 2 else 'design'}", embedding=list(embed([text])[0]))
+        for i, text in enumerate(texts)
+    ])
+    results = storage.search(list(embed(["encrypt at rest"])[0]), scope_prefix="/crew/project-1/design", limit=1)
+    assert [record.content for record, _ in results] == ["encrypt at rest"]
+
+    reopened = FlatVectorStorage(str(tmp_path / "memory"))
+    assert reopened.count() == 4
+    assert reopened.list_scopes("/crew/project-1") == ["/crew/project-1/design", "/crew/project-1/infra"]
+    assert reopened.delete(scope_prefix="/crew/project-1/infra") == 2
+    assert FlatVectorStorage(str(tmp_path / "memory")).count() == 2
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    for test in (test_embeddings_are_cached_and_batched, test_flat_index_search_scope_and_persistence):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(pathlib.Path(tmp))
+    print("Crew memory OK")
@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key-to-bypass-crewai-checks")
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+import pytest
+from pydantic import ValidationError
+from crewai import LLM
+from crew_templates import ARCHITECTURE_CREW, CrewTemplate, AgentTemplate, TaskTemplate
+from crew_runner import async_task_keys, schedule_waves
+
+# Crew templates are validated when defined and specialised per run by variants and params,
+# and their task dependencies decide which tasks run side by side.
+
+def test_invalid_templates_are_rejected():
+    agent = AgentTemplate(role="r", goal="g", backstory="b")
+    with pytest.raises(ValidationError, match="unknown agent"):
+        CrewTemplate(name="bad", agents={"a": agent}, tasks={"t": TaskTemplate(agent="x", description="d", expected_output="e")})
+    with pytest.raises(ValidationError, match="must be defined before it"):
+        CrewTemplate(name="bad", agents={"a": agent}, tasks={
+            "first": TaskTemplate(agent="a", description="d", expected_output="e", depends_on=["second"]),
+            "second": TaskTemplate(agent="a", description="d", expected_output="e"),
+        })
+
+def test_variants_and_params_specialise_the_crew():
+    llm = LLM(model="gemini/gemini-2.0-flash", api_key="fake")
+    agents = ARCHITECTURE_CREW.build_agents(llm, ("repo",), backstory=lambda field, preamble: preamble + f"<{field}>")
+    tasks = ARCHITECTURE_CREW.build_tasks(agents, ("repo",), params={"requirements": "Build {a} chat app"})
+    assert "thoroughly analyze the existing codebase" in agents["architect"].backstory
+    assert agents["ux_designer"].backstory.endswith("MANDATORY UX GUIDELINES TO FOLLOW:\n<ux_guidelines>")
+    assert "Build {a} chat app" in tasks["deconstruct_requirements"].description
+    assert "Github tools" in tasks["draft_architecture"].description
+    assert tasks["audit_security"].agent is agents["security_officer"]
+
+    plain = ARCHITECTURE_CREW.build_agents(llm)
+    assert plain["product_manager"].backstory.endswith("MANDATORY GUIDELINES:\nNone provided.")
+    assert "existing codebase" not in plain["architect"].backstory
+
+def test_cli_variant_keeps_the_cli_prompts():
+    llm = LLM(model="gemini/gemini-2.0-flash", api_key="fake")
+    knowledge = {"ux_guidelines": "Use 8px spacing."}  # The CLI only has some knowledge files
+
+    def backstory(field, preamble):
+        return preamble + knowledge[field] if field in knowledge else None
+
+    agents = ARCHITECTURE_CREW.build_agents(llm, ("repo", "cli"), backstory=backstory)
+    assert agents["product_manager"].backstory.endswith("beautifully structured, isolated feature specs.")
+    assert agents["ux_designer"].backstory == (
+        "You are a militant advocate for the end-user. You despise convoluted workflows, hidden menus, and jarring visual "
+        "transitions. You believe that great software should feel invisible and require zero training."
+        "\n\nMANDATORY UX GUIDELINES TO FOLLOW:\nUse 8px spacing."
+    )
+    assert agents["security_officer"].backstory.endswith("strict compliance with global data privacy laws.")
+    assert "Zero Trust" in agents["security_officer"].backstory
+    assert not any("GUIDELINES:" in agents[key].backstory for key in ("product_manager", "architect", "systems_engineer", "ai_specialist"))
+
+def test_independent_tasks_run_in_waves():
+    dependencies = ARCHITECTURE_CREW.dependencies()
+    waves = schedule_waves(list(dependencies), dependencies)
+    assert waves == [
+        ["deconstruct_requirements"], ["draft_architecture"],
+        ["plan_infrastructure", "design_ai_features", "design_user_experience"], ["audit_security"],
+    ]
+    assert async_task_keys(waves) == {"plan_infrastructure", "design_ai_features", "design_user_experience"}
+    # Resumed: finished tasks are skipped, and the crew may not end on parallel tasks
+    resumed = schedule_waves(list(dependencies), dependencies, completed={"deconstruct_requirements", "draft_architecture", "audit_security"})
+    assert resumed == [["plan_infrastructure", "design_ai_features", "design_user_experience"]]
+    assert async_task_keys(resumed) == set()
+    with pytest.raises(ValueError, match="cycle between: a, b"):
+        schedule_waves(["a", "b", "c"], {"a": ["b"], "b": ["a"], "c": []})
+
+if __name__ == "__main__":
+    test_invalid_templates_are_rejected()
+    test_variants_and_params_specialise_the_crew()
+    test_cli_variant_keeps_the_cli_prompts()
+    test_independent_tasks_run_in_waves()
+    print("Crew templates OK")
@@ -0,0 +1,62 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+import crud, models, schemas
+
+# Regression guard for the project list/detail endpoints: the number of SELECTs must
+# not grow with the number of projects, requirements or outputs.
+
+def _make_session():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(bind=engine)
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    db = sessionmaker(bind=engine)()
+    for i in range(20):
+        project = crud.create_project(db, schemas.ProjectCreate(title=f"Project {i}"))
+        for j in range(3):
+            crud.create_requirement(db, project.id, schemas.RequirementCreate(content=f"Requirement {j}"))
+            crud.create_agent_output(db, project.id, schemas.AgentOutputCreate(
+                agent_name="Lead AI Systems Architect", task_name="Draft...", output_content="x" * 10000
+            ))
+    db.expunge_all()
+    statements.clear()
+    return db, statements
+
+def test_project_list_is_a_single_query():
+    db, statements = _make_session()
+    projects = [schemas.ProjectSummary.model_validate(p).model_dump() for p in crud.get_projects(db)]
+    assert len(projects) == 20
+    assert len(statements) == 1, statements
+    assert "output_content" not in statements[0]
+
+def test_project_detail_without_outputs_skips_bodies():
+    db, statements = _make_session()
+    project = crud.get_project_detail(db, 1, include_outputs=False)
+    detail = schemas.ProjectDetail.model_validate(project).model_dump()
+    assert len(detail["agent_outputs"]) == 3
+    # One SELECT for the project plus one per eagerly loaded relationship
+    assert len(statements) == 5, statements
+    assert not any("output_content" in s for s in statements)
+
+def test_project_detail_with_outputs_is_constant():
+    db, statements = _make_session()
+    project = crud.get_project_detail(db, 1)
+    schemas.Project.model_validate(project).model_dump()
+    assert len(statements) == 5, statements
+
+if __name__ == "__main__":
+    test_project_list_is_a_single_query()
+    test_project_detail_without_outputs_skips_bodies()
+    test_project_detail_with_outputs_is_constant()
+    print("Query counts OK")
@@ -0,0 +1,98 @@
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import models
+from types import SimpleNamespace
+from github import GithubException
+from github_tools import GithubRepoSource, LocalRepoSource
+from llm_client import estimate_tokens
+from repo_digest import build_digest, get_or_build_digest, render_digest
+
+# The repository digest lists languages, entry points and top-level symbols, renders within
+# its token budget and is built once per commit.
+
+FILES = {
+    "backend/main.py": "from fastapi import FastAPI\napp = FastAPI()\n\ndef ping():\n    return 'pong'\n\nclass Store:\n    pass\n\ndef _private():\n    pass\n",
+    "backend/test_main.py": "def test_ping():\n    pass\n\nif __name__ == '__main__':\n    test_ping()\n",
+    "frontend/src/api.ts": "export const API_URL = '/api'\nexport interface Project { id: number }\nexport async function fetchProjects() {}\n",
+    "frontend/package.json": '{"scripts": {"start": "vite", "build": "vite build"}}',
+    "README.md": "# Demo\n",
+}
+
+def _repo(tmp):
+    for path, text in FILES.items():
+        os.makedirs(os.path.join(tmp, os.path.dirname(path)), exist_ok=True)
+        with open(os.path.join(tmp, path), "w") as f:
+            f.write(text)
+
+def test_digest_lists_symbols_and_fits_budget():
+    with tempfile.TemporaryDirectory() as tmp:
+        _repo(tmp)
+        digest = build_digest(LocalRepoSource(tmp, sha="abc"))
+        assert digest["symbols"]["backend/main.py"] == ["ping()", "class Store"]
+        assert digest["symbols"]["frontend/src/api.ts"] == ["API_URL", "Project", "fetchProjects"]
+        assert digest["entry_points"]["backend/main.py"] == "FastAPI app"
+        assert digest["entry_points"]["frontend/package.json"] == "scripts: start, build"
+        assert "backend/test_main.py" not in digest["entry_points"]
+        assert {language for language, _, _ in digest["languages"]} == {"Python", "TypeScript", "JSON", "Markdown"}
+        full = render_digest(digest, 10000)
+        assert "backend/main.py (0.1 KB): ping(), class Store" in full and "more not shown" not in full
+        short = render_digest(digest, 60)
+        assert estimate_tokens(short) <= 60 and short.startswith("REPOSITORY DIGEST (commit abc: 5 files")
+
+def test_digest_is_cached_per_commit():
+    with tempfile.TemporaryDirectory() as tmp:
+        _repo(tmp)
+        engine = create_engine(f"sqlite:///{tmp}/digest.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        first, cached = get_or_build_digest(db, "acme/demo", LocalRepoSource(tmp, sha="abc"))
+        assert not cached
+        os.remove(os.path.join(tmp, "README.md"))
+        again, cached = get_or_build_digest(db, "acme/demo", LocalRepoSource(tmp, sha="abc"))
+        assert cached and again == first
+        _, cached = get_or_build_digest(db, "acme/demo", LocalRepoSource(tmp, sha="def"))
+        assert not cached
+        db.close()
+
+class FakeRepo:
+    # GitHub API mode: one file is refused and one package.json is not an object
+    default_branch = "main"
+    files = dict(FILES, **{"tools/package.json": '["not", "a", "manifest"]'})
+
+    def get_commit(self, ref):
+        return SimpleNamespace(sha="abc")
+
+    def get_git_tree(self, sha, recursive=False):
+        return SimpleNamespace(tree=[SimpleNamespace(path=p, size=len(c), type="blob") for p, c in sorted(self.files.items())])
+
+    def get_contents(self, path, ref=None):
+        if path == "frontend/src/api.ts":
+            raise GithubException(403, {"message": "API rate limit exceeded"})
+        return SimpleNamespace(decoded_content=self.files[path].encode("utf-8"))
+
+def test_digest_skips_files_the_api_refuses():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = GithubRepoSource(SimpleNamespace(get_repo=lambda name: FakeRepo()), "acme/demo")
+        source.cache_dir = tmp
+        engine = create_engine(f"sqlite:///{tmp}/digest.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        digest, cached = get_or_build_digest(db, "acme/demo", source)
+        assert digest["failed"] == 1 and "frontend/src/api.ts" not in digest["symbols"]
+        assert digest["symbols"]["backend/main.py"] == ["ping()", "class Store"]
+        assert digest["entry_points"]["tools/package.json"] == "manifest"
+        # Incomplete, so it is not stored for later runs
+        _, cached = get_or_build_digest(db, "acme/demo", source)
+        assert not cached
+        db.close()
+
+if __name__ == "__main__":
+    test_digest_lists_symbols_and_fits_budget()
+    test_digest_is_cached_per_commit()
+    test_digest_skips_files_the_api_refuses()
+    print("Repository digest OK")
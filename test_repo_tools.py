@@ -0,0 +1,122 @@
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+import repo_reference
+from repo_reference import parse_repo_reference
+from types import SimpleNamespace
+from github import GithubException
+import github_tools
+from github_tools import GithubRepoSource, LocalRepoSource, GithubGlobTool, GithubCodeSearchTool, GithubMultiFileReaderTool, glob_files, read_files
+
+# The architect's repository tools find, search and read many files per call.
+
+FILES = {
+    "README.md": "# Demo\n",
+    "app/main.py": "from app.db import connect\n\ndef create_app():\n    return connect()\n",
+    "app/db.py": "def connect():\n    return 'postgres://'\n",
+    "app/api/routes.py": "def list_items():\n    return []\n",
+    "web/src/App.tsx": "export const App = () => null;\n",
+    "docs/big.txt": "x" * 5000,
+}
+
+def _source(tmp):
+    for path, content in FILES.items():
+        os.makedirs(os.path.dirname(os.path.join(tmp, path)), exist_ok=True)
+        with open(os.path.join(tmp, path), "w") as f:
+            f.write(content)
+    return LocalRepoSource(tmp)
+
+def test_glob_and_search():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = _source(tmp)
+        assert [p for p, _ in glob_files(source, "*.py")] == ["app/api/routes.py", "app/db.py", "app/main.py"]
+        assert [p for p, _ in glob_files(source, "app/*.py")] == ["app/db.py", "app/main.py"]
+        assert [p for p, _ in glob_files(source, "app/**/*.py")] == ["app/api/routes.py", "app/db.py", "app/main.py"]
+        assert len(glob_files(source, "**")) == len(FILES)
+        assert "No files match" in GithubGlobTool(github_repo_name="demo", source=source)._run("**/*.go")
+
+        search = GithubCodeSearchTool(github_repo_name="demo", source=source)
+        assert search._run(r"def \w+\(", "**/*.py").splitlines() == [
+            "app/api/routes.py:1: def list_items():", "app/db.py:1: def connect():", "app/main.py:3: def create_app():",
+        ]
+        assert search._run("POSTGRES") == "app/db.py:2: return 'postgres://'"
+        assert search._run("(unclosed").startswith("Invalid regular expression")
+
+def test_batched_read_with_size_caps():
+    with tempfile.TemporaryDirectory() as tmp:
+        reader = GithubMultiFileReaderTool(github_repo_name="demo", source=_source(tmp))
+        result = reader._run(["app/db.py", "missing.py", "docs/big.txt", "../outside.txt"])
+        assert "=== app/db.py ===\ndef connect():" in result
+        assert "=== missing.py ===\nError:" in result and "outside of the repository" in result
+        assert "[... truncated" not in result
+        capped = read_files(reader.source, ["docs/big.txt", "app/db.py", "README.md"], max_file_chars=1000, max_total_chars=1020)
+        assert "[... truncated 4000 of 5000 characters]" in capped
+        assert "=== app/db.py ===\ndef connect():\n  " in capped  # What is left of the total budget
+
+class FakeRepo:
+    # The few PyGithub calls GithubRepoSource makes, served from FILES; one file is refused
+    default_branch = "main"
+
+    def get_commit(self, ref):
+        return SimpleNamespace(sha="abc123")
+
+    def get_git_tree(self, sha, recursive=False):
+        return SimpleNamespace(tree=[SimpleNamespace(path=p, size=len(c), type="blob") for p, c in sorted(FILES.items())])
+
+    def get_contents(self, path, ref=None):
+        if path == "app/db.py":
+            raise GithubException(403, {"message": "API rate limit exceeded"})
+        return SimpleNamespace(decoded_content=FILES[path].encode("utf-8"))
+
+def test_search_without_snapshot():
+    with tempfile.TemporaryDirectory() as tmp:
+        source = GithubRepoSource(SimpleNamespace(get_repo=lambda name: FakeRepo()), "acme/demo")
+        source.cache_dir = tmp
+        search = GithubCodeSearchTool(github_repo_name="acme/demo", source=source)
+        assert search._run("def ", "app/**").splitlines() == [
+            "app/api/routes.py:1: def list_items():", "app/main.py:3: def create_app():",
+            "[1 files could not be read from GitHub and were not searched]",
+        ]
+        saved = github_tools.REPO_SEARCH_MAX_API_FILES
+        github_tools.REPO_SEARCH_MAX_API_FILES = 2
+        try:
+            assert "without a repository snapshot a search reads at most 2" in search._run("def ", "app/**")
+        finally:
+            github_tools.REPO_SEARCH_MAX_API_FILES = saved
+
+def test_only_github_or_allowed_local_repositories():
+    assert parse_repo_reference("https://github.com/acme/demo.git") == "acme/demo"
+    assert parse_repo_reference("acme/demo") == "acme/demo"
+    assert parse_repo_reference("https://github.com/acme/demo/tree/main") == "acme/demo"
+    assert parse_repo_reference("github.com/acme/demo/blob/v1.2/backend/main.py#L10") == "acme/demo"
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, "repo"))
+        saved = repo_reference.LOCAL_REPO_ROOT
+        try:
+            for reference in ("file:///", f"file://{tmp}/repo", "/etc", ".", "backend", "../acme/demo", "https://evil.com/acme/demo",
+                              "https://github.com/acme/demo/pulls"):
+                repo_reference.LOCAL_REPO_ROOT = None
+                try:
+                    parse_repo_reference(reference)
+                    assert False, reference
+                except ValueError:
+                    pass
+            repo_reference.LOCAL_REPO_ROOT = os.path.join(tmp, "repo")
+            assert parse_repo_reference(f"file://{tmp}/repo") == os.path.realpath(os.path.join(tmp, "repo"))
+            for reference in ("file:///", f"file://{tmp}", f"file://{tmp}/repo/../.."):
+                try:
+                    parse_repo_reference(reference)
+                    assert False, reference
+                except ValueError:
+                    pass
+        finally:
+            repo_reference.LOCAL_REPO_ROOT = saved
+
+if __name__ == "__main__":
+    test_glob_and_search()
+    test_batched_read_with_size_caps()
+    test_search_without_snapshot()
+    test_only_github_or_allowed_local_repositories()
+    print("Repository tools OK")
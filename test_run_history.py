@@ -0,0 +1,135 @@
+import os
+import sys
+import json
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+import blob_store as blob_store_module
+import crud, models, schemas
+from blob_store import BlobStore
+from run_diff import diff_runs
+
+# Successive versions of an output are stored as deltas with periodic full snapshots and
+# read back exactly; runs group their outputs and can be compared task by task, and a
+# resumed job starts from the tasks the failed job finished.
+
+def _versions(count):
+    sections = [f"## Section {i}\n" + f"Decision {i}: use Postgres with pgvector for tenant {i}.\n" * 20 for i in range(30)]
+    for version in range(count):
+        sections[version % 30] = f"## Section {version}\nRevised in version {version}.\n"
+        yield "".join(sections)
+
+def test_versions_are_delta_encoded_with_snapshots():
+    assert blob_store_module.zstandard is not None, "zstandard is not installed (backend/requirements.txt); deltas need it"
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(tmp, cache_entries=0)
+        texts = list(_versions(2 * blob_store_module.BLOB_SNAPSHOT_INTERVAL))
+        hashes, base = [], None
+        for text in texts:
+            base, _ = store.put_text(text, base)
+            hashes.append(base)
+        depths = [store.chain_depth(h) for h in hashes]
+        assert depths == list(range(blob_store_module.BLOB_SNAPSHOT_INTERVAL)) * 2
+        assert [store.get_text(h) for h in reversed(hashes)] == texts[::-1]
+        snapshots = [os.path.getsize(os.path.join(tmp, h[:2], f"{h}.zst")) for h, d in zip(hashes, depths) if d == 0]
+        deltas = [os.path.getsize(os.path.join(tmp, h[:2], f"{h}.zdelta")) for h, d in zip(hashes, depths) if d > 0]
+        assert max(deltas) < min(snapshots)
+
+def test_unreferenced_blobs_are_collected():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = BlobStore(tmp, cache_entries=0)
+        texts = list(_versions(3))
+        base, _ = store.put_text(texts[0])
+        latest, _ = store.put_text(texts[1], base)
+        orphan, _ = store.put_text(texts[2])  # e.g. written by a rolled-back transaction
+        assert store.collect_garbage({latest}) == (0, 0)  # Too recent to tell
+        deleted, freed = store.collect_garbage({latest}, min_age_seconds=0)
+        assert deleted == 1 and freed > 0 and not store.exists(orphan)
+        assert store.get_text(latest) == texts[1] and store.exists(base)  # A delta keeps its base
+
+def test_runs_group_outputs_and_diff():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/runs.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        project = crud.create_project(db, schemas.ProjectCreate(title="History"))
+        job, _ = crud.enqueue_job(db, project.id)
+        first = crud.start_run(db, project.id, job.id)
+        assert crud.start_run(db, project.id, job.id).id == first.id  # A retry continues the run
+
+        def output(text):
+            return schemas.AgentOutputCreate(agent_name="Architect", task_name="Architecture", output_content=text)
+        crud.create_agent_outputs(db, project.id, [("architecture", output("A\nB\nC\n")), ("security", output("Audit\n"))], run_id=first.id)
+        crud.finish_run(db, first.id, "completed")
+        second = crud.start_run(db, project.id)
+        assert second.number == 2
+        crud.create_agent_outputs(db, project.id, [("architecture", output("A\nB2\nC\n")), ("ux", output("Flows\n"))], run_id=second.id)
+        crud.reuse_agent_outputs(db, project.id, {"security": crud.get_run_outputs(db, first.id)["security"]}, None, run_id=second.id)
+
+        tasks = {t["task_key"]: t for t in diff_runs(crud.get_run_outputs(db, first.id, True), crud.get_run_outputs(db, second.id, True))}
+        assert {k: t["status"] for k, t in tasks.items()} == {"architecture": "changed", "ux": "added", "security": "unchanged"}
+        assert "-B\n+B2\n" in tasks["architecture"]["diff"] and tasks["architecture"]["lines_added"] == 1
+
+        # Finished runs keep only the project's newest live-view events
+        for step in range(5):
+            crud.create_run_event(db, project.id, "agent_step", {"step": step})
+        crud.prune_run_events(db, project.id, keep=2)
+        db.commit()
+        assert [json.loads(e.data) for e in crud.get_run_events(db, project.id)] == [{"step": 3}, {"step": 4}]
+
+        # A cancelled job's process is terminated mid-run; cancelling closes its run
+        assert crud.start_run(db, project.id, job.id).id == first.id  # Retried, running again
+        crud.mark_job_cancelled(db, job.id)
+        db.refresh(first)
+        assert first.status == "cancelled" and first.finished_at is not None
+        assert crud.get_project(db, project.id).status == "cancelled"
+        db.close()
+        engine.dispose()
+
+def test_resumed_job_restores_the_failed_jobs_checkpoint():
+    os.environ.setdefault("OPENAI_API_KEY", "fake-key-to-bypass-crewai-checks")
+    from crewai import LLM
+    from crew_runner import _restore_task_output
+    from crew_templates import ARCHITECTURE_CREW
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{tmp}/resume.db")
+        models.Base.metadata.create_all(bind=engine)
+        db = sessionmaker(bind=engine)()
+        project = crud.create_project(db, schemas.ProjectCreate(title="Resume"))
+        failed, _ = crud.enqueue_job(db, project.id, max_attempts=1)
+        crud.claim_next_job(db, "w", lease_seconds=60)
+
+        def output(text):
+            return schemas.AgentOutputCreate(agent_name="Architect", task_name="Architecture", output_content=text)
+        crud.create_agent_outputs(db, project.id, [("draft_architecture", output("Monolith"))], job_id=failed.id)
+        # A later attempt redid the task: the checkpoint holds its latest output
+        crud.create_agent_outputs(db, project.id, [("draft_architecture", output("Services")), ("plan_infrastructure", output("Kubernetes"))], job_id=failed.id)
+        assert crud.fail_job(db, failed.id, retry_backoff_seconds=0).status == "failed"
+
+        resumed, _ = crud.enqueue_job(db, project.id, resume=True)
+        assert resumed.resume_from_job_id == failed.id
+        assert crud.get_job_outputs(db, resumed.id) == {}
+        crud.copy_job_outputs(db, resumed.resume_from_job_id, resumed.id)
+        checkpoint = crud.get_job_outputs(db, resumed.id)
+        assert {k: o.output_content for k, o in checkpoint.items()} == {"draft_architecture": "Services", "plan_infrastructure": "Kubernetes"}
+        assert len(crud.get_job_outputs(db, failed.id)) == 2  # The failed job keeps its own
+
+        agents = ARCHITECTURE_CREW.build_agents(LLM(model="gemini/gemini-2.0-flash", api_key="fake"))
+        tasks = ARCHITECTURE_CREW.build_tasks(agents, params={"requirements": "Build a chat app"})
+        for task_key, db_output in checkpoint.items():
+            _restore_task_output(tasks[task_key], db_output)
+        assert tasks["draft_architecture"].output.raw == "Services" and tasks["draft_architecture"].output.agent == tasks["draft_architecture"].agent.role
+        assert tasks["audit_security"].output is None
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_versions_are_delta_encoded_with_snapshots()
+    test_unreferenced_blobs_are_collected()
+    test_runs_group_outputs_and_diff()
+    test_resumed_job_restores_the_failed_jobs_checkpoint()
+    print("Run history OK")
@@ -0,0 +1,48 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from types import SimpleNamespace
+from run_planner import plan_reuse, content_hash
+
+# Only tasks whose own inputs changed, and everything downstream of them, are re-run.
+
+UPSTREAM = {
+    "requirements": [],
+    "architecture": ["requirements"],
+    "infrastructure": ["architecture"],
+    "ux": ["architecture"],
+    "security": ["architecture", "infrastructure", "ux"],
+}
+
+def _plan(own_inputs, stored):
+    # stored: {(task_key, fingerprint): output}
+    def fingerprint(task_key, upstream_hashes):
+        return content_hash("|".join([own_inputs[task_key], *upstream_hashes]))
+    return plan_reuse(list(UPSTREAM), UPSTREAM, fingerprint, lambda task_key, fp: stored.get((task_key, fp)))
+
+def _record_run(own_inputs):
+    # What a full run stores: each output with the fingerprint of the inputs it was built from
+    stored, hashes = {}, {}
+    for task_key in UPSTREAM:
+        upstream_hashes = [hashes[d] for d in UPSTREAM[task_key]]
+        fingerprint = content_hash("|".join([own_inputs[task_key], *upstream_hashes]))
+        output = SimpleNamespace(content_hash=content_hash(f"{task_key} output for {fingerprint}"), inline_content=None)
+        stored[(task_key, fingerprint)] = output
+        hashes[task_key] = output.content_hash
+    return stored
+
+def test_unchanged_inputs_reuse_everything():
+    inputs = {key: f"{key} prompt" for key in UPSTREAM}
+    assert list(_plan(inputs, _record_run(inputs))) == list(UPSTREAM)
+
+def test_changed_guideline_reruns_task_and_dependents():
+    inputs = {key: f"{key} prompt" for key in UPSTREAM}
+    stored = _record_run(inputs)
+    assert list(_plan({**inputs, "ux": "ux prompt with new guidelines"}, stored)) == ["requirements", "architecture", "infrastructure"]
+    assert _plan({**inputs, "requirements": "requirements plus one more"}, stored) == {}
+
+if __name__ == "__main__":
+    test_unchanged_inputs_reuse_everything()
+    test_changed_guideline_reruns_task_and_dependents()
+    print("Run planner OK")
@@ -0,0 +1,160 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from crewai import LLM
+import crud, models, schemas
+from llm_client import RateLimitedLLM
+from fake_llm_server import start_server
+
+# Batch scheduling: job priority and batch fairness, leases, retries and cancellation, the
+# shared token buckets, and backoff when the provider (here fake_llm_server.py) answers 429.
+
+def _make_sessionmaker(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scheduler.db'}", connect_args={"check_same_thread": False})
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def test_claim_order_respects_priority_and_batch_fairness(tmp_path):
+    db = _make_sessionmaker(tmp_path)()
+    projects = [crud.create_project(db, schemas.ProjectCreate(title=f"Project {i}")).id for i in range(6)]
+    past = datetime.utcnow() - timedelta(seconds=1)
+    for project_id in projects[:4]:
+        job, _ = crud.enqueue_job(db, project_id, batch_id="big")
+        job.available_at = past
+    small, _ = crud.enqueue_job(db, projects[4], batch_id="small")
+    urgent, _ = crud.enqueue_job(db, projects[5], priority=crud.JOB_PRIORITIES["high"])
+    small.available_at = urgent.available_at = past + timedelta(milliseconds=500)
+    db.commit()
+
+    claimed = [crud.claim_next_job(db, "w", lease_seconds=60) for _ in range(3)]
+    # High priority first; then the big batch's oldest job; then the small batch gets its
+    # turn even though the big batch queued earlier
+    assert claimed[0].id == urgent.id
+    assert claimed[1].batch_id == "big"
+    assert claimed[2].id == small.id
+
+def test_concurrent_enqueues_share_one_job(tmp_path):
+    Session = _make_sessionmaker(tmp_path)
+    first, second = Session(), Session()
+    project_id = crud.create_project(first, schemas.ProjectCreate(title="Race")).id
+    job, created = crud.enqueue_job(first, project_id)
+    check, calls = crud.get_active_job, []
+
+    def racing_check(db, project_id):
+        # The second request checked before the first one inserted its job
+        calls.append(project_id)
+        return None if len(calls) == 1 else check(db, project_id)
+
+    crud.get_active_job = racing_check
+    try:
+        duplicate, duplicate_created = crud.enqueue_job(second, project_id)
+    finally:
+        crud.get_active_job = check
+    assert created and not duplicate_created and duplicate.id == job.id
+    assert first.query(models.Job).filter(models.Job.project_id == project_id).count() == 1
+
+def _queued_job(db, max_attempts=3):
+    project_id = crud.create_project(db, schemas.ProjectCreate(title="Jobs")).id
+    job, _ = crud.enqueue_job(db, project_id, max_attempts=max_attempts)
+    job.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    return job
+
+def _expire_lease(db, job):
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=120)
+    db.commit()
+    return crud.requeue_stale_jobs(db, datetime.utcnow() - timedelta(seconds=60))
+
+def test_expired_leases_are_requeued_until_attempts_run_out(tmp_path):
+    db = _make_sessionmaker(tmp_path)()
+    job = _queued_job(db, max_attempts=2)
+    claimed = crud.claim_next_job(db, "w1", lease_seconds=60)
+    assert claimed.id == job.id and claimed.status == "running" and claimed.worker_id == "w1" and claimed.attempts == 1
+    assert crud.claim_next_job(db, "w2", lease_seconds=60) is None  # Still leased to w1
+
+    assert [stale.id for stale in _expire_lease(db, claimed)] == [job.id]
+    assert claimed.status == "queued"
+    again = crud.claim_next_job(db, "w2", lease_seconds=60)
+    assert again.id == job.id and again.worker_id == "w2" and again.attempts == 2
+
+    _expire_lease(db, again)
+    assert again.status == "failed" and again.error == "Worker lost while running job"
+    assert crud.claim_next_job(db, "w3", lease_seconds=60) is None
+
+def test_failed_attempts_back_off_then_fail(tmp_path):
+    db = _make_sessionmaker(tmp_path)()
+    job = _queued_job(db, max_attempts=2)
+    crud.claim_next_job(db, "w", lease_seconds=60)
+    before = datetime.utcnow()
+    retried = crud.fail_job(db, job.id, retry_backoff_seconds=10)
+    assert retried.status == "queued" and before + timedelta(seconds=10) <= retried.available_at <= datetime.utcnow() + timedelta(seconds=10)
+    assert crud.get_project(db, job.project_id).status == "queued"
+    assert crud.claim_next_job(db, "w", lease_seconds=60) is None  # Not before the backoff
+
+    retried.available_at = datetime.utcnow() - timedelta(seconds=1)
+    db.commit()
+    assert crud.claim_next_job(db, "w", lease_seconds=60).attempts == 2
+    crud.set_job_error(db, job.id, "boom")
+    failed = crud.fail_job(db, job.id, retry_backoff_seconds=10)
+    assert failed.status == "failed" and failed.finished_at is not None
+    assert crud.get_project(db, job.project_id).status == "error: boom"
+
+def test_cancelling_queued_and_running_jobs(tmp_path):
+    db = _make_sessionmaker(tmp_path)()
+    queued = _queued_job(db)
+    assert crud.cancel_job(db, queued.id).status == "cancelled"
+    assert crud.get_project(db, queued.project_id).status == "cancelled"
+    requeued, created = crud.enqueue_job(db, queued.project_id)
+    assert created  # No longer active, so the project can be queued again
+
+    running = _queued_job(db)
+    crud.claim_next_job(db, "w", lease_seconds=60)
+    run = crud.start_run(db, running.project_id, job_id=running.id)
+    cancelling = crud.cancel_job(db, running.id)
+    # The owning worker stops it; until then it stays running and is never retried
+    assert cancelling.status == "running" and cancelling.cancel_requested
+    assert crud.get_cancel_requested_job_ids(db, [requeued.id, running.id]) == {running.id}
+    crud.mark_job_cancelled(db, running.id)
+    db.refresh(run)
+    assert running.status == "cancelled" and run.status == "cancelled" and run.finished_at is not None
+
+def test_token_buckets_are_all_or_nothing(tmp_path):
+    db = _make_sessionmaker(tmp_path)()
+    limits = [("llm_requests", 1, 2, 1.0), ("llm_tokens", 100, 150, 10.0)]
+    assert crud.acquire_rate_limits(db, limits, now=1000.0) == 0
+    # The request bucket has room but the token bucket does not: nothing is taken
+    assert crud.acquire_rate_limits(db, limits, now=1000.0) == 5.0
+    requests = db.get(models.RateLimitBucket, "llm_requests")
+    assert requests.tokens == 1
+    assert crud.acquire_rate_limits(db, limits, now=1005.0) == 0
+
+    crud.block_rate_limit(db, "llm_requests", until=1100.0)
+    assert crud.acquire_rate_limits(db, limits, now=1050.0) == 50.0
+
+def test_rate_limited_llm_backs_off_on_429(tmp_path):
+    server, state = start_server(fail_first=2)
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+        # Provider-side retries are off so every 429 reaches the wrapper
+        inner = LLM(model="openai/fake-model", base_url=base_url, api_key="fake", max_retries=0)
+        llm = RateLimitedLLM(inner, backoff=0.05, requests_per_minute=600, tokens_per_minute=100000,
+                             session_factory=_make_sessionmaker(tmp_path))
+        response = llm.call([{"role": "user", "content": "Design the search service."}])
+        assert "Final Answer" in response
+        assert state.stats["rate_limited"] == 2
+        assert state.stats["accepted"] == 1
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    import tempfile, pathlib
+    for test in (test_claim_order_respects_priority_and_batch_fairness, test_concurrent_enqueues_share_one_job,
+                 test_expired_leases_are_requeued_until_attempts_run_out, test_failed_attempts_back_off_then_fail,
+                 test_cancelling_queued_and_running_jobs, test_token_buckets_are_all_or_nothing, test_rate_limited_llm_backs_off_on_429):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(pathlib.Path(tmp))
+    print("Scheduler OK")
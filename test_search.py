@@ -0,0 +1,62 @@
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+import crud, models, schemas
+
+# Requirements and agent outputs are searchable as soon as they are written, and an index
+# created on an existing database is built from the rows already there.
+
+def _session(path):
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine)()
+
+def _add_project(db):
+    project = crud.create_project(db, schemas.ProjectCreate(title="Vector app"))
+    crud.create_requirement(db, project.id, schemas.RequirementCreate(content="Semantic search with real-time sync"))
+    outputs = crud.create_agent_outputs(db, project.id, [
+        ("draft_architecture", schemas.AgentOutputCreate(agent_name="Lead AI Systems Architect", task_name="Architecture",
+                                                         output_content="We chose pgvector on Postgres for embeddings.")),
+        ("plan_infrastructure", schemas.AgentOutputCreate(agent_name="Senior Systems Engineer", task_name="Infrastructure",
+                                                          output_content="Deploy Postgres with the pgvector extension on Kubernetes.")),
+    ])
+    # A reused copy is not a second hit
+    crud.reuse_agent_outputs(db, project.id, {"draft_architecture": outputs[0]}, job_id=None)
+    return project, outputs
+
+def test_search_ranks_filters_and_highlights():
+    with tempfile.TemporaryDirectory() as tmp:
+        engine, db = _session(os.path.join(tmp, "search.db"))
+        project, outputs = _add_project(db)
+        hits = crud.search(db, "which projects chose pgvector?")
+        assert [hit["source_id"] for hit in hits] == [outputs[0].id, outputs[1].id]
+        assert "<mark>chose</mark> <mark>pgvector</mark>" in hits[0]["snippet"] and hits[0]["project_title"] == "Vector app"
+        assert [hit["source_id"] for hit in crud.search(db, "pgvector", agent_name="senior systems engineer")] == [outputs[1].id]
+        assert [hit["kind"] for hit in crud.search(db, "real-time", project_id=project.id)] == ["requirement"]
+        assert crud.search(db, "pgvector", project_id=project.id + 1) == []
+        assert crud.search(db, '"( AND *') == []
+        db.close()
+        engine.dispose()
+
+def test_index_is_built_for_existing_rows():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "search.db")
+        engine, db = _session(path)
+        _, outputs = _add_project(db)
+        db.execute(text("DROP TABLE search_index"))
+        db.commit()
+        models.Base.metadata.create_all(bind=engine)
+        assert [hit["source_id"] for hit in crud.search(db, "embeddings")] == [outputs[0].id]
+        db.close()
+        engine.dispose()
+
+if __name__ == "__main__":
+    test_search_ranks_filters_and_highlights()
+    test_index_is_built_for_existing_rows()
+    print("Search OK")
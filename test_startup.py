@@ -0,0 +1,12 @@
+from bench_import_time import measure, forbidden_imports
+
+# The API process must start without the agent stack; only run workers import crewAI.
+
+def test_api_import_skips_agent_stack():
+    timings = measure("main")
+    assert "main" in timings
+    assert forbidden_imports(timings) == []
+
+if __name__ == "__main__":
+    test_api_import_skips_agent_stack()
+    print("Startup imports OK")
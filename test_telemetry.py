@@ -0,0 +1,46 @@
+import os
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+os.environ.setdefault("OPENAI_API_KEY", "fake-key-to-bypass-crewai-checks")
+from scratch_stores import use_scratch_stores
+use_scratch_stores()
+
+from crewai import Agent, Crew, Task
+import crud, models, schemas
+import telemetry
+from database import SessionLocal, engine
+from llm_client import SyntheticLLM
+from telemetry import RunTelemetry
+
+# A crew run leaves one span per task and per LLM call in run_metrics, attributed to the
+# task that made the call and priced with the configured per-token cost.
+
+def test_crew_run_is_recorded_as_spans():
+    models.Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        project_id = crud.create_project(db, schemas.ProjectCreate(title="Telemetry")).id
+        job, _ = crud.enqueue_job(db, project_id)
+    agent = Agent(role="Architect", goal="Design", backstory="Experienced", llm=SyntheticLLM(model="synthetic/telemetry", latency=0, tool_calls=0))
+    task = Task(description="Draft the architecture", expected_output="A design", agent=agent)
+    saved = telemetry.LLM_COST_PER_1K_PROMPT_TOKENS, telemetry.METRICS_FLUSH_EVERY
+    telemetry.LLM_COST_PER_1K_PROMPT_TOKENS, telemetry.METRICS_FLUSH_EVERY = 1.0, 1
+    try:
+        with RunTelemetry(project_id, job.id, {str(task.id): "draft_architecture"}).attach():
+            Crew(agents=[agent], tasks=[task]).kickoff()
+    finally:
+        telemetry.LLM_COST_PER_1K_PROMPT_TOKENS, telemetry.METRICS_FLUSH_EVERY = saved
+
+    with SessionLocal() as db:
+        spans = db.scalars(crud.run_metrics_query(project_id, job.id)).all()
+    llm_calls = [s for s in spans if s.kind == "llm_call"]
+    tasks = [s for s in spans if s.kind == "task"]
+    assert len(tasks) == 1 and tasks[0].name == "draft_architecture" and tasks[0].agent_name == "Architect"
+    assert llm_calls and all(s.task_key == "draft_architecture" and s.name == "synthetic/telemetry" for s in llm_calls)
+    assert all(s.prompt_tokens > 0 and s.completion_tokens > 0 for s in llm_calls)
+    assert all(abs(s.cost_usd - s.prompt_tokens / 1000) < 1e-9 for s in llm_calls)
+    assert all(s.duration_ms is not None and s.duration_ms >= 0 for s in spans)
+    assert tasks[0].started_at <= llm_calls[0].started_at
+
+if __name__ == "__main__":
+    test_crew_run_is_recorded_as_spans()
+    print("Telemetry OK")